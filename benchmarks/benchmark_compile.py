@@ -0,0 +1,109 @@
+'''
+Compares eager SequenceModel with CompiledSequenceModel under torch.compile (inductor) and torch.jit.script, on GRU, LRU, CNN,
+and transformer configs. Reports training (forward, backward, and optimizer step) and inference throughput in samples/s.
+First checks that a scripted LRU of each mode runs, from its first call under no_grad, and matches the eager LRU.
+
+Usage: python benchmarks/benchmark_compile.py [--configs gru lru cnn transformer] [--batch_size 64] [--seq_len 128] [--steps 20]
+'''
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ts_src.SequenceModel import SequenceModel
+from ts_src.CompiledSequenceModel import CompiledSequenceModel
+from ts_src.LRU import LRU
+
+CONFIGS = {'gru': dict(base_type = ['gru'], base_hidden_size = [32]),
+           'lru': dict(base_type = ['lru'], base_hidden_size = [8], base_lru_num_filterbanks = [4], base_lru_mode = ['scan']),
+           'cnn': dict(base_type = ['cnn'], base_hidden_size = [32],
+                       base_cnn_out_channels = [[32]], base_cnn_kernel_size = [[(5,)]], base_cnn_causal_pad = [True]),
+           'transformer': dict(base_type = ['transformer'], base_hidden_size = [32], base_num_heads = [4],
+                               base_transformer_dim_feedforward = [64])}
+
+def build_model(config, seq_len):
+  kwargs = dict(input_size = [1], input_len = [seq_len], input_names = ['x'],
+                output_size = [1], output_len = [seq_len], output_names = ['y'],
+                hidden_out_features = [16], hidden_activation = ['relu'])
+  kwargs.update(CONFIGS[config])
+  return SequenceModel(**kwargs)
+
+def check_scripted_lru(seq_len):
+  '''
+  Scripts an LRU of each mode and compares its first call, under no_grad, with the eager LRU.
+  '''
+  input = torch.randn((4, seq_len, 2))
+  for mode in ['loop', 'scan', 'fft']:
+    lru = LRU(2, 8, num_filterbanks = 2, mode = mode)
+    try:
+      scripted = torch.jit.script(lru)
+      with torch.no_grad():
+        diff = (scripted(input)[0] - lru(input)[0]).abs().max().item()
+      print(f"scripted LRU ({mode}): max abs diff {diff:.2e}")
+    except Exception as e:
+      print(f"scripted LRU ({mode}): failed ({type(e).__name__}: {str(e).splitlines()[0]})")
+
+def throughput(fn, batch_size, steps):
+  fn() # warm up, which also triggers compilation
+  start = time.perf_counter()
+  for _ in range(steps):
+    fn()
+  return batch_size * steps / (time.perf_counter() - start)
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--configs', nargs = '+', default = list(CONFIGS), choices = list(CONFIGS))
+  parser.add_argument('--batch_size', type = int, default = 64)
+  parser.add_argument('--seq_len', type = int, default = 128)
+  parser.add_argument('--steps', type = int, default = 20)
+  args = parser.parse_args()
+
+  warnings.filterwarnings('ignore')
+  torch.manual_seed(0)
+
+  check_scripted_lru(args.seq_len)
+
+  input = torch.randn((args.batch_size, args.seq_len, 1))
+  target = torch.randn((args.batch_size, args.seq_len, 1))
+
+  print(f"{'config':>12} {'backend':>8} {'train (samples/s)':>18} {'infer (samples/s)':>18} {'max abs diff':>13}")
+  for config in args.configs:
+    model = build_model(config, args.seq_len)
+    model.train()
+    with torch.no_grad():
+      reference = model(input)[0]
+
+    runners = {'eager': lambda x: model(x)[0]}
+    compiled = CompiledSequenceModel(model)
+    runners['inductor'] = lambda x, fn = torch.compile(compiled): fn(x)[0]
+    if config != 'transformer': # the transformer encoder is not scriptable
+      runners['script'] = lambda x, fn = torch.jit.script(compiled): fn(x)[0]
+
+    for backend, runner in runners.items():
+      optimizer = torch.optim.SGD(model.parameters(), lr = 0.)
+
+      def train_step():
+        optimizer.zero_grad()
+        loss = torch.nn.functional.mse_loss(runner(input), target)
+        loss.backward()
+        optimizer.step()
+        model.constrain()
+
+      def infer_step():
+        with torch.no_grad():
+          return runner(input)
+
+      train = throughput(train_step, args.batch_size, args.steps)
+      infer = throughput(infer_step, args.batch_size, args.steps)
+      diff = (infer_step() - reference).abs().max().item()
+
+      print(f"{config:>12} {backend:>8} {train:>18.0f} {infer:>18.0f} {diff:>13.2e}")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,86 @@
+'''
+Checks that grouped execution of inputs with the same configuration (`SequenceModel(group_inputs = True)`, see `InputGroup`)
+matches processing the inputs one at a time with the same weights, and compares their speed. For each config, reports the
+largest differences of the outputs and of the parameter gradients, and the time of a forward and backward pass.
+
+Usage: python benchmarks/benchmark_input_groups.py [--configs gru lstm identity softmax softmax_dim1] [--num_inputs 4]
+                                                  [--seq_len 48] [--batch_size 32] [--steps 10]
+'''
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ts_src.SequenceModel import SequenceModel
+
+CONFIGS = {'gru': dict(base_type = 'gru', hidden_activation = 'relu'),
+           'lstm': dict(base_type = 'lstm', hidden_activation = 'tanh'),
+           'identity': dict(base_type = 'identity', hidden_out_features = 0),
+           'softmax': dict(base_type = 'gru', hidden_activation = 'softmax', hidden_softmax_dim = -1),
+           'softmax_dim1': dict(base_type = 'gru', hidden_activation = 'softmax', hidden_softmax_dim = 1)}
+
+def build_model(config, num_inputs, seq_len):
+  kwargs = dict(input_size = [1] * num_inputs, input_len = [seq_len] * num_inputs,
+                input_names = [f"x{i}" for i in range(num_inputs)],
+                output_size = [1], output_len = [1], output_names = ['y'],
+                base_hidden_size = [16] * num_inputs, hidden_out_features = [8] * num_inputs,
+                group_inputs = True)
+  kwargs.update({name: [value] * num_inputs for name, value in CONFIGS[config].items()})
+  return SequenceModel(**kwargs)
+
+def run(model, input, grouped):
+  '''
+  Runs a forward and backward pass, grouped or one input at a time, and returns the output and the parameter gradients.
+  '''
+  input_groups = model.input_groups
+  model.input_groups = input_groups if grouped else []
+  try:
+    model.zero_grad()
+    output = model(input)[0]
+    output.pow(2).sum().backward()
+  finally:
+    model.input_groups = input_groups
+
+  return output.detach(), [p.grad.clone() if p.grad is not None else torch.zeros_like(p) for p in model.parameters()]
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--configs', nargs = '+', default = list(CONFIGS), choices = list(CONFIGS))
+  parser.add_argument('--num_inputs', type = int, default = 4)
+  parser.add_argument('--seq_len', type = int, default = 48)
+  parser.add_argument('--batch_size', type = int, default = 32)
+  parser.add_argument('--steps', type = int, default = 10)
+  args = parser.parse_args()
+
+  warnings.filterwarnings('ignore')
+  torch.manual_seed(0)
+
+  input = torch.randn((args.batch_size, args.seq_len, args.num_inputs))
+
+  print(f"{'config':>13} {'groups':>7} {'output diff':>12} {'grad diff':>10} {'per-input (ms)':>15} {'grouped (ms)':>13}")
+  for config in args.configs:
+    model = build_model(config, args.num_inputs, args.seq_len)
+
+    output, grads = run(model, input, grouped = False)
+    output_g, grads_g = run(model, input, grouped = True)
+
+    output_diff = (output - output_g).abs().max().item()
+    grad_diff = max((g - g_g).abs().max().item() for g, g_g in zip(grads, grads_g))
+
+    times = {}
+    for grouped in [False, True]:
+      start = time.perf_counter()
+      for _ in range(args.steps):
+        run(model, input, grouped)
+      times[grouped] = 1e3 * (time.perf_counter() - start) / args.steps
+
+    print(f"{config:>13} {len(model.input_groups):>7} {output_diff:>12.2e} {grad_diff:>10.2e} {times[False]:>15.2f} {times[True]:>13.2f}")
+
+if __name__ == '__main__':
+  main()
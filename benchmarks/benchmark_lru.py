@@ -0,0 +1,64 @@
+'''
+Compares the 'loop', 'scan', and 'fft' execution modes of LRU over sequence lengths from 100 to 100k steps.
+
+Usage: python benchmarks/benchmark_lru.py [--hidden_size 8] [--num_filterbanks 1] [--num_samples 1] [--backward]
+'''
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ts_src.LRU import LRU
+
+def time_fn(fn, repeats):
+  # warm up, unless a single run is long enough to time
+  if repeats > 1: fn()
+  start = time.perf_counter()
+  for _ in range(repeats):
+    fn()
+  return (time.perf_counter() - start) / repeats
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--hidden_size', type = int, default = 8)
+  parser.add_argument('--num_filterbanks', type = int, default = 1)
+  parser.add_argument('--num_samples', type = int, default = 1)
+  parser.add_argument('--seq_len', type = int, nargs = '+', default = [100, 1000, 10000, 100000])
+  parser.add_argument('--backward', action = 'store_true')
+  args = parser.parse_args()
+
+  torch.manual_seed(0)
+
+  lru = {mode: LRU(input_size = args.num_filterbanks, hidden_size = args.hidden_size,
+                   num_filterbanks = args.num_filterbanks, feature_associated = True, mode = mode)
+         for mode in ['loop', 'scan', 'fft']}
+  lru['scan'].load_state_dict(lru['loop'].state_dict())
+  lru['fft'].load_state_dict(lru['loop'].state_dict())
+
+  print(f"{'seq_len':>8} {'loop (s)':>10} {'scan (s)':>10} {'fft (s)':>10} {'scan speedup':>13} {'fft speedup':>12} {'max abs diff':>13}")
+  for seq_len in args.seq_len:
+    input = torch.randn((args.num_samples, seq_len, args.num_filterbanks), requires_grad = args.backward)
+
+    def run(mode):
+      def fn():
+        with torch.set_grad_enabled(args.backward):
+          output, _ = lru[mode](input)
+          if args.backward: output.sum().backward()
+        return output.detach()
+      return fn
+
+    repeats = max(1, 1000 // seq_len)
+    t_loop, t_scan, t_fft = time_fn(run('loop'), repeats), time_fn(run('scan'), repeats), time_fn(run('fft'), repeats)
+
+    output = run('loop')()
+    diff = max((output - run('scan')()).abs().max().item(), (output - run('fft')()).abs().max().item())
+
+    print(f"{seq_len:>8} {t_loop:>10.4f} {t_scan:>10.4f} {t_fft:>10.4f} {t_loop / t_scan:>12.1f}x {t_loop / t_fft:>11.1f}x {diff:>13.2e}")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,102 @@
+'''
+Compares eager SequenceModel with its ONNX export run by onnxruntime (`OnnxSequenceModel`) on the per-step loop of
+`SequenceModule.forecast`: one sample, the input window shifted by one step of a sinusoid at each step, and the hidden states
+carried between steps. (The untrained models are not fed their own predictions, which can diverge.) Reports the latency per
+step, the time to export and to load the onnxruntime session, and the largest difference between the two outputs relative
+to the largest eager output, on GRU, LSTM, LRU, CNN, and transformer configs. The import times of torch with the package and
+of onnxruntime are measured in fresh interpreters.
+
+Usage: python benchmarks/benchmark_onnx.py [--configs gru lstm lru cnn transformer] [--seq_len 48] [--steps 100] [--num_threads 1]
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ts_src.SequenceModel import SequenceModel
+from ts_src.OnnxSequenceModel import OnnxSequenceModel
+
+CONFIGS = {'gru': dict(base_type = ['gru'], base_hidden_size = [64]),
+           'lstm': dict(base_type = ['lstm'], base_hidden_size = [64]),
+           'lru': dict(base_type = ['lru'], base_hidden_size = [16], base_lru_num_filterbanks = [1]),
+           'cnn': dict(base_type = ['cnn'], base_hidden_size = [64],
+                       base_cnn_out_channels = [[64]], base_cnn_kernel_size = [[(7,)]], base_cnn_causal_pad = [True]),
+           'transformer': dict(base_type = ['transformer'], base_hidden_size = [64], base_num_heads = [4],
+                               base_transformer_dim_feedforward = [256])}
+
+def build_model(config, seq_len):
+  kwargs = dict(input_size = [1], input_len = [seq_len], input_names = ['x'],
+                output_size = [1], output_len = [1], output_names = ['y'],
+                hidden_out_features = [64], hidden_activation = ['relu'])
+  kwargs.update(CONFIGS[config])
+  return SequenceModel(**kwargs).eval()
+
+def forecast(fn, signal, seq_len, steps):
+  '''
+  Runs the per-step loop of `SequenceModule.forecast`, shifting the input window along `signal` by one step at a time.
+  '''
+  hiddens, forecast = None, []
+  for n in range(steps):
+    prediction, hiddens = fn(signal[:, n:(n + seq_len)], hiddens)
+    forecast.append(prediction[:, -1:])
+  return torch.cat(forecast, 1)
+
+def import_time(statement):
+  start = time.perf_counter()
+  subprocess.run([sys.executable, '-c', statement], check = True, capture_output = True,
+                 cwd = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+  return time.perf_counter() - start
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--configs', nargs = '+', default = list(CONFIGS), choices = list(CONFIGS))
+  parser.add_argument('--seq_len', type = int, default = 48)
+  parser.add_argument('--steps', type = int, default = 100)
+  parser.add_argument('--num_threads', type = int, default = 1)
+  args = parser.parse_args()
+
+  warnings.filterwarnings('ignore')
+  torch.manual_seed(0)
+  torch.set_num_threads(args.num_threads)
+
+  print(f"import torch + ts_src: {import_time('import torch, ts_src'):.2f} s, import onnxruntime: {import_time('import onnxruntime'):.2f} s")
+
+  signal = torch.sin(2 * torch.pi * torch.arange(args.seq_len + args.steps) / 24).reshape(1, -1, 1)
+
+  print(f"{'config':>12} {'eager (ms/step)':>16} {'onnx (ms/step)':>15} {'export (s)':>11} {'load (s)':>9} {'max rel diff':>13}")
+  with tempfile.TemporaryDirectory() as model_dir:
+    for config in args.configs:
+      model = build_model(config, args.seq_len)
+      path = os.path.join(model_dir, f"{config}.onnx")
+
+      start = time.perf_counter()
+      OnnxSequenceModel.export(model, path, input_len = args.seq_len)
+      export = time.perf_counter() - start
+
+      start = time.perf_counter()
+      onnx_model = OnnxSequenceModel(path, num_threads = args.num_threads)
+      load = time.perf_counter() - start
+
+      with torch.no_grad():
+        eager = lambda input, hiddens: model(input, hiddens = hiddens)
+        results = {}
+        for name, fn in [('eager', eager), ('onnx', onnx_model)]:
+          forecast(fn, signal, args.seq_len, 2) # warm up
+          start = time.perf_counter()
+          results[name] = forecast(fn, signal, args.seq_len, args.steps)
+          results[name + '_time'] = 1e3 * (time.perf_counter() - start) / args.steps
+
+      diff = ((results['eager'] - results['onnx']).abs().max() / results['eager'].abs().max()).item()
+
+      print(f"{config:>12} {results['eager_time']:>16.3f} {results['onnx_time']:>15.3f} {export:>11.2f} {load:>9.3f} {diff:>13.2e}")
+
+if __name__ == '__main__':
+  main()
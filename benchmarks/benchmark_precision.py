@@ -0,0 +1,115 @@
+'''
+Compares fp32 and bf16 (`SequenceModule(precision = 'bf16')`) training and inference on CPU, on GRU, LSTM, LRU, CNN, and
+transformer configs. Both precisions train the same initial model on the same batches of a noisy sinusoid; the report gives
+training and inference throughput in samples/s, the validation MSE after training, and the largest difference between the bf16
+and fp32 predictions of the fp32-trained model.
+
+Usage: python benchmarks/benchmark_precision.py [--configs gru lstm lru cnn transformer] [--batch_size 64] [--seq_len 128] [--steps 50]
+'''
+
+import argparse
+import copy
+import os
+import sys
+import time
+import warnings
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ts_src.SequenceModel import SequenceModel
+from ts_src.SequenceModule import SequenceModule
+from ts_src.Criterion import Criterion
+
+CONFIGS = {'gru': dict(base_type = ['gru'], base_hidden_size = [64]),
+           'lstm': dict(base_type = ['lstm'], base_hidden_size = [64]),
+           'lru': dict(base_type = ['lru'], base_hidden_size = [16], base_lru_num_filterbanks = [1], base_lru_mode = ['scan']),
+           'cnn': dict(base_type = ['cnn'], base_hidden_size = [64],
+                       base_cnn_out_channels = [[64]], base_cnn_kernel_size = [[(7,)]], base_cnn_causal_pad = [True]),
+           'transformer': dict(base_type = ['transformer'], base_hidden_size = [64], base_num_heads = [4],
+                               base_transformer_dim_feedforward = [256], base_fused_attn = [True])}
+
+def build_model(config, seq_len):
+  kwargs = dict(input_size = [1], input_len = [seq_len], input_names = ['x'],
+                output_size = [1], output_len = [1], output_names = ['y'],
+                hidden_out_features = [64], hidden_activation = ['relu'])
+  kwargs.update(CONFIGS[config])
+  return SequenceModel(**kwargs)
+
+def make_batches(num_batches, batch_size, seq_len, seed):
+  generator = torch.Generator().manual_seed(seed)
+  t = torch.arange(seq_len + 1).float()
+  batches = []
+  for _ in range(num_batches):
+    phase = 2 * torch.pi * torch.rand((batch_size, 1), generator = generator)
+    x = torch.sin(2 * torch.pi * t / 24 + phase) + 0.1 * torch.randn((batch_size, seq_len + 1), generator = generator)
+    batches.append((x[:, :-1, None], x[:, -1:, None]))
+  return batches
+
+def timed(fn, num_samples, steps):
+  fn() # warm up
+  start = time.perf_counter()
+  for _ in range(steps):
+    fn()
+  return num_samples * steps / (time.perf_counter() - start)
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--configs', nargs = '+', default = list(CONFIGS), choices = list(CONFIGS))
+  parser.add_argument('--batch_size', type = int, default = 64)
+  parser.add_argument('--seq_len', type = int, default = 128)
+  parser.add_argument('--steps', type = int, default = 50)
+  args = parser.parse_args()
+
+  warnings.filterwarnings('ignore')
+  torch.manual_seed(0)
+
+  loss_fn = Criterion('mse', dims = (0, 1))
+  train_batches = make_batches(args.steps, args.batch_size, args.seq_len, seed = 0)
+  val_input, val_target = make_batches(1, 4 * args.batch_size, args.seq_len, seed = 1)[0]
+
+  print(f"{'config':>12} {'precision':>9} {'train (samples/s)':>18} {'infer (samples/s)':>18} {'val mse':>9} {'max abs diff':>13}")
+  for config in args.configs:
+    model_init = build_model(config, args.seq_len)
+
+    results, modules = {}, {}
+    for precision in ['fp32', 'bf16']:
+      model = copy.deepcopy(model_init)
+      module = SequenceModule(model = model, opt = torch.optim.Adam(model.parameters(), lr = 1e-3), loss_fn = loss_fn,
+                              precision = precision)
+      optimizer = module.opt
+
+      batch_iter = iter(range(len(train_batches)))
+      def train_step():
+        input, target = train_batches[next(batch_iter, 0) % len(train_batches)]
+        optimizer.zero_grad()
+        loss = loss_fn(module(input)[0], target)
+        loss.backward()
+        optimizer.step()
+        model.constrain()
+
+      def infer_step():
+        with torch.no_grad():
+          return module(val_input)[0]
+
+      model.train()
+      train = timed(train_step, args.batch_size, args.steps - 1)
+      model.eval()
+      infer = timed(infer_step, val_input.shape[0], 10)
+      val_mse = loss_fn(infer_step(), val_target).item()
+
+      results[precision], modules[precision] = (train, infer, val_mse), module
+
+    # bf16 inference of the fp32-trained model
+    with torch.no_grad():
+      reference = modules['fp32'](val_input)[0]
+      modules['fp32'].precision = 'bf16'
+      diff = (modules['fp32'](val_input)[0] - reference).abs().max().item()
+      modules['fp32'].precision = 'fp32'
+
+    for precision, (train, infer, val_mse) in results.items():
+      print(f"{config:>12} {precision:>9} {train:>18.0f} {infer:>18.0f} {val_mse:>9.4f} {diff if precision == 'bf16' else 0.:>13.2e}")
+
+if __name__ == '__main__':
+  main()
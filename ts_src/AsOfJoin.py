@@ -0,0 +1,275 @@
+import torch
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+
+class AsOfJoin():
+  '''
+  Aligns several irregular, time-indexed sources onto a common time grid for each id.
+
+  Each source is matched to the grid in one vectorized pass using sorted-merge (searchsorted) logic:
+  as-of/forward-fill joins take the last observation at or before each grid time, and aggregate joins
+  reduce all observations in (grid[k-1], grid[k]] into grid step k. Ids are joined in parallel.
+
+  Grid steps without a matching observation are filled per source, so that no NaNs reach training by default: 'asof' and
+  'ffill' sources carry their last observation forward (and their first observation back over the steps before it), and
+  empty 'mean', 'max', and 'min' buckets are 0, like empty 'sum' and 'count' buckets. Observations before the first grid
+  time are dropped.
+  '''
+
+  def __init__(self,
+               time_name = 'time',
+               how = None,
+               grid = None, dt = None,
+               tolerance = None,
+               fill_value = None,
+               num_workers = 1,
+               device = 'cpu', dtype = torch.float32):
+    '''
+    Initializes the AsOfJoin instance.
+
+    Args:
+        time_name (str): Name of the time column of the joined data.
+        how (dict): Join method for each source name. Options are 'asof', 'ffill', 'sum', 'mean', 'max', 'min', or 'count'.
+                    Sources not in `how` use 'asof'.
+        grid (str): Name of the source whose timestamps form the grid (e.g. the fastest sensor). Ignored if `dt` is given.
+        dt (pd.Timedelta or float): Regular grid spacing, spanning the earliest to the latest observation of an id.
+        tolerance (pd.Timedelta or float): Maximum age of an 'asof' observation. Older observations are replaced by the fill value
+                                           of the source, which must then be a number. 'ffill' never expires.
+        fill_value (Union[str, float, dict]): Value of grid steps without a matching observation (steps before the first observation,
+                                              expired 'asof' observations, and empty 'mean', 'max', and 'min' buckets), for all
+                                              sources or for each source name. 'ffill' carries the last filled step forward and
+                                              the first filled step back over the leading steps. A number, including NaN, fills
+                                              these steps with it. Sources without a fill value use 'ffill' for 'asof' and
+                                              'ffill' joins and 0 for 'mean', 'max', and 'min' joins.
+        num_workers (int): Number of ids joined in parallel.
+        device (str): The device of the joined tensors.
+        dtype (torch.dtype): The data type of the joined tensors.
+    '''
+
+    locals_ = locals().copy()
+
+    for arg in locals_:
+      if arg != 'self':
+        setattr(self, arg, locals_[arg])
+
+    self.how = self.how or {}
+
+    for name, how in self.how.items():
+      if how not in ['asof', 'ffill', 'sum', 'mean', 'max', 'min', 'count']:
+        raise ValueError(f"how ({how}) for source ({name}) must be 'asof', 'ffill', 'sum', 'mean', 'max', 'min', or 'count'.")
+
+    if (self.grid is None) and (self.dt is None):
+      raise ValueError(f"Either `grid` or `dt` must be given.")
+
+    fill_values = self.fill_value.items() if isinstance(self.fill_value, dict) else [(None, self.fill_value)]
+    for name, fill_value in fill_values:
+      if isinstance(fill_value, str) and (fill_value != 'ffill'):
+        raise ValueError(f"fill_value ({fill_value}) for source ({name}) must be 'ffill' or a number.")
+
+  def to_tensor(self, source):
+    '''
+    Converts a source into sorted time and value tensors.
+
+    Args:
+        source (Union[pd.Series, pd.DataFrame, tuple]): A source indexed by time, or a (time, values) tuple.
+
+    Returns:
+        tuple: The sorted times (num_obs,), the values (num_obs, num_features), and the time zone.
+    '''
+
+    if isinstance(source, (pd.Series, pd.DataFrame)):
+      time, values = source.index, source.values
+    else:
+      time, values = source
+
+    time = pd.Series(np.asarray(time) if not isinstance(time, (pd.Index, pd.Series)) else time)
+
+    tz = None
+    if pd.api.types.is_datetime64_any_dtype(time):
+      tz = time.dt.tz
+      time = torch.tensor(time.dt.tz_convert('UTC').dt.tz_localize(None).values.astype('datetime64[ns]').astype(np.int64) if tz is not None
+                          else time.values.astype('datetime64[ns]').astype(np.int64))
+    else:
+      time = torch.tensor(time.values.astype(np.float64))
+
+    values = (values if isinstance(values, torch.Tensor) else torch.tensor(np.array(values))).to(device = self.device, dtype = self.dtype)
+    values = values.reshape(len(time), -1)
+
+    time = time.to(device = self.device)
+    if (time.diff() < 0).any():
+      sort_idx = time.argsort(stable = True)
+      time, values = time[sort_idx], values[sort_idx]
+
+    return time, values, tz
+
+  def to_scalar(self, value):
+    '''
+    Converts a time span to the units of the time tensors.
+    '''
+    if isinstance(value, (pd.Timedelta, np.timedelta64)) or hasattr(value, 'total_seconds'):
+      return pd.Timedelta(value).value
+    return value
+
+  def get_fill_value(self, name, how):
+    '''
+    Returns the fill value of a source.
+
+    Args:
+        name (str): Name of the source.
+        how (str): The join method of the source.
+
+    Returns:
+        Union[str, float]: 'ffill' or a number.
+    '''
+
+    if isinstance(self.fill_value, dict):
+      fill_value = self.fill_value.get(name)
+    else:
+      fill_value = self.fill_value
+
+    if fill_value is None:
+      fill_value = 'ffill' if how in ['asof', 'ffill'] else 0.
+
+    if (how == 'asof') and (self.tolerance is not None) and (fill_value == 'ffill'):
+      raise ValueError(f"A tolerance requires a numeric fill_value for source ({name}). Forward-filling would restore the expired observations.")
+
+    return fill_value
+
+  def fill(self, joined, valid, fill_value, name = None):
+    '''
+    Fills the grid steps without a matching observation.
+
+    Args:
+        joined (torch.Tensor): The joined values of shape (grid_len, num_features).
+        valid (torch.Tensor): Boolean tensor of shape (grid_len,) marking the steps with a matching observation.
+        fill_value (Union[str, float]): 'ffill' or a number.
+        name (str, optional): Name of the source, for error messages.
+
+    Returns:
+        torch.Tensor: The filled values.
+    '''
+
+    if fill_value != 'ffill':
+      return joined.masked_fill(~valid.unsqueeze(-1), fill_value)
+
+    if not valid.any():
+      raise ValueError(f"Source ({name}) has no observation on the grid to forward-fill. Pass a numeric fill_value to fill it.")
+
+    # index of the last valid step at or before each step. Leading steps take the first valid step
+    step_idx = torch.arange(valid.shape[0], device = valid.device)
+    first_idx = valid.long().argmax()
+    last_idx = torch.where(valid, step_idx, first_idx).cummax(0).values
+
+    return joined[last_idx]
+
+  def join_source(self, grid_time, time, values, how, name = None):
+    '''
+    Joins one source onto the grid.
+
+    Args:
+        grid_time (torch.Tensor): Grid times of shape (grid_len,).
+        time (torch.Tensor): Sorted source times of shape (num_obs,).
+        values (torch.Tensor): Source values of shape (num_obs, num_features).
+        how (str): The join method.
+        name (str, optional): Name of the source, for its fill value and error messages.
+
+    Returns:
+        torch.Tensor: The joined values of shape (grid_len, num_features).
+    '''
+
+    grid_len, num_features = grid_time.shape[0], values.shape[-1]
+
+    if how in ['asof', 'ffill']:
+      # last observation at or before each grid time
+      obs_idx = torch.searchsorted(time, grid_time, right = True) - 1
+
+      joined = values[obs_idx.clamp(min = 0)]
+
+      valid = obs_idx >= 0
+      if (how == 'asof') and (self.tolerance is not None):
+        valid = valid & ((grid_time - time[obs_idx.clamp(min = 0)]) <= self.to_scalar(self.tolerance))
+
+      joined = self.fill(joined, valid, self.get_fill_value(name, how), name)
+
+    else:
+      # grid step of each observation, covering (grid[k-1], grid[k]]. Observations before the first grid time are dropped
+      bucket = torch.searchsorted(grid_time, time, right = False)
+
+      keep = (bucket < grid_len) & (time >= grid_time[0])
+      bucket, values = bucket[keep], values[keep]
+
+      count = torch.bincount(bucket, minlength = grid_len).to(values).unsqueeze(-1)
+
+      if how == 'count':
+        return count.expand(grid_len, num_features).clone()
+
+      reduce = {'sum': 'sum', 'mean': 'mean', 'max': 'amax', 'min': 'amin'}[how]
+
+      joined = torch.zeros((grid_len, num_features)).to(values)
+      joined = joined.scatter_reduce(0, bucket.unsqueeze(-1).expand(-1, num_features), values,
+                                     reduce = reduce, include_self = False)
+
+      if how != 'sum':
+        joined = self.fill(joined, count.squeeze(-1) > 0, self.get_fill_value(name, how), name)
+
+    return joined
+
+  def join(self, record):
+    '''
+    Joins the sources of one id.
+
+    Args:
+        record (dict): The id ('id') and its sources, keyed by source name.
+
+    Returns:
+        dict: The id, the grid times (`time_name`), and a (grid_len, num_features) tensor for each source.
+    '''
+
+    names = [name for name in record if name != 'id']
+
+    sources = {name: self.to_tensor(record[name]) for name in names}
+
+    tz = next((source[2] for source in sources.values() if source[2] is not None), None)
+
+    if self.dt is not None:
+      start = torch.stack([source[0][0] for source in sources.values()]).min()
+      end = torch.stack([source[0][-1] for source in sources.values()]).max()
+      dt = self.to_scalar(self.dt)
+      grid_time = start + dt * torch.arange(int(-((start - end) // dt)) + 1, device = self.device).to(start)
+    else:
+      grid_time = sources[self.grid][0]
+
+    joined = {'id': record['id']} if 'id' in record else {}
+
+    if grid_time.dtype == torch.int64:
+      time = pd.Series(pd.to_datetime(grid_time.cpu().numpy(), unit = 'ns'))
+      joined[self.time_name] = time.dt.tz_localize('UTC').dt.tz_convert(tz) if tz is not None else time
+    else:
+      joined[self.time_name] = pd.Series(grid_time.cpu().numpy())
+
+    for name, (time, values, _) in sources.items():
+      joined[name] = self.join_source(grid_time, time, values, self.how.get(name, 'asof'), name)
+
+    return joined
+
+  def __call__(self, data):
+    '''
+    Joins the sources of each id in parallel.
+
+    Args:
+        data (Union[dict, List[dict]]): One record or a list of records, each holding an 'id' and its sources.
+
+    Returns:
+        Union[dict, List[dict]]: The joined records, ready for TimeSeriesDataModule.
+    '''
+
+    if isinstance(data, dict):
+      return self.join(data)
+
+    if self.num_workers > 1:
+      with ThreadPoolExecutor(max_workers = self.num_workers) as executor:
+        return list(executor.map(self.join, data))
+
+    return [self.join(record) for record in data]
@@ -33,6 +33,12 @@ class Attention(torch.nn.MultiheadAttention):
       concat_bias (bool, optional): Whether to include bias in the concatenation layer (concat type). Defaults to False.
       average_attn_weights (bool, optional): Whether to average the attention weights across heads. Defaults to False.
       is_causal (bool, optional): Whether the attention is causal (supports autoregressive property). Defaults to False.
+      fused (bool, optional): Whether to use the fused path ('dot' attention only): one packed query/key/value projection,
+                              `in_proj_weight`, and `torch.nn.functional.scaled_dot_product_attention`. Requires `embed_dim`
+                              to be divisible by `num_heads`. Defaults to False.
+      need_weights (bool, optional): Whether the attention weights of the last forward pass are kept in `weight` (None
+                                     otherwise). The fused path then computes them at the cost of the SDPA kernels. See
+                                     `LayerCapture`, which sets it while capturing. Defaults to False.
       dropout_p (float, optional): The dropout probability. Defaults to 0.0.
       device (str, optional): The device for the computation. Defaults to 'cpu'.
       dtype (torch.dtype, optional): The data type. Defaults to torch.float32.
@@ -49,6 +55,7 @@ class Attention(torch.nn.MultiheadAttention):
                concat_weight_reg=[0.001, 1], concat_weight_norm=2, concat_bias=False,
                average_attn_weights=False,
                is_causal=False,
+               fused=False, need_weights=False,
                dropout_p=0.0,
                device="cpu",
                dtype=torch.float32):
@@ -72,6 +79,31 @@ class Attention(torch.nn.MultiheadAttention):
       elif self.attn_type == "concat":
           self.score_fn = self.concat_fn
 
+      # Only the blocks below (or the packed in_proj_weight, when fused) project the inputs; drop the parent's unused parameters
+      self.out_proj = None
+      self.in_proj_weight, self.in_proj_bias = None, None
+
+      self.register_buffer('causal_mask', torch.ones((0, 0), device = self.device, dtype = torch.bool), persistent = False)
+
+      # Key/value cache of incremental decoding, off until `init_cache`
+      self.cache_len, self.key_cache, self.value_cache = None, None, None
+
+      if self.fused:
+        if self.attn_type != 'dot':
+          raise ValueError(f"The fused path supports 'dot' attention only (attn_type = '{self.attn_type}').")
+        if self.embed_dim % self.num_heads != 0:
+          raise ValueError(f"The fused path requires embed_dim ({self.embed_dim}) to be divisible by num_heads ({self.num_heads}).")
+
+        # Rows are the query, key and value projections, each split evenly into heads. Initialized like the unfused blocks.
+        bound = 1 / self.embed_dim ** 0.5
+        self.in_proj_weight = torch.nn.Parameter(torch.empty((3 * self.embed_dim, self.embed_dim), device = self.device, dtype = self.dtype).uniform_(-bound, bound))
+
+        biases = [self.query_bias, self.key_bias, self.value_bias]
+        if any(biases):
+          # Projections without a bias keep theirs at zero
+          self.register_buffer('in_proj_bias_mask', torch.tensor(biases, device = self.device, dtype = self.dtype).repeat_interleave(self.embed_dim), persistent = False)
+          self.in_proj_bias = torch.nn.Parameter(torch.empty((3 * self.embed_dim,), device = self.device, dtype = self.dtype).uniform_(-bound, bound) * self.in_proj_bias_mask)
+
       self.query_dim = self.query_dim or self.embed_dim
       self.key_dim = self.key_dim or self.embed_dim
       self.value_dim = self.value_dim or self.embed_dim
@@ -85,7 +117,8 @@ class Attention(torch.nn.MultiheadAttention):
       self.head_dims = np.round(self.embed_dim / self.num_heads).astype(int).repeat(self.num_heads - 1).tolist()
       self.head_dims += [int(self.embed_dim - np.sum(self.head_dims))]
 
-      for dim in self.head_dims:
+      # The fused path projects with in_proj_weight instead of per-head blocks
+      for dim in ([] if self.fused else self.head_dims):
         self.query_blocks.append(HiddenLayer(in_features = self.embed_dim,
                                              out_features = dim,
                                              bias = self.query_bias,
@@ -139,6 +172,13 @@ class Attention(torch.nn.MultiheadAttention):
                                                                   device = self.device,
                                                                   dtype = self.dtype)]))
 
+  def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+    # Checkpoints saved before the unused parent parameters were dropped still hold them
+    for name in ['out_proj.weight', 'out_proj.bias'] + ([] if self.fused else ['in_proj_weight', 'in_proj_bias']):
+      state_dict.pop(prefix + name, None)
+
+    super(Attention, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
   def dot_fn(self, query, key, block_idx):
     '''
     Compute the dot-product attention score between query and key.
@@ -191,6 +231,112 @@ class Attention(torch.nn.MultiheadAttention):
     score = self.concat_blocks[block_idx](torch.cat((query, key), -1))
     return score
 
+  def get_causal_mask(self, query_len, key_len):
+    '''
+    Returns the causal mask of shape (query_len, key_len), True where a query step may attend to a key step. The mask is cached
+    and only rebuilt when a longer one is needed.
+    '''
+    if (self.causal_mask.shape[0] < query_len) or (self.causal_mask.shape[1] < key_len):
+      size = max(query_len, key_len, *self.causal_mask.shape)
+      self.causal_mask = torch.ones((size, size), device = self.causal_mask.device, dtype = torch.bool).tril(diagonal = 0)
+
+    return self.causal_mask[:query_len, :key_len]
+
+  def fused_forward(self, query, key, value):
+    '''
+    Fused 'dot' attention: one packed projection and scaled_dot_product_attention over all heads.
+    '''
+    num_samples, query_len, _ = query.shape
+    key_len = key.shape[1]
+
+    bias = None if self.in_proj_bias is None else self.in_proj_bias * self.in_proj_bias_mask
+
+    if (query is key) and (key is value):
+      query_, key_, value_ = torch.nn.functional.linear(query, self.in_proj_weight, bias).chunk(3, -1)
+    else:
+      weights, biases = self.in_proj_weight.chunk(3, 0), (None, None, None) if bias is None else bias.chunk(3)
+      query_, key_, value_ = [torch.nn.functional.linear(x, w, b) for x, w, b in zip((query, key, value), weights, biases)]
+
+    # (num_samples, seq_len, embed_dim) -> (num_samples, num_heads, seq_len, head_dim)
+    query_, key_, value_ = [x.unflatten(-1, (self.num_heads, -1)).transpose(1, 2) for x in (query_, key_, value_)]
+
+    if self.need_weights:
+      score = query_ @ key_.transpose(-2, -1) / torch.math.sqrt(query_.shape[-1])
+      if self.is_causal:
+        score = score.masked_fill(~self.get_causal_mask(query_len, key_len), -float('inf'))
+
+      weight = torch.softmax(score, dim = -1)
+      output = weight @ value_
+
+      # same layout as the unfused path: heads stacked along the key dimension, (num_samples, num_heads * key_len, query_len)
+      weight = weight.transpose(-2, -1).reshape(num_samples, self.num_heads * key_len, query_len)
+      if self.average_attn_weights:
+        weight = weight.mean(1)
+    else:
+      output = torch.nn.functional.scaled_dot_product_attention(query_, key_, value_, is_causal = self.is_causal)
+      weight = None
+
+    self.weight = weight
+
+    return self.dropout(output.transpose(1, 2).reshape(num_samples, query_len, self.embed_dim))
+
+  def init_cache(self, cache_len):
+    '''
+    Starts incremental decoding of causal 'dot' self-attention. Later calls only pass the new steps, which attend to the cached
+    keys and values of the previous steps.
+
+    Args:
+        cache_len (int): Number of steps attended to by each step, itself included. Older keys and values are dropped.
+    '''
+    if (self.attn_type != 'dot') or (not self.is_causal):
+      raise ValueError(f"Key/value caching requires causal 'dot' attention (attn_type = '{self.attn_type}', is_causal = {self.is_causal}).")
+
+    self.cache_len, self.key_cache, self.value_cache = cache_len, None, None
+
+  def clear_cache(self):
+    '''
+    Ends incremental decoding and frees the cache.
+    '''
+    self.cache_len, self.key_cache, self.value_cache = None, None, None
+
+  def cached_forward(self, input):
+    '''
+    Self-attention of new steps over the cached steps and themselves. Each step attends to the last `cache_len` steps.
+    '''
+    num_samples, input_len, _ = input.shape
+
+    if self.fused:
+      bias = None if self.in_proj_bias is None else self.in_proj_bias * self.in_proj_bias_mask
+      query_, key_, value_ = torch.nn.functional.linear(input, self.in_proj_weight, bias).chunk(3, -1)
+    else:
+      query_, key_, value_ = [torch.cat([block(input) for block in blocks], -1)
+                              for blocks in (self.query_blocks, self.key_blocks, self.value_blocks)]
+
+    past_len = 0 if self.key_cache is None else self.key_cache.shape[1]
+    if past_len > 0:
+      key_, value_ = torch.cat((self.key_cache, key_), 1), torch.cat((self.value_cache, value_), 1)
+
+    # Step i of the input is at position past_len + i of the keys
+    query_pos = past_len + torch.arange(input_len, device = input.device).unsqueeze(1)
+    key_pos = torch.arange(past_len + input_len, device = input.device).unsqueeze(0)
+    attn_mask = (key_pos <= query_pos) & (key_pos > query_pos - self.cache_len)
+
+    if self.fused:
+      query_, key_h, value_h = [x.unflatten(-1, (self.num_heads, -1)).transpose(1, 2) for x in (query_, key_, value_)]
+      output = torch.nn.functional.scaled_dot_product_attention(query_, key_h, value_h, attn_mask = attn_mask)
+      output = output.transpose(1, 2).reshape(num_samples, input_len, self.embed_dim)
+    else:
+      output = []
+      for query_h, key_h, value_h in zip(query_.split(self.head_dims, -1), key_.split(self.head_dims, -1), value_.split(self.head_dims, -1)):
+        score_h = torch.bmm(query_h, key_h.transpose(-2, -1)) / torch.math.sqrt(query_h.shape[-1])
+        output.append(torch.bmm(torch.softmax(score_h.masked_fill(~attn_mask, -float('inf')), dim=-1), value_h))
+      output = torch.cat(output, -1)
+
+    self.key_cache, self.value_cache = key_[:, -self.cache_len:].detach(), value_[:, -self.cache_len:].detach()
+    self.weight = None
+
+    return self.dropout(output)
+
   def forward(self, query, key, value, attn_mask=None):
     '''
     Perform the forward pass of the attention layer.
@@ -205,14 +351,18 @@ class Attention(torch.nn.MultiheadAttention):
     Returns:
         torch.Tensor: The output tensor of shape (num_samples, query_len, value_dim).
     '''
+    if self.cache_len is not None:
+      return self.cached_forward(query)
+
+    if self.fused:
+      return self.fused_forward(query, key, value)
+
     num_samples, query_len, query_dim = query.shape
     _, key_len, key_dim = key.shape
     _, value_len, value_dim = value.shape
 
-    ones = torch.ones((query_len, key_len), device=self.device, dtype=torch.bool)
-
-    attn_mask = ones.tril(diagonal=0).transpose(-2, -1) if self.is_causal else ones
-    attn_mask = attn_mask.to(query).masked_fill(~attn_mask, -float('inf')) if attn_mask.dtype == torch.bool else attn_mask
+    # scores are (num_samples, key_len, query_len)
+    attn_mask = self.get_causal_mask(query_len, key_len).transpose(-2, -1) if self.is_causal else None
 
     output, weight = [], []
     for block_idx, (query_block, key_block, value_block) in enumerate(zip(self.query_blocks, self.key_blocks, self.value_blocks)):
@@ -221,20 +371,21 @@ class Attention(torch.nn.MultiheadAttention):
 
       score_h = self.score_fn(query_h, key_h, block_idx)
 
-      weight_h = torch.softmax(score_h + attn_mask, dim=1)
+      weight_h = torch.softmax(score_h if attn_mask is None else score_h.masked_fill(~attn_mask, -float('inf')), dim=1)
 
       output_h = torch.bmm(weight_h.transpose(-2, -1), value_h)
 
-      weight.append(weight_h)
+      if self.need_weights: weight.append(weight_h)
       output.append(output_h)
 
     output = self.dropout(torch.cat(output, -1))
-    weight = torch.cat(weight, 1)
-
-    if self.average_attn_weights:
-      weight = weight.mean(1)
 
-    self.weight = weight
+    # The weights are only kept when requested, so they do not hold the graph of the last pass alive
+    if self.need_weights:
+      weight = torch.cat(weight, 1)
+      self.weight = weight.mean(1) if self.average_attn_weights else weight
+    else:
+      self.weight = None
 
     return output
 
@@ -246,6 +397,14 @@ class Attention(torch.nn.MultiheadAttention):
         torch.Tensor: The regularization loss.
     '''
     loss = 0
+    if self.fused:
+      # regularize each head of each projection separately, as the unfused blocks are
+      for weight, weight_reg in zip(self.in_proj_weight.chunk(3, 0), [self.query_weight_reg, self.key_weight_reg, self.value_weight_reg]):
+        for weight_h in weight.chunk(self.num_heads, 0):
+          loss += weight_reg[0] * torch.norm(weight_h, p=weight_reg[1]) * int(weight_h.requires_grad)
+
+      return loss
+
     for name, param in self.named_parameters():
       if 'weight' in name:
         if 'query' in name:
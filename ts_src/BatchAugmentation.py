@@ -0,0 +1,184 @@
+import torch
+
+class BatchAugmentation():
+  '''
+  Applies random jitter, magnitude scaling, time warping, and mixup to whole batches on the fly.
+
+  The input and output of a batch are laid out on their common window, so the autoregressive input channels (`output_input_idx`)
+  and their output channels (`input_output_idx`) hold one series and receive the same noise, scale, and warp.
+  Every sample draws its own parameters. Padded samples and masked output entries are left unchanged.
+  '''
+
+  def __init__(self,
+               jitter_std = 0.,
+               scale_std = 0.,
+               warp_std = 0., warp_knots = 4,
+               mixup_alpha = 0.,
+               p = 1.,
+               device = 'cpu', dtype = torch.float32):
+    '''
+    Initializes the BatchAugmentation instance.
+
+    Args:
+        jitter_std (float): Standard deviation of the additive Gaussian noise.
+        scale_std (float): Standard deviation of the multiplicative scale of each sample and series, centered at 1.
+        warp_std (float): Standard deviation of the local speed of the time warp, centered at 1.
+        warp_knots (int): Number of knots of the smooth speed curve of the time warp.
+        mixup_alpha (float): Concentration of the Beta distribution of the mixup weights. Mixup is disabled if 0.
+        p (float): Probability that each augmentation is applied to a sample.
+        device (str): The device of the augmentation.
+        dtype (torch.dtype): The data type of the augmentation.
+    '''
+
+    locals_ = locals().copy()
+
+    for arg in locals_:
+      if arg != 'self':
+        setattr(self, arg, locals_[arg])
+
+    if self.warp_knots < 2:
+      raise ValueError(f"warp_knots ({self.warp_knots}) must be at least 2.")
+
+  def sample_mask(self, num_samples, device):
+    '''
+    Draws which samples an augmentation is applied to.
+    '''
+    return (torch.rand((num_samples, 1, 1), device = device) < self.p)
+
+  def to_window(self, input, output, input_mask, output_mask, output_offset, output_input_idx, input_output_idx):
+    '''
+    Lays out the input and output on their common window.
+
+    Args:
+        input (torch.Tensor): Input of shape (num_samples, input_len, input_size).
+        output (torch.Tensor): Output of shape (num_samples, output_len, output_size).
+        input_mask (torch.Tensor): Boolean mask of shape (input_len, input_size) of the input entries that hold data.
+        output_mask (torch.Tensor): Boolean mask of shape (output_len, output_size) of the output entries that hold data.
+        output_offset (int): Window position of the first output step.
+        output_input_idx (torch.Tensor): Input channels that are autoregressive outputs.
+        input_output_idx (torch.Tensor): Output channels fed back as inputs.
+
+    Returns:
+        tuple: The window of shape (num_samples, window_len, num_series), its validity mask of shape (window_len, num_series),
+               and the series of each output channel.
+    '''
+
+    num_samples, input_len, input_size = input.shape
+    _, output_len, output_size = output.shape
+
+    window_len = max(input_len, output_offset + output_len)
+
+    # output channels share the series of their autoregressive input channel
+    output_series = torch.arange(input_size, input_size + output_size, device = input.device)
+    if (len(output_input_idx) > 0) and (len(input_output_idx) > 0):
+      output_series[torch.as_tensor(input_output_idx, device = input.device)] = torch.as_tensor(output_input_idx, device = input.device)
+
+    num_series = input_size + output_size
+
+    window = torch.zeros((num_samples, window_len, num_series)).to(input)
+    valid = torch.zeros((window_len, num_series), dtype = torch.bool, device = input.device)
+
+    window[:, output_offset:(output_offset + output_len), output_series] = output * output_mask
+    valid[output_offset:(output_offset + output_len), output_series] = output_mask
+
+    window[:, :input_len, :input_size] = torch.where(input_mask, input, window[:, :input_len, :input_size])
+    valid[:input_len, :input_size] |= input_mask
+
+    return window, valid, output_series
+
+  def time_warp(self, window, valid):
+    '''
+    Resamples each sample along a smooth, monotonic random time grid.
+
+    Args:
+        window (torch.Tensor): Window of shape (num_samples, window_len, num_series).
+        valid (torch.Tensor): Validity mask of shape (window_len, num_series).
+
+    Returns:
+        torch.Tensor: The warped window.
+    '''
+
+    num_samples, window_len, num_series = window.shape
+
+    if window_len < 2: return window
+
+    speed = 1 + self.warp_std * torch.randn((num_samples, 1, self.warp_knots), device = window.device)
+    speed = torch.nn.functional.interpolate(speed, size = window_len - 1, mode = 'linear', align_corners = True).squeeze(1).clamp(min = 1e-3)
+
+    position = torch.nn.functional.pad(speed.cumsum(-1), (1, 0))
+    position = position / position[:, -1:] * (window_len - 1)
+
+    idx0 = position.floor().long().clamp(max = window_len - 2)
+    frac = (position - idx0).unsqueeze(-1).to(window)
+
+    valid = valid.unsqueeze(0).expand(num_samples, -1, -1).to(window)
+
+    gather = lambda x, idx: x.gather(1, idx.unsqueeze(-1).expand(-1, -1, num_series))
+
+    # interpolate only between valid entries of each series
+    warped = (1 - frac) * gather(window * valid, idx0) + frac * gather(window * valid, idx0 + 1)
+    weight = (1 - frac) * gather(valid, idx0) + frac * gather(valid, idx0 + 1)
+
+    return torch.where(weight > 0, warped / weight.clamp(min = 1e-6), window)
+
+  def __call__(self,
+               input, output, batch_size = None,
+               input_mask = None, output_mask = None,
+               output_input_idx = [], input_output_idx = [],
+               output_offset = 0):
+    '''
+    Augments a batch.
+
+    Args:
+        input (torch.Tensor): Input of shape (num_samples, input_len, input_size).
+        output (torch.Tensor): Output of shape (num_samples, output_len, output_size).
+        batch_size (int): Number of real samples. Samples beyond it are padding and are left unchanged.
+        input_mask (torch.Tensor): Mask of shape (input_len, input_size) of the input entries that hold data. The remaining entries
+                                   are left unchanged.
+        output_mask (torch.Tensor): Mask of shape (output_len, output_size) of the output entries that hold data. The remaining entries
+                                    are left unchanged.
+        output_input_idx (torch.Tensor): Input channels that are autoregressive outputs.
+        input_output_idx (torch.Tensor): Output channels fed back as inputs.
+        output_offset (int): Window position of the first output step.
+
+    Returns:
+        tuple: The augmented input and output.
+    '''
+
+    batch_size = input.shape[0] if batch_size is None else batch_size
+
+    input_, output_ = input[:batch_size], output[:batch_size]
+    num_samples, input_len, input_size = input_.shape
+    _, output_len, output_size = output_.shape
+
+    input_mask = torch.ones((input_len, input_size), dtype = torch.bool, device = input.device) if input_mask is None \
+                 else input_mask.to(device = input.device).bool()
+    output_mask = torch.ones((output_len, output_size), dtype = torch.bool, device = output.device) if output_mask is None \
+                  else output_mask.to(device = output.device).bool()
+
+    window, valid, output_series = self.to_window(input_, output_, input_mask, output_mask, output_offset, output_input_idx, input_output_idx)
+    num_series = window.shape[-1]
+
+    if self.warp_std > 0:
+      window = torch.where(self.sample_mask(num_samples, window.device), self.time_warp(window, valid), window)
+
+    if self.scale_std > 0:
+      scale = 1 + self.scale_std * torch.randn((num_samples, 1, num_series), device = window.device).to(window)
+      window = torch.where(self.sample_mask(num_samples, window.device), window * scale, window)
+
+    if self.jitter_std > 0:
+      noise = self.jitter_std * torch.randn_like(window)
+      window = torch.where(self.sample_mask(num_samples, window.device), window + noise, window)
+
+    if (self.mixup_alpha > 0) and (num_samples > 1):
+      lam = torch.distributions.Beta(self.mixup_alpha, self.mixup_alpha).sample((num_samples, 1, 1)).to(window)
+      lam = torch.where(self.sample_mask(num_samples, window.device), lam, torch.ones_like(lam))
+      window = lam * window + (1 - lam) * window[torch.randperm(num_samples, device = window.device)]
+
+    input_aug = torch.where(input_mask, window[:, :input_len, :input_size], input_)
+    output_aug = torch.where(output_mask, window[:, output_offset:(output_offset + output_len), output_series], output_)
+
+    input = torch.cat((input_aug, input[batch_size:]), 0)
+    output = torch.cat((output_aug, output[batch_size:]), 0)
+
+    return input, output
@@ -22,7 +22,7 @@ class CNN1D(torch.nn.Module):
         pool_stride (list, optional): List of tuples specifying the pooling stride for each layer. Default is [(1,)].
         batch_norm (bool, optional): If True, applies batch normalization after each convolutional layer. Default is False.
         batch_norm_learn (bool, optional): If True, allows the batch normalization layers to learn affine parameters. Default is False.
-        causal_pad (bool, optional): If True, pads the front of the input tensor with zeros before applying the convolutional layers. Default is False.
+        causal_pad (bool, optional): If True, pads the front of the input of each layer with (kernel_size - 1) * dilation zeros, so the output at each step only depends on the past. Default is False.
         device (str, optional): Device on which the model parameters should be stored. Default is None.
         dtype (torch.dtype, optional): Data type for the model parameters. Default is None.
 
@@ -34,6 +34,9 @@ class CNN1D(torch.nn.Module):
         forward(self, input):
             Forward pass method that applies the 1D convolutional layers and pooling layers to the input tensor.
 
+        init_cache(self), clear_cache(self):
+            Start and end streaming, where each forward pass only takes the new steps.
+
     Examples:
         # Create a CNN1D model with two layers, 32 input channels, and output channels [16, 8].
         cnn_model = CNN1D(in_channels=32, out_channels=[16, 8])
@@ -71,7 +74,7 @@ class CNN1D(torch.nn.Module):
             pool_stride (list, optional): List of tuples specifying the pooling stride for each layer. Default is [(1,)].
             batch_norm (bool, optional): If True, applies batch normalization after each convolutional layer. Default is False.
             batch_norm_learn (bool, optional): If True, allows the batch normalization layers to learn affine parameters. Default is False.
-            causal_pad (bool, optional): If True, pads the front of the input tensor with zeros before applying the convolutional layers. Default is False.
+            causal_pad (bool, optional): If True, pads the front of the input of each layer with (kernel_size - 1) * dilation zeros. Default is False.
             device (str, optional): Device on which the model parameters should be stored. Default is None.
             dtype (torch.dtype, optional): Data type for the model parameters. Default is None.
         """
@@ -164,37 +167,92 @@ class CNN1D(torch.nn.Module):
             # 5) Dropout
             self.cnn[-1].append(torch.nn.Dropout(self.dropout_p[i]))
                      
+        # Left padding of each layer with causal_pad, which is also the number of past inputs kept by each layer when streaming
+        self.pad_len = [(layer[0].kernel_size[0] - 1) * layer[0].dilation[0] for layer in self.cnn]
+
+        # Polynomial activations act on the last dimension, so they are applied channels-last
+        self.channels_last_activation = [isinstance(layer[2], Polynomial) for layer in self.cnn]
+
+        # Past inputs of each layer when streaming, off until `init_cache`
+        self.input_cache = None
+
         # Determine the number of output features after passing through the layers
         with torch.no_grad():             
           X = torch.zeros((2, self.input_len, in_channels)).to(device=self.device, dtype=self.dtype)
           self.output_len = self.forward(X).shape[1]
-    
+
+    def init_cache(self):
+        """
+        Starts streaming: later forward passes only take the new steps. Each layer keeps its last `pad_len` inputs, i.e.
+        (kernel_size - 1) * dilation, starting from the zeros of the causal padding, and only computes the outputs of the new
+        steps, which are identical to the outputs of the whole stream in one forward pass.
+
+        Requires causal padding, unit strides, no padding, and no pooling. Batch normalization and dropout are used as in
+        the forward pass, so streaming is meant for eval mode.
+        """
+        if not self.causal_pad:
+            raise ValueError("Streaming requires causal_pad = True.")
+        if any((layer[0].stride[0] != 1) or (layer[0].padding[0] != 0) or (not isinstance(layer[3], torch.nn.Identity)) for layer in self.cnn):
+            raise ValueError("Streaming requires unit kernel strides, no padding, and no pooling.")
+
+        self.input_cache = [None] * self.num_layers
+
+    def clear_cache(self):
+        """
+        Ends streaming and frees the cached inputs.
+        """
+        self.input_cache = None
+
+    def cached_forward(self, input):
+        """
+        Forward pass of the new steps of a stream. See `init_cache`.
+        """
+        num_samples = input.shape[0]
+
+        output = input.transpose(1, 2)
+        for i, layer in enumerate(self.cnn):
+          pad_len = self.pad_len[i]
+          past = self.input_cache[i]
+          if past is None:
+            past = torch.zeros((num_samples, output.shape[1], pad_len), device = output.device, dtype = output.dtype)
+
+          input_i = torch.cat((past, output), -1)
+          self.input_cache[i] = input_i[..., (input_i.shape[-1] - pad_len):].detach()
+
+          # Convolution and batch normalization
+          output = layer[1](layer[0](input_i))
+          # Apply activation
+          output = layer[2](output.transpose(1, 2)).transpose(1, 2) if self.channels_last_activation[i] else layer[2](output)
+          # Apply pooling and dropout
+          output = layer[4](layer[3](output))
+
+        return output.transpose(1, 2)
+
     def forward(self, input):
         """ 
         Forward pass method that applies the 1D convolutional layers and pooling layers to the input tensor.
 
+        The layers run channels-first, so the input is transposed once on the way in and once on the way out.
+
         Args:
-            input (torch.Tensor): Input tensor with shape [batch_size, input_channels, length].
+            input (torch.Tensor): Input tensor with shape [batch_size, length, input_channels].
 
         Returns:
             torch.Tensor: Output tensor after passing through the CNN1D module.
         """
-        output = input.clone()
-        for i in range(self.num_layers):   
+        if self.input_cache is not None:
+          return self.cached_forward(input)
+
+        output = input.transpose(1, 2)
+        # The layers run channels-first. They are iterated, not indexed by a variable, so that the module can be scripted
+        for i, layer in enumerate(self.cnn):
           # Apply padding to the input tensor if causal_pad is True
-          input_i = torch.nn.functional.pad(output, (0, 0, self.kernel_size[i][0] - 1, 0, 0, 0)) if self.causal_pad else output
-          # Apply the current CNN layer to the input tensor
-          output = self.cnn[i][0](input_i.permute(0, 2, 1)).permute(0, 2, 1) 
-          # Apply batch normalization
-          output = self.cnn[i][1](output.permute(0, 2, 1)).permute(0, 2, 1)
+          input_i = torch.nn.functional.pad(output, (self.pad_len[i], 0)) if self.causal_pad else output
+          # Convolution and batch normalization
+          output = layer[1](layer[0](input_i))
           # Apply activation
-          output = self.cnn[i][2](output)
-          # Apply pooling
-          output = self.cnn[i][3](output.permute(0, 2, 1)).permute(0, 2, 1)
-          # Apply dropout
-          output = self.cnn[i][4](output)
-          
-        # Transpose back the output tensor to the original shape
-        output = output
-
-        return output
+          output = layer[2](output.transpose(1, 2)).transpose(1, 2) if self.channels_last_activation[i] else layer[2](output)
+          # Apply pooling and dropout
+          output = layer[4](layer[3](output))
+
+        return output.transpose(1, 2)
@@ -29,33 +29,35 @@ class ChebychevModulator(torch.nn.Module):
     self.kind = kind
     self.functions = self.generate_basis_functions()
 
-  def generate_basis_functions(self):
+  def generate_basis_functions(self, steps=None):
     '''
     Generate the Chebychev basis functions.
 
+    Args:
+        steps (torch.Tensor, optional): Steps at which the functions are evaluated, of any shape. Steps beyond the window
+                                        continue the polynomials past it. Defaults to the steps of the window.
+
     Returns:
-        torch.Tensor: Chebychev basis functions.
+        torch.Tensor: Chebychev basis functions, of shape steps.shape + (num_modulators,).
 
     '''
-    t = torch.arange(0, self.window_len).view(-1, 1).to(device=self.device, dtype=self.dtype)
-    t = t / (t.max() - t.min()) if self.scale else t
-
-    N = len(t)
+    if steps is None:
+        steps = torch.arange(0, self.window_len)
 
-    y = torch.zeros((N, (self.degree + 1))).to(device=self.device, dtype=self.dtype)
+    t = steps.unsqueeze(-1).to(device=self.device, dtype=self.dtype)
+    t = t / max(self.window_len - 1, 1) if self.scale else t
 
-    for q in range(0, (self.degree + 1)):
-        if q == 0:
-            y[:, 0] = torch.ones((N,)).to(device=self.device, dtype=self.dtype)
-        elif q == 1:
-            y[:, 1:2] = self.kind * t * y[:, 0:1]
+    y = [torch.ones_like(t)]
+    for q in range(1, (self.degree + 1)):
+        if q == 1:
+            y.append(self.kind * t)
         else:
-            y[:, q:(q + 1)] = 2 * t * y[:, (q - 1):q] - y[:, (q - 2):(q - 1)]
+            y.append(2 * t * y[q - 1] - y[q - 2])
 
-    if not self.zero_order:
-        y = y[:, 1:]
+    y = torch.cat(y, -1)
 
-    self.functions = y
+    if not self.zero_order:
+        y = y[..., 1:]
 
     return y
 
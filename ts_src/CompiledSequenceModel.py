@@ -0,0 +1,206 @@
+import torch
+from typing import List, Optional, Tuple
+
+class IdentityRunner(torch.nn.Module):
+  '''
+  Passes the input through, for 'identity' bases.
+  '''
+  def forward(self, input, hiddens):
+    return input, hiddens
+
+class RNNRunner(torch.nn.Module):
+  '''
+  Runs a GRU base. An empty hidden state starts from zeros.
+  '''
+  def __init__(self, rnn):
+    super(RNNRunner, self).__init__()
+    self.rnn = rnn
+
+  def forward(self, input, hiddens):
+    output, hiddens = self.rnn(input, hiddens if hiddens.numel() > 0 else None)
+    return output, hiddens
+
+class LSTMRunner(torch.nn.Module):
+  '''
+  Runs an LSTM base. The hidden and cell states are stacked into one tensor of shape (2, num_layers, num_samples, hidden_size).
+  '''
+  def __init__(self, rnn):
+    super(LSTMRunner, self).__init__()
+    self.rnn = rnn
+
+  def forward(self, input, hiddens):
+    output, (h, c) = self.rnn(input, (hiddens[0], hiddens[1]) if hiddens.numel() > 0 else None)
+    return output, torch.stack((h, c), 0)
+
+class LRURunner(torch.nn.Module):
+  '''
+  Runs an LRU base and flattens its filterbanks and hidden units.
+  '''
+  def __init__(self, lru):
+    super(LRURunner, self).__init__()
+    self.lru = lru
+
+  def forward(self, input, hiddens):
+    num_samples, input_len, _ = input.shape
+    output, hiddens = self.lru(input, hiddens if hiddens.numel() > 0 else None)
+    return output.reshape(num_samples, input_len, -1), hiddens
+
+class CNNRunner(torch.nn.Module):
+  '''
+  Runs a CNN1D base.
+  '''
+  def __init__(self, cnn):
+    super(CNNRunner, self).__init__()
+    self.cnn = cnn
+
+  def forward(self, input, hiddens):
+    return self.cnn(input), hiddens
+
+class TransformerRunner(torch.nn.Module):
+  '''
+  Runs a transformer encoder base: embedding with positional encoding, then the encoder layers.
+  '''
+  def __init__(self, base):
+    super(TransformerRunner, self).__init__()
+    self.embedding, self.encoder = base[0], base[1]
+
+  def forward(self, input, hiddens):
+    return self.encoder(self.embedding(input)), hiddens
+
+class InputWindow(torch.nn.Module):
+  '''
+  Selects the input window of one input. An empty index keeps the whole input.
+  '''
+  def __init__(self, idx = None):
+    super(InputWindow, self).__init__()
+    self.register_buffer('idx', torch.zeros((0,), dtype = torch.long) if idx is None else torch.as_tensor(idx, dtype = torch.long), persistent = False)
+
+  def forward(self, input):
+    return input[:, self.idx] if self.idx.numel() > 0 else input
+
+class CompiledSequenceModel(torch.nn.Module):
+  '''
+  Compile-ready execution path of a SequenceModel, sharing its parameters.
+
+  The base of each input is dispatched once, at construction, to a runner with a fixed signature. Hidden states are a list of
+  tensors, with an empty tensor for a state that starts from zeros. The forward pass has no string branches, no layer-output
+  bookkeeping, and no data-dependent Python, so it can be captured with `torch.compile` or, for models without transformer
+  bases, `torch.jit.script`.
+
+  Constraints are not applied in the forward pass. SequenceModule applies them after optimizer steps; otherwise call
+  `model.constrain()` after `optimizer.step()`.
+  '''
+
+  def __init__(self, model, input_window_idx = None):
+    '''
+    Initializes the CompiledSequenceModel instance.
+
+    Args:
+        model (SequenceModel): The model to execute. Its parameters are shared, not copied.
+        input_window_idx (list, optional): Input window indices of each input, e.g. `TimeSeriesDataModule.train_input_window_idx`.
+                                           The whole input is used if None.
+    '''
+
+    super(CompiledSequenceModel, self).__init__()
+
+    if model.process_by_step:
+      raise ValueError("CompiledSequenceModel does not support `process_by_step`.")
+    if model.modulation_layer is not None:
+      raise ValueError("CompiledSequenceModel does not support modulation layers.")
+    if any(flatten is not None for flatten in model.output_flatten):
+      raise ValueError("CompiledSequenceModel does not support `output_flatten`.")
+    if any(seq_base.rnn_attn or (seq_base.encoder_block is not None) or (seq_base.seq_type == 'decoder') for seq_base in model.seq_base):
+      raise ValueError("CompiledSequenceModel does not support bases that attend to an encoder output.")
+
+    self.base_type = list(model.base_type)
+    self.input_size: List[int] = [int(size) for size in model.input_size]
+    self.use_last_step: List[bool] = [bool(seq_base.use_last_step) for seq_base in model.seq_base]
+    self.output_associated: List[bool] = [bool(associated) for associated in model.output_associated]
+    self.max_base_seq_len = int(model.max_base_seq_len)
+    self.max_output_len = int(model.max_output_len)
+
+    self.input_window = torch.nn.ModuleList([InputWindow(None if input_window_idx is None else input_window_idx[i]) for i in range(model.num_inputs)])
+    self.runners = torch.nn.ModuleList([self.get_runner(seq_base) for seq_base in model.seq_base])
+    self.hidden_layer, self.interaction_layer, self.output_layer = model.hidden_layer, model.interaction_layer, model.output_layer
+
+    self.to(device = model.device)
+
+  @staticmethod
+  def get_runner(seq_base):
+    '''
+    Returns the runner of a SequenceModelBase.
+    '''
+    if seq_base.base_type == 'gru':
+      return RNNRunner(seq_base.base)
+    elif seq_base.base_type == 'lstm':
+      return LSTMRunner(seq_base.base)
+    elif seq_base.base_type == 'lru':
+      return LRURunner(seq_base.base)
+    elif seq_base.base_type == 'cnn':
+      return CNNRunner(seq_base.base)
+    elif seq_base.base_type == 'transformer':
+      return TransformerRunner(seq_base.base)
+    elif seq_base.base_type == 'identity':
+      return IdentityRunner()
+    else:
+      raise ValueError(f"'{seq_base.base_type}' bases are not supported by CompiledSequenceModel.")
+
+  def init_hiddens(self, input: torch.Tensor) -> List[torch.Tensor]:
+    '''
+    Returns empty hidden states, which start each base from zeros.
+    '''
+    return [torch.zeros((0,), device = input.device, dtype = input.dtype) for _ in range(len(self.input_size))]
+
+  def forward(self,
+              input: torch.Tensor,
+              hiddens: Optional[List[torch.Tensor]] = None,
+              output_mask: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, List[torch.Tensor]]:
+    '''
+    Forward pass.
+
+    Args:
+        input (torch.Tensor): Input of shape (num_samples, input_len, input_size).
+        hiddens (list, optional): Hidden states of each input, from a previous call or `init_hiddens`.
+        output_mask (torch.Tensor, optional): Mask of the output.
+
+    Returns:
+        torch.Tensor: Output of shape (num_samples, output_len, output_size).
+        list: Updated hidden states.
+    '''
+
+    hiddens_ = self.init_hiddens(input) if hiddens is None else hiddens
+
+    num_samples, input_len, _ = input.shape
+    base_len = min(input_len, self.max_base_seq_len)
+
+    inputs = input.split(self.input_size, -1)
+
+    hidden_output: List[torch.Tensor] = []
+    hiddens_new: List[torch.Tensor] = []
+    for i, (input_window, runner, hidden_layer) in enumerate(zip(self.input_window, self.runners, self.hidden_layer)):
+      input_i = input_window(inputs[i])
+
+      base_output_i, hiddens_i = runner(input_i, hiddens_[i])
+      if self.use_last_step[i]:
+        base_output_i = base_output_i[:, -1:]
+
+      hidden_output_i = hidden_layer(base_output_i)
+
+      # steps without a base output are zero, as in SequenceModel.process
+      hidden_output_i = torch.nn.functional.pad(hidden_output_i, (0, 0, base_len - hidden_output_i.shape[1], 0))
+
+      hidden_output.append(hidden_output_i)
+      hiddens_new.append(hiddens_i)
+
+    output_ = self.interaction_layer(torch.cat(hidden_output, -1))
+
+    output: List[torch.Tensor] = []
+    for i, output_layer in enumerate(self.output_layer):
+      output.append(output_layer(hidden_output[i] if self.output_associated[i] else output_))
+
+    output = torch.cat(output, -1)[:, -self.max_output_len:]
+
+    if output_mask is not None:
+      output = output * output_mask
+
+    return output, hiddens_new
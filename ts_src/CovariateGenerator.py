@@ -0,0 +1,150 @@
+import torch
+import numpy as np
+import pandas as pd
+
+class CovariateGenerator():
+  '''
+  Generates deterministic covariates (calendar features, step counters, time since an event) from the steps of a batch.
+  Covariates are computed on the fly, so they are never stored or windowed and extend naturally past the end of the data.
+  '''
+
+  def __init__(self,
+               covariate_type = 'hour_of_day',
+               fn = None, size = None,
+               cyclical = True,
+               events = None, fill_value = 0.,
+               scale = 1.,
+               device = 'cpu', dtype = torch.float32):
+    '''
+    Initializes the CovariateGenerator instance.
+
+    Args:
+        covariate_type (str): The covariate to generate. Options are 'step', 'minute_of_hour', 'hour_of_day', 'day_of_week',
+                              'day_of_month', 'day_of_year', 'month_of_year', 'time_since_event', or 'custom'.
+        fn (callable): For 'custom' covariates, a function mapping steps (num_samples, seq_len) to a tensor of shape (num_samples, seq_len, size).
+        size (int): Number of features produced by `fn`. Inferred from a dummy call if None.
+        cyclical (bool): If True, calendar covariates are encoded as a (sin, cos) pair, otherwise as their raw value.
+        events (torch.Tensor, list, or dict): Event steps for 'time_since_event'. A dict maps each id to its own event steps.
+        fill_value (float): Value of 'time_since_event' before the first event.
+        scale (float): Multiplier applied to 'step' and 'time_since_event' covariates.
+        device (str): The device of the generated covariates.
+        dtype (torch.dtype): The data type of the generated covariates.
+    '''
+
+    locals_ = locals().copy()
+
+    for arg in locals_:
+      if arg != 'self':
+        setattr(self, arg, locals_[arg])
+
+    if self.fn is not None: self.covariate_type = 'custom'
+
+    self.periods = {'minute_of_hour': 60., 'hour_of_day': 24., 'day_of_week': 7., 'day_of_month': None, 'day_of_year': None, 'month_of_year': 12.}
+
+    if self.covariate_type not in ['step', 'time_since_event', 'custom'] + list(self.periods):
+      raise ValueError(f"covariate_type ({self.covariate_type}) must be 'step', 'time_since_event', 'custom', or one of {list(self.periods)}.")
+
+    if (self.covariate_type == 'custom') and (self.fn is None):
+      raise ValueError(f"A custom covariate requires `fn`.")
+
+    if (self.covariate_type == 'time_since_event') and (self.events is None):
+      raise ValueError(f"A 'time_since_event' covariate requires `events`.")
+
+    if self.covariate_type == 'custom':
+      if self.size is None:
+        self.size = self.fn(torch.zeros((1, 1), device = self.device, dtype = torch.long)).shape[-1]
+    elif self.covariate_type in self.periods:
+      self.size = 2 if self.cyclical else 1
+    else:
+      self.size = 1
+
+  def calendar(self, steps, origin, dt):
+    '''
+    Evaluates a calendar covariate at the given steps.
+
+    Args:
+        steps (torch.Tensor): Steps of shape (num_samples, seq_len).
+        origin (pd.Timestamp): Time of step 0.
+        dt (pd.Timedelta): Time between consecutive steps.
+
+    Returns:
+        torch.Tensor: The calendar covariate of shape (num_samples, seq_len, size).
+    '''
+
+    if not isinstance(origin, (pd.Timestamp, np.datetime64)):
+      raise ValueError(f"'{self.covariate_type}' covariates require a datetime time index.")
+
+    time = pd.Timestamp(origin) + pd.to_timedelta(steps.cpu().numpy().ravel() * pd.Timedelta(dt).value, unit = 'ns')
+
+    hour = time.hour + time.minute / 60 + time.second / 3600
+
+    if self.covariate_type == 'minute_of_hour':
+      value, period = time.minute + time.second / 60, self.periods['minute_of_hour']
+    elif self.covariate_type == 'hour_of_day':
+      value, period = hour, self.periods['hour_of_day']
+    elif self.covariate_type == 'day_of_week':
+      value, period = time.dayofweek + hour / 24, self.periods['day_of_week']
+    elif self.covariate_type == 'day_of_month':
+      value, period = time.day - 1 + hour / 24, time.days_in_month
+    elif self.covariate_type == 'day_of_year':
+      value, period = time.dayofyear - 1 + hour / 24, 365 + time.is_leap_year
+    elif self.covariate_type == 'month_of_year':
+      value, period = time.month - 1 + (time.day - 1) / time.days_in_month, self.periods['month_of_year']
+
+    value = torch.tensor(np.asarray(value, dtype = np.float64)).reshape(steps.shape)
+
+    if self.cyclical:
+      period = torch.tensor(np.asarray(period, dtype = np.float64)).reshape(-1).expand(steps.numel()).reshape(steps.shape)
+      angle = 2 * np.pi * value / period
+      covariate = torch.stack((torch.sin(angle), torch.cos(angle)), -1)
+    else:
+      covariate = value.unsqueeze(-1)
+
+    return covariate.to(device = self.device, dtype = self.dtype)
+
+  def time_since_event(self, steps, id = None):
+    '''
+    Evaluates the number of steps since the most recent event, using a sorted search over the event steps.
+
+    Args:
+        steps (torch.Tensor): Steps of shape (num_samples, seq_len).
+        id (str): Id of the samples, used when `events` is a dict.
+
+    Returns:
+        torch.Tensor: The covariate of shape (num_samples, seq_len, 1).
+    '''
+
+    events = self.events[id] if isinstance(self.events, dict) else self.events
+    events = torch.as_tensor(events).to(device = steps.device, dtype = torch.long).reshape(-1).sort().values
+
+    last_idx = torch.searchsorted(events, steps, right = True) - 1
+
+    elapsed = (steps - events[last_idx.clamp(min = 0)]).to(dtype = self.dtype) * self.scale
+    elapsed = elapsed.masked_fill(last_idx < 0, self.fill_value)
+
+    return elapsed.unsqueeze(-1).to(device = self.device)
+
+  def __call__(self, steps, origin = None, dt = None, id = None):
+    '''
+    Generates the covariate at the given steps.
+
+    Args:
+        steps (torch.Tensor): Steps of shape (num_samples, seq_len).
+        origin (pd.Timestamp or float): Time of step 0. Required for calendar covariates.
+        dt (pd.Timedelta or float): Time between consecutive steps. Required for calendar covariates.
+        id (str): Id of the samples.
+
+    Returns:
+        torch.Tensor: The covariate of shape (num_samples, seq_len, size).
+    '''
+
+    if self.covariate_type == 'step':
+      covariate = (steps.to(dtype = self.dtype) * self.scale).unsqueeze(-1)
+    elif self.covariate_type == 'time_since_event':
+      covariate = self.time_since_event(steps, id)
+    elif self.covariate_type == 'custom':
+      covariate = self.fn(steps)
+    else:
+      covariate = self.calendar(steps, origin, dt)
+
+    return covariate.to(device = self.device, dtype = self.dtype)
@@ -27,6 +27,9 @@ class Criterion():
     Returns:
         torch.Tensor: The computed criterion value.
     '''
+
+    # Reductions accumulate in at least float32, also for bfloat16 predictions from autocast
+    y_pred, y_true = [y.to(torch.promote_types(y.dtype, torch.float32)) if torch.is_tensor(y) and y.is_floating_point() else y for y in (y_pred, y_true)]
     
     if self.name == 'mae':
         # Mean Absolute Error (L1 loss)
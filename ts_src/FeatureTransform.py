@@ -1,5 +1,7 @@
 import torch
 
+from ts_src.QuantileSketch import QuantileSketch
+
 class FeatureTransform():
   '''
   A class for performing feature scaling and transformation operations on data.
@@ -8,15 +10,19 @@ class FeatureTransform():
   def __init__(self,
                transform_type = 'minmax', minmax = [0., 1.], dim = 0,
                diff_order = 0,  
+               quantile_range = [0.25, 0.75], sketch_size = 1000,
                # device = 'cpu', dtype = torch.float32,
                ):
     '''
     Initializes the FeatureTransform instance.
 
     Args:
-        transform_type (str): The type of transformation to be applied. Options are 'identity', 'minmax', or 'standard'.
+        transform_type (str): The type of transformation to be applied. Options are 'identity', 'minmax', 'standard', or 'robust'.
         minmax (list): The minimum and maximum values to transform the data when using 'minmax' transformation.
         dim (int): The dimension along which the transformation is applied.
+        diff_order (int): The order of differencing applied before scaling.
+        quantile_range (list): The lower and upper quantiles whose range scales the data when using 'robust' transformation.
+        sketch_size (int): The size of the QuantileSketch that estimates the median and quantile range in one pass.
         device (str): The device to be used for computations.
         dtype (torch.dtype): The data type to be used for computations.
     '''
@@ -27,8 +33,8 @@ class FeatureTransform():
       if arg != 'self':
         setattr(self, arg, locals_[arg])
         
-    if self.transform_type not in ['identity', 'minmax', 'standard']:
-        raise ValueError(f"transform_type ({self.transform_type}) is not set to 'identity', 'minmax', or 'standard'.")
+    if self.transform_type not in ['identity', 'minmax', 'standard', 'robust']:
+        raise ValueError(f"transform_type ({self.transform_type}) is not set to 'identity', 'minmax', 'standard', or 'robust'.")
 
     if self.transform_type == 'identity':
         self.transform_fn = self.identity
@@ -39,6 +45,9 @@ class FeatureTransform():
     elif self.transform_type == 'standard':
         self.transform_fn = self.standardize
         self.inverse_transform_fn = self.inverse_standardize
+    elif self.transform_type == 'robust':
+        self.transform_fn = self.robust_scale
+        self.inverse_transform_fn = self.inverse_robust_scale
       
   def identity(self, X, fit = False):
     '''
@@ -64,7 +73,7 @@ class FeatureTransform():
 
     return X
   
-  def inverse_identity(self, X):
+  def inverse_identity(self, X, X0 = None):
     
     # X = torch.tensor(X).to(device = self.device, dtype = self.dtype) if not isinstance(X, torch.Tensor) else X.to(device = self.device, dtype = self.dtype)
     
@@ -72,7 +81,7 @@ class FeatureTransform():
 
     if ndim == 1: X = X.unsqueeze(1)
 
-    X = self.cumsum(X, self.dim) if self.diff_order > 0 else X
+    X = self.cumsum(X, X0) if self.diff_order > 0 else X
 
     if ndim == 1: X = X.squeeze()
 
@@ -96,17 +105,57 @@ class FeatureTransform():
 
     return y
 
-  def cumsum(self, X):
+  def get_anchors(self, X):
+    '''
+    Returns the anchors of a window, or of a batch of windows: the first step of each difference level. The stored `X0` is unchanged.
+
+    Args:
+        X (torch.Tensor): Data in the original scale, of shape (seq_len, num_features) or (num_samples, seq_len, num_features).
+
+    Returns:
+        list: `diff_order` tensors of shape (1, num_features), or (num_samples, 1, num_features) for a batch.
+    '''
+
+    if X.ndim == 1: X = X.unsqueeze(1)
+
+    dim = self.dim if X.ndim == 2 else 1
+
+    y, X0 = X, []
+    for i in range(self.diff_order):
+      X0.append(y.narrow(dim, 0, 1))
+      y = y.diff(1, dim)
+
+    return X0
+
+  def cumsum(self, X, X0 = None):
+    '''
+    Rebuilds the level of differenced data from the anchors of each difference level. The first `diff_order` steps of X are
+    placeholders for the anchors.
+
+    Args:
+        X (torch.Tensor): Differenced data of shape (seq_len, num_features), or (num_samples, seq_len, num_features) for a batch.
+        X0 (list, optional): Anchors from `get_anchors`. Each is of shape (1, num_features), shared by all samples, or
+                             (num_samples, 1, num_features), one per sample. Defaults to the stored `X0`.
+
+    Returns:
+        torch.Tensor: The data in its original level.
+    '''
     # X = torch.tensor(X).to(device = self.device, dtype = self.dtype) if not isinstance(X, torch.Tensor) else X.to(device = self.device, dtype = self.dtype)
     
     ndim = X.ndim
 
     if ndim == 1: X = X.unsqueeze(1)
 
-    y = X.clone()
-    y = y[self.diff_order:]
+    X0 = self.X0 if X0 is None else X0
+
+    dim = self.dim if X.ndim == 2 else 1
+
+    # All samples are rebuilt at once, each from its own anchors
+    y = X.narrow(dim, self.diff_order, X.shape[dim] - self.diff_order)
     for i in range(self.diff_order):
-      y = torch.cat((self.X0[-(i+1)], y), self.dim).cumsum(self.dim)
+      x0 = X0[-(i+1)].to(y)
+      if X.ndim == 3: x0 = x0.reshape(-1, 1, y.shape[-1]).expand(y.shape[0], 1, -1)
+      y = torch.cat((x0, y), dim).cumsum(dim)
 
     if ndim == 1: y = y.squeeze()
 
@@ -138,12 +187,13 @@ class FeatureTransform():
 
     return y
 
-  def inverse_standardize(self, X):
+  def inverse_standardize(self, X, X0 = None):
     '''
     Applies inverse standardization on the input data.
 
     Args:
         X (torch.Tensor): The input data.
+        X0 (list, optional): Anchors of each difference level. Defaults to the stored `X0`.
 
     Returns:
         torch.Tensor: The inversely standardized input data.
@@ -156,7 +206,7 @@ class FeatureTransform():
 
     y = X * self.std_ + self.mean_
     
-    y = self.cumsum(y) if self.diff_order > 0 else y
+    y = self.cumsum(y, X0) if self.diff_order > 0 else y
     
     if ndim == 1: y = y.squeeze()
 
@@ -188,12 +238,13 @@ class FeatureTransform():
 
     return y
 
-  def inverse_normalize(self, X):
+  def inverse_normalize(self, X, X0 = None):
     '''
     Applies inverse normalization on the input data.
 
     Args:
         X (torch.Tensor): The input data.
+        X0 (list, optional): Anchors of each difference level. Defaults to the stored `X0`.
     
     Returns:
         torch.Tensor: The inversely normalized input data.
@@ -206,12 +257,224 @@ class FeatureTransform():
 
     y = (X - self.minmax[0]) * (self.max_ - self.min_) / (self.minmax[1] - self.minmax[0]) + self.min_
     
-    y = self.cumsum(y) if self.diff_order > 0 else y
+    y = self.cumsum(y, X0) if self.diff_order > 0 else y
     
     if ndim == 1: y = y.squeeze()
 
     return y
 
+  def robust_scale(self, X, fit = False):
+    '''
+    Centers the input data on its median and scales it by its quantile range, so outliers have little effect on the scaling.
+    The quantiles are estimated with a QuantileSketch in one pass.
+
+    Args:
+        X (torch.Tensor): The input data.
+
+    Returns:
+        torch.Tensor: The robustly scaled input data.
+    '''
+
+    ndim = X.ndim
+
+    if ndim == 1: X = X.unsqueeze(1)
+
+    X = self.difference(X) if self.diff_order > 0 else X
+
+    if fit:
+      self.sketch_ = QuantileSketch(k = self.sketch_size).update(X.movedim(self.dim, 0).flatten(1))
+      self.set_quantiles(self.sketch_, X.dtype, X.movedim(self.dim, 0).shape[1:])
+
+    y = (X - self.median_) / self.iqr_
+
+    if ndim == 1: y = y.squeeze()
+
+    return y
+
+  def inverse_robust_scale(self, X, X0 = None):
+    '''
+    Applies inverse robust scaling on the input data.
+
+    Args:
+        X (torch.Tensor): The input data.
+        X0 (list, optional): Anchors of each difference level. Defaults to the stored `X0`.
+
+    Returns:
+        torch.Tensor: The inversely scaled input data.
+    '''
+
+    ndim = X.ndim
+
+    if ndim == 1: X = X.unsqueeze(1)
+
+    y = X * self.iqr_ + self.median_
+
+    y = self.cumsum(y, X0) if self.diff_order > 0 else y
+
+    if ndim == 1: y = y.squeeze()
+
+    return y
+
+  def set_quantiles(self, sketch, dtype, shape):
+    '''
+    Sets the median and the quantile range from a sketch.
+    '''
+    Q = sketch.quantile([self.quantile_range[0], 0.5, self.quantile_range[1]]).reshape(3, *shape).to(dtype)
+    self.median_, self.iqr_ = Q[1], Q[2] - Q[0]
+
+    # A zero quantile range (a constant or mostly constant feature) scales by 1, as in sklearn's RobustScaler
+    self.iqr_ = torch.where(self.iqr_ < 10 * torch.finfo(dtype).eps, torch.ones_like(self.iqr_), self.iqr_)
+
+  def reset(self):
+    '''
+    Clears the running statistics used by `partial_fit` and `merge`.
+    '''
+    self.n_, self.num_pad_ = 0, 0
+    self.running_mean_, self.running_m2_ = None, None
+    self.running_min_, self.running_max_ = None, None
+    self.head_, self.tail_ = None, None
+    self.sketch_ = QuantileSketch(k = self.sketch_size) if self.transform_type == 'robust' else None
+
+  def update_statistics(self, X = None, n = 0, mean = None, m2 = None, minimum = None, maximum = None):
+    '''
+    Merges the statistics of a group of differenced values into the running statistics (Chan et al. parallel update).
+
+    Args:
+        X (torch.Tensor): The group of values of shape (n, num_features), or None if its statistics are given.
+        n, mean, m2, minimum, maximum: Count, mean, sum of squared deviations, minimum, and maximum of the group.
+    '''
+    if X is not None:
+      X = X.to(torch.float64)
+      n = X.shape[0]
+      if n == 0: return
+      mean = X.mean(0)
+      m2 = ((X - mean) ** 2).sum(0)
+      minimum, maximum = X.min(0).values, X.max(0).values
+      if getattr(self, 'sketch_', None) is not None: self.sketch_.update(X)
+
+    if n == 0: return
+
+    if self.n_ == 0:
+      self.running_mean_, self.running_m2_ = mean, m2
+      self.running_min_, self.running_max_ = minimum, maximum
+    else:
+      n_total = self.n_ + n
+      delta = mean - self.running_mean_
+      self.running_mean_ = self.running_mean_ + delta * n / n_total
+      self.running_m2_ = self.running_m2_ + m2 + delta ** 2 * self.n_ * n / n_total
+      self.running_min_ = torch.minimum(self.running_min_, minimum)
+      self.running_max_ = torch.maximum(self.running_max_, maximum)
+
+    self.n_ += n
+
+  def finalize(self, dtype):
+    '''
+    Sets the fitted parameters from the running statistics, including the zero padding of the differenced series.
+    '''
+    n, mean, m2 = self.n_, self.running_mean_, self.running_m2_
+    minimum, maximum = self.running_min_, self.running_max_
+
+    if self.num_pad_ > 0:
+      zeros = torch.zeros_like(self.head_[0], dtype = torch.float64)
+      if n == 0:
+        n, mean, m2, minimum, maximum = self.num_pad_, zeros, zeros, zeros, zeros
+      else:
+        delta = -mean
+        mean = mean + delta * self.num_pad_ / (n + self.num_pad_)
+        m2 = m2 + delta ** 2 * n * self.num_pad_ / (n + self.num_pad_)
+        minimum, maximum = torch.minimum(minimum, zeros), torch.maximum(maximum, zeros)
+        n = n + self.num_pad_
+
+    if n == 0: return
+
+    self.min_, self.max_ = minimum.to(dtype), maximum.to(dtype)
+    self.mean_ = mean.to(dtype)
+    self.std_ = (m2 / (n - 1)).sqrt().to(dtype) if n > 1 else torch.full_like(mean, float('nan')).to(dtype)
+
+    if self.transform_type == 'robust':
+      sketch = self.sketch_.copy().update(torch.zeros((self.num_pad_,) + self.head_.shape[1:], dtype = torch.float64))
+      self.set_quantiles(sketch, dtype, self.head_.shape[1:])
+
+    if self.diff_order > 0:
+      y = self.head_
+      self.X0 = []
+      for i in range(self.diff_order):
+        self.X0.append(y[:1])
+        y = y.diff(1, 0)
+
+  def partial_fit(self, X):
+    '''
+    Updates the fitted parameters with the next chunk of a series, so a series can be fitted without holding it in memory.
+    Fitting all chunks in order matches `fit_transform` on the whole series up to numerical tolerance.
+
+    Args:
+        X (torch.Tensor): The next chunk of the series.
+
+    Returns:
+        FeatureTransform: The updated instance.
+    '''
+    if X.ndim == 1: X = X.unsqueeze(1)
+
+    if getattr(self, 'n_', None) is None: self.reset()
+
+    d = self.diff_order
+
+    if self.head_ is None:
+      # the differenced series starts with `diff_order` zeros
+      self.num_pad_ += d
+      self.head_, self.tail_ = X[:0], X[:0]
+
+    # the first `diff_order` rows anchor the differences, the last ones difference the next chunk
+    self.head_ = torch.cat((self.head_, X[:(d - self.head_.shape[0])]), 0) if d > 0 else self.head_
+
+    X_ext = torch.cat((self.tail_, X), 0)
+    if X_ext.shape[0] > d:
+      self.update_statistics(X_ext.diff(d, 0) if d > 0 else X_ext)
+
+    self.tail_ = X_ext[(X_ext.shape[0] - d):]
+
+    self.finalize(X.dtype)
+
+    return self
+
+  def merge(self, other, contiguous = False):
+    '''
+    Merges the running statistics of another instance fitted with `partial_fit`, e.g. by another worker.
+
+    Args:
+        other (FeatureTransform): The other instance, with the same transform_type and diff_order.
+        contiguous (bool): If True, `other` was fitted on the continuation of this series, so the differences across the junction
+                           replace its zero padding. Otherwise the two are separate records.
+
+    Returns:
+        FeatureTransform: The merged instance.
+    '''
+    if (other.transform_type != self.transform_type) or (other.diff_order != self.diff_order):
+      raise ValueError(f"Cannot merge a '{other.transform_type}' transform of diff_order {other.diff_order} into a '{self.transform_type}' transform of diff_order {self.diff_order}.")
+
+    if getattr(other, 'head_', None) is None: return self
+    if getattr(self, 'head_', None) is None:
+      self.__dict__.update({name: getattr(other, name) for name in ['n_', 'num_pad_', 'running_mean_', 'running_m2_', 'running_min_', 'running_max_', 'head_', 'tail_', 'sketch_']})
+      self.finalize(other.head_.dtype)
+      return self
+
+    d = self.diff_order
+
+    self.update_statistics(n = other.n_, mean = other.running_mean_, m2 = other.running_m2_,
+                           minimum = other.running_min_, maximum = other.running_max_)
+    self.num_pad_ += other.num_pad_
+    if self.transform_type == 'robust': self.sketch_.merge(other.sketch_)
+
+    if contiguous and (d > 0):
+      junction = torch.cat((self.tail_, other.head_), 0).diff(d, 0)
+      self.update_statistics(junction)
+      self.num_pad_ -= junction.shape[0]
+      self.tail_ = torch.cat((self.tail_, other.tail_), 0)[-d:]
+
+    self.finalize(self.head_.dtype)
+
+    return self
+
   def fit_transform(self, X):
     '''
     Fits the scaling parameters based on the input data and transforms the data accordingly.
@@ -256,12 +519,13 @@ class FeatureTransform():
 
     return y
 
-  def inverse_transform(self, X):
+  def inverse_transform(self, X, X0 = None):
     '''
     Applies the inverse transformation on the input data.
 
     Args:
         X (torch.Tensor): The input data.
+        X0 (list, optional): Anchors of each difference level, from `get_anchors`. Defaults to the stored `X0`.
 
     Returns:
         torch.Tensor: The inversely transformed input data.
@@ -272,7 +536,7 @@ class FeatureTransform():
 
     if ndim == 1: X = X.unsqueeze(1)
 
-    y = self.inverse_transform_fn(X)
+    y = self.inverse_transform_fn(X, X0)
 
     if ndim == 1: y = y.squeeze()
 
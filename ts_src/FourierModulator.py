@@ -38,34 +38,48 @@ class FourierModulator(torch.nn.Module):
     else:
         self.phase_init = self.phase_init
 
-    self.freq = torch.nn.Parameter(data = self.freq_init.to(device=device, dtype = selfdtype), requires_grad = self.freq_train)
+    self.freq = torch.nn.Parameter(data = self.freq_init.to(device=device, dtype = self.dtype), requires_grad = self.freq_train)
     self.phase = torch.nn.Parameter(data = self.phase_init.to(device=device, dtype=dtype), requires_grad = self.phase_train)
 
-    self.generate_basis_functions()
+    self.num_modulators = num_freqs
 
-  def generate_basis_functions(self):
+  def generate_basis_functions(self, steps=None):
     '''
     Generate the Fourier basis functions.
 
+    Args:
+        steps (torch.Tensor, optional): Steps at which the functions are evaluated, of any shape. Defaults to the steps of the
+                                        window.
+
     Returns:
-        torch.Tensor: Fourier basis functions.
+        torch.Tensor: Fourier basis functions, of shape steps.shape + (num_freqs,).
 
     '''
-    t = self.dt * torch.arange(0, self.window_len).view(-1, 1).to(device=self.device, dtype=self.dtype)
+    if steps is None:
+        steps = torch.arange(0, self.window_len)
 
-    y = torch.sin(2 * torch.pi * t * self.freq + self.phase)
+    t = self.dt * steps.unsqueeze(-1).to(device=self.device, dtype=self.dtype)
 
-    self.functions = y
+    y = torch.sin(2 * torch.pi * t * self.freq + self.phase)
 
     return y
 
+  @property
+  def functions(self):
+    '''
+    Fourier basis functions over the window, evaluated with the current parameters.
+    '''
+    return self.generate_basis_functions()
+
   def forward(self, X, steps):
     '''
     Apply the Fourier modulation to the input.
 
+    The functions are evaluated at `steps` only, rather than over the window and then indexed.
+
     Args:
         X (torch.Tensor): Input tensor.
-        steps (int): Index of the modulation step.
+        steps (torch.Tensor): Steps of the input.
 
     Returns:
         torch.Tensor: Modulated tensor.
@@ -73,11 +87,6 @@ class FourierModulator(torch.nn.Module):
     '''
     X = X.to(device=self.device, dtype=self.dtype)
 
-    self.functions = self.generate_basis_functions()
-
-    y = X[:, :, None, :] * self.functions[steps]
-
-    self.functions = y
+    y = X[:, :, None, :] * self.generate_basis_functions(steps)
 
     return y
-
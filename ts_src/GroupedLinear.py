@@ -0,0 +1,137 @@
+import torch
+
+class GroupedLinear(torch.nn.Module):
+  '''
+  Block-diagonal linear layer. Input features are split into `groups` contiguous groups, each mapped to its own group of output
+  features, and only the diagonal blocks are stored.
+
+  Groups have `in_features // groups` inputs and `out_features // groups` outputs, and the last group takes the remainder.
+  The blocks are stored as one (groups, max_block_out, max_block_in) weight and evaluated with a single batched matmul, so
+  parameters and FLOPs scale with the sum of the block sizes instead of in_features * out_features. Only the last group can be
+  larger than the others; the unused entries of the smaller blocks are zero and receive no gradient.
+  '''
+
+  def __init__(self, in_features, out_features, groups = 1, bias = True, device = 'cpu', dtype = torch.float32):
+    '''
+    Initializes the GroupedLinear instance.
+
+    Args:
+        in_features (int): Number of input features.
+        out_features (int): Number of output features.
+        groups (int): Number of groups.
+        bias (bool): Whether to add a bias.
+        device (str): Device of the parameters.
+        dtype (torch.dtype): Data type of the parameters.
+    '''
+
+    super(GroupedLinear, self).__init__()
+
+    locals_ = locals().copy()
+
+    for arg in locals_:
+      if arg != 'self':
+        setattr(self, arg, locals_[arg])
+
+    if (self.groups > self.in_features) | (self.groups > self.out_features):
+      raise ValueError(f"Number of groups ({self.groups}) cannot be larger than the number of input features ({self.in_features}) or output features ({self.out_features}).")
+
+    self.in_sizes = self.get_sizes(self.in_features, self.groups)
+    self.out_sizes = self.get_sizes(self.out_features, self.groups)
+
+    max_in, max_out = max(self.in_sizes), max(self.out_sizes)
+
+    # Positions of the block entries that are in use
+    block_mask = torch.zeros((self.groups, max_out, max_in), device = self.device, dtype = torch.bool)
+    for g, (out_size, in_size) in enumerate(zip(self.out_sizes, self.in_sizes)):
+      block_mask[g, :out_size, :in_size] = True
+
+    # Input feature read by each block column; in_features points to a zero column
+    input_idx = torch.full((self.groups, max_in), self.in_features, dtype = torch.long)
+    # Block output of each output feature
+    output_idx = torch.zeros((self.out_features,), dtype = torch.long)
+    i, j = 0, 0
+    for g, (out_size, in_size) in enumerate(zip(self.out_sizes, self.in_sizes)):
+      input_idx[g, :in_size] = torch.arange(j, j + in_size)
+      output_idx[i:(i + out_size)] = g * max_out + torch.arange(out_size)
+      i += out_size
+      j += in_size
+
+    self.padded = (max_in * self.groups != self.in_features) | (max_out * self.groups != self.out_features)
+
+    self.register_buffer('block_mask', block_mask, persistent = False)
+    self.register_buffer('input_idx', input_idx.reshape(-1).to(device = self.device), persistent = False)
+    self.register_buffer('output_idx', output_idx.to(device = self.device), persistent = False)
+
+    self.weight = torch.nn.Parameter(torch.empty((self.groups, max_out, max_in), device = self.device, dtype = self.dtype))
+    self.bias = torch.nn.Parameter(torch.empty((self.out_features,), device = self.device, dtype = self.dtype)) if bias else None
+
+    self.reset_parameters()
+
+  @staticmethod
+  def get_sizes(num_features, groups):
+    '''
+    Returns the number of features in each group. The last group takes the remainder.
+    '''
+    sizes = [num_features // groups] * groups
+    sizes[-1] += num_features - sum(sizes)
+    return sizes
+
+  def reset_parameters(self):
+    '''
+    Initializes the blocks as the masked weight of a dense torch.nn.Linear, i.e. uniform in +/- 1/sqrt(in_features).
+    '''
+    bound = 1 / self.in_features ** 0.5
+    with torch.no_grad():
+      self.weight.uniform_(-bound, bound).mul_(self.block_mask)
+      if self.bias is not None: self.bias.uniform_(-bound, bound)
+
+  def to_dense(self):
+    '''
+    Returns the equivalent dense weight of shape (out_features, in_features).
+    '''
+    weight = torch.zeros((self.out_features, self.in_features), device = self.weight.device, dtype = self.weight.dtype)
+    i, j = 0, 0
+    for g, (out_size, in_size) in enumerate(zip(self.out_sizes, self.in_sizes)):
+      weight[i:(i + out_size), j:(j + in_size)] = self.weight[g, :out_size, :in_size]
+      i += out_size
+      j += in_size
+    return weight
+
+  def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+    # Dense weights of checkpoints saved before the blocks were stored alone are cut into blocks
+    weight = state_dict.get(prefix + 'weight')
+    if (weight is not None) and (weight.ndim == 2):
+      blocks = torch.zeros_like(self.weight)
+      i, j = 0, 0
+      for g, (out_size, in_size) in enumerate(zip(self.out_sizes, self.in_sizes)):
+        blocks[g, :out_size, :in_size] = weight[i:(i + out_size), j:(j + in_size)]
+        i += out_size
+        j += in_size
+      state_dict[prefix + 'weight'] = blocks
+
+    super(GroupedLinear, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+  def forward(self, input):
+    '''
+    Forward pass.
+
+    Args:
+        input (torch.Tensor): Input of shape (..., in_features).
+
+    Returns:
+        torch.Tensor: Output of shape (..., out_features).
+    '''
+    shape = list(input.shape[:-1])
+
+    if self.padded:
+      input = torch.nn.functional.pad(input, (0, 1)).index_select(-1, self.input_idx)
+
+    output = torch.einsum('...gi,goi->...go', input.reshape(shape + [self.groups, -1]), self.weight).reshape(shape + [-1])
+
+    if self.padded:
+      output = output.index_select(-1, self.output_idx)
+
+    if self.bias is not None:
+      output = output + self.bias
+
+    return output
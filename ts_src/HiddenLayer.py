@@ -1,6 +1,7 @@
 import torch
 from ts_src.Polynomial import Polynomial
 from ts_src.Sigmoid import Sigmoid
+from ts_src.GroupedLinear import GroupedLinear
 
 class HiddenLayer(torch.nn.Module):
     """
@@ -35,7 +36,6 @@ class HiddenLayer(torch.nn.Module):
         F (torch.nn.Sequential): The core function of the hidden layer.
         dropout (torch.nn.Dropout): Dropout layer.
         norm_layer (torch.nn.Module): Normalization layer.
-        group_mask (torch.Tensor): A mask used to apply weight sparsity.
 
     Args:
         ... [Same as original]
@@ -84,6 +84,14 @@ class HiddenLayer(torch.nn.Module):
                         return self.F(input1, input2)
 
                 f1 = Bilinear()
+            elif self.groups > 1:
+                # only the diagonal blocks are stored and evaluated
+                f1 = GroupedLinear(in_features=self.in_features, out_features=self.out_features, groups=self.groups,
+                                   bias=self.bias, device=self.device, dtype=self.dtype)
+
+                if self.weight_to_ones:
+                    f1.weight.data.copy_(f1.block_mask)
+                    f1.weight.requires_grad = False
             else:
                 f1 = torch.nn.Linear(in_features=self.in_features, out_features=self.out_features,
                                      bias=self.bias, device=self.device, dtype=self.dtype)
@@ -133,29 +141,7 @@ class HiddenLayer(torch.nn.Module):
         else:
             self.norm_layer = torch.nn.Identity()
 
-        if (self.groups > self.in_features) | (self.groups > self.out_features):
-          raise ValueError(f"Number of groups ({self.groups}) cannot be larger than the number of input features ({self.in_features}) or output features ({self.out_features}).")
-
-        # Calculate the number of full groups and the size of the last group
-        row_size = self.out_features // self.groups
-        col_size = self.in_features // self.groups
-        
-        # Determine group sizes
-        row_sizes = [row_size] * self.groups
-        col_sizes = [col_size] * self.groups
-
-        if sum(row_sizes) < self.out_features: row_sizes[-1] += self.out_features - sum(row_sizes)
-        if sum(col_sizes) < self.in_features: col_sizes[-1] += self.in_features - sum(col_sizes)
-        
-        # Generate the mask based on group sizes
-        self.group_mask = torch.zeros_like(self.F[0].weight,
-                                          requires_grad = False)       
-        
-        i,j = 0,0
-        for row_size, col_size in zip(row_sizes, col_sizes):        
-          self.group_mask[i:(i+row_size), j:(j+col_size)] = 1.          
-          j += col_size
-          i += row_size
+        self.norm_over_time = self.norm_type == 'batch'
 
     def forward(self, input):
         """
@@ -167,13 +153,12 @@ class HiddenLayer(torch.nn.Module):
         Returns:
             torch.Tensor: Output tensor.
         """
-        self.F[0].weight.data *= self.group_mask
-        
         output = self.dropout(self.F(input))
 
-        if self.norm_type == 'batch':
+        # batch norm normalizes the feature dimension, which comes after the time dimension here
+        if self.norm_over_time:
             output = self.norm_layer(output.permute(0, 2, 1)).permute(0, 2, 1)
-        if self.norm_type == 'layer':
+        else:
             output = self.norm_layer(output)
         
         return output
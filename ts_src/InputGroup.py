@@ -0,0 +1,222 @@
+import torch
+
+class InputGroup(torch.nn.Module):
+  '''
+  Executes the sequence bases and hidden layers of inputs with the same configuration as one batched module.
+
+  The parameters stay in the modules of each input and are stacked along a leading group dimension at every forward pass,
+  so gradients, constraints, penalties, and checkpoints are the same as when the inputs are processed one at a time. GRU and
+  LSTM recurrences advance every input of the group with one batched matmul per step and layer, and linear hidden layers are
+  evaluated with one einsum.
+
+  Only 'identity', 'gru', and 'lstm' bases (not bidirectional, without attention) and hidden layers that are a plain linear
+  map followed by an elementwise activation can be grouped. See `get_key`.
+  '''
+
+  def __init__(self, idx, seq_base, hidden_layer):
+    '''
+    Initializes the InputGroup instance.
+
+    Args:
+        idx (list): Indices of the inputs in the group.
+        seq_base (list): SequenceModelBase of each input. The modules are shared, not copied or registered.
+        hidden_layer (list): Hidden layer of each input. The modules are shared, not copied or registered.
+    '''
+
+    super(InputGroup, self).__init__()
+
+    self.idx = list(idx)
+    self.seq_base, self.hidden_layer = list(seq_base), list(hidden_layer)
+
+    self.base_type = self.seq_base[0].base_type
+    self.num_layers = self.seq_base[0].num_layers if self.base_type in ['lstm', 'gru'] else 0
+    self.use_last_step = self.seq_base[0].use_last_step
+
+  @staticmethod
+  def get_key(seq_base, hidden_layer):
+    '''
+    Returns the configuration that inputs must share to be grouped, or None if the input cannot be grouped.
+    '''
+    if seq_base.rnn_attn or (seq_base.encoder_block is not None) or (seq_base.seq_type == 'decoder'):
+      return None
+
+    if seq_base.base_type == 'identity':
+      base_key = ('identity', seq_base.input_size)
+    elif seq_base.base_type in ['lstm', 'gru']:
+      if seq_base.rnn_bidirectional or (getattr(seq_base.base, 'proj_size', 0) > 0):
+        return None
+      base_key = (seq_base.base_type, seq_base.input_size, seq_base.hidden_size, seq_base.num_layers,
+                  seq_base.rnn_bias, seq_base.rnn_dropout_p)
+    else:
+      return None
+
+    if isinstance(hidden_layer, torch.nn.Identity):
+      hidden_key = ('identity',)
+    elif isinstance(hidden_layer.F[0], torch.nn.Linear) and isinstance(hidden_layer.norm_layer, torch.nn.Identity) \
+         and (hidden_layer.activation in ['identity', 'tanh', 'relu', 'softmax']):
+      hidden_key = ('linear', hidden_layer.in_features, hidden_layer.out_features, hidden_layer.F[0].bias is not None,
+                    hidden_layer.activation, hidden_layer.softmax_dim, hidden_layer.dropout_p)
+    else:
+      return None
+
+    return base_key + (seq_base.use_last_step,) + hidden_key
+
+  def hooked(self):
+    '''
+    Returns whether a module of the group has forward hooks, e.g. of a LayerCapture, which grouped execution would bypass.
+    '''
+    return any(len(module._forward_hooks) > 0 for module in self.seq_base + self.hidden_layer)
+
+  def stack(self, modules, name):
+    '''
+    Stacks the parameter `name` of each module along a new leading group dimension.
+    '''
+    return torch.stack([getattr(module, name) for module in modules], 0)
+
+  def init_hiddens(self, hiddens, num_samples, input):
+    '''
+    Stacks the hidden states of each input into (num_layers, group_size, num_samples, hidden_size) tensors, starting inputs
+    without hidden states from zeros. LSTMs have a hidden and a cell state.
+    '''
+    hidden_size = self.seq_base[0].hidden_size
+
+    num_states = 2 if self.base_type == 'lstm' else 1
+
+    states = []
+    for s in range(num_states):
+      states_s = []
+      for hiddens_i in hiddens:
+        if hiddens_i is None:
+          states_s.append(torch.zeros((self.num_layers, num_samples, hidden_size), device = input.device, dtype = input.dtype))
+        else:
+          states_s.append(hiddens_i[s] if self.base_type == 'lstm' else hiddens_i)
+      states.append(torch.stack(states_s, 1))
+
+    return states
+
+  def recurrence(self, input, hiddens, reset_mask = None):
+    '''
+    Runs the GRU/LSTM bases of the group.
+
+    Args:
+        input (torch.Tensor): Input of shape (group_size, num_samples, input_len, input_size).
+        hiddens (list): Hidden states of each input.
+        reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len) marking the steps before which the
+                                             hidden states of a sample are reset to zero.
+
+    Returns:
+        torch.Tensor: Output of shape (group_size, num_samples, input_len, hidden_size).
+        list: Updated hidden states of each input.
+    '''
+    num_groups, num_samples, input_len, _ = input.shape
+
+    rnn = [seq_base.base for seq_base in self.seq_base]
+
+    states = self.init_hiddens(hiddens, num_samples, input)
+    keep = None if reset_mask is None else (~reset_mask).to(input)[None, :, :, None]
+
+    output = input
+    states_new = [[] for _ in states]
+    for l in range(self.num_layers):
+      weight_ih, weight_hh = self.stack(rnn, f"weight_ih_l{l}"), self.stack(rnn, f"weight_hh_l{l}")
+
+      # Input contributions of all steps at once
+      gates_input = torch.einsum('gnti,gji->gntj', output, weight_ih)
+      if self.seq_base[0].rnn_bias:
+        gates_input = gates_input + self.stack(rnn, f"bias_ih_l{l}")[:, None, None]
+        bias_hh = self.stack(rnn, f"bias_hh_l{l}")[:, None]
+      else:
+        bias_hh = None
+
+      h = states[0][l]
+      c = states[1][l] if self.base_type == 'lstm' else None
+
+      output_l = []
+      for t in range(input_len):
+        if keep is not None:
+          h = h * keep[:, :, t]
+          if c is not None: c = c * keep[:, :, t]
+
+        gates_hidden = torch.bmm(h, weight_hh.transpose(1, 2))
+        if bias_hh is not None: gates_hidden = gates_hidden + bias_hh
+
+        if self.base_type == 'gru':
+          r_input, z_input, n_input = gates_input[:, :, t].chunk(3, -1)
+          r_hidden, z_hidden, n_hidden = gates_hidden.chunk(3, -1)
+
+          r, z = torch.sigmoid(r_input + r_hidden), torch.sigmoid(z_input + z_hidden)
+          n = torch.tanh(n_input + r * n_hidden)
+          h = (1 - z) * n + z * h
+        else:
+          i, f, g, o = (gates_input[:, :, t] + gates_hidden).chunk(4, -1)
+
+          c = torch.sigmoid(f) * c + torch.sigmoid(i) * torch.tanh(g)
+          h = torch.sigmoid(o) * torch.tanh(c)
+
+        output_l.append(h)
+
+      output = torch.stack(output_l, 2)
+
+      # Dropout between layers, as in torch.nn.GRU/LSTM
+      if (l < self.num_layers - 1) and (self.seq_base[0].rnn_dropout_p > 0):
+        output = torch.nn.functional.dropout(output, self.seq_base[0].rnn_dropout_p, rnn[0].training)
+
+      states_new[0].append(h)
+      if c is not None: states_new[1].append(c)
+
+    states_new = [torch.stack(states_s, 0) for states_s in states_new]
+
+    if self.base_type == 'lstm':
+      hiddens = [(h, c) for h, c in zip(states_new[0].unbind(1), states_new[1].unbind(1))]
+    else:
+      hiddens = list(states_new[0].unbind(1))
+
+    return output, hiddens
+
+  def hidden(self, input):
+    '''
+    Runs the hidden layers of the group on an input of shape (group_size, num_samples, seq_len, in_features).
+    '''
+    if isinstance(self.hidden_layer[0], torch.nn.Identity):
+      return input
+
+    linear = [hidden_layer.F[0] for hidden_layer in self.hidden_layer]
+
+    output = torch.einsum('gnti,goi->gnto', input, self.stack(linear, 'weight'))
+    if linear[0].bias is not None:
+      output = output + self.stack(linear, 'bias')[:, None, None]
+
+    # The activations are elementwise, so one module serves the group. A softmax over a non-negative dim is shifted past
+    # the leading group dimension
+    hidden_layer = self.hidden_layer[0]
+    if (hidden_layer.activation == 'softmax') and (hidden_layer.softmax_dim >= 0):
+      output = torch.softmax(output, dim = hidden_layer.softmax_dim + 1)
+    else:
+      output = hidden_layer.F[1](output)
+
+    return hidden_layer.dropout(output)
+
+  def forward(self, input, hiddens, reset_mask = None):
+    '''
+    Forward pass.
+
+    Args:
+        input (torch.Tensor): Input of shape (group_size, num_samples, input_len, input_size).
+        hiddens (list): Hidden states of each input.
+        reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len) marking where recurrent bases
+                                             reset their hidden states.
+
+    Returns:
+        torch.Tensor: Base output of shape (group_size, num_samples, seq_len, base_output_size).
+        torch.Tensor: Hidden layer output of shape (group_size, num_samples, seq_len, hidden_out_features).
+        list: Updated hidden states of each input.
+    '''
+    if self.base_type == 'identity':
+      base_output = input
+    else:
+      base_output, hiddens = self.recurrence(input, hiddens, reset_mask)
+
+    if self.use_last_step:
+      base_output = base_output[:, :, -1:]
+
+    return base_output, self.hidden(base_output), hiddens
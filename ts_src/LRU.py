@@ -1,4 +1,5 @@
 import torch
+from typing import Optional, Tuple
 
 from ts_src.HiddenLayer import HiddenLayer
 
@@ -17,9 +18,15 @@ class LRU(torch.nn.Module):
         relax_init (list of float, optional): Relaxation factor initialization.
         relax_train (bool, optional): Whether relaxation factors are trainable. Default is True.
         relax_minmax (list of list of float, optional): Min and max values for relaxation factors.
+        mode (str, optional): Execution mode of the recurrence. 'loop' steps through time; 'scan' evaluates the recurrence
+                              in parallel over chunks of time; 'fft' convolves the input with the cached Laguerre kernels
+                              by FFT. Default is 'loop'.
+        scan_chunk_len (int, optional): Number of steps evaluated in parallel per chunk in 'scan' mode. Default is 128.
         device (str, optional): Device to use. Default is 'cpu'.
         dtype (torch.dtype, optional): Data type to use. Default is torch.float32.
     """
+
+    kernel_cache: Optional[Tuple[torch.Tensor, torch.Tensor]]
     
     def __init__(self,
                  input_size, hidden_size,
@@ -29,6 +36,7 @@ class LRU(torch.nn.Module):
                  relax_init=[0.5], relax_train=True, relax_minmax=[[0.1, 0.9]],
                  feature_associated=True,
                  input_block_weight_to_ones=False,
+                 mode='loop', scan_chunk_len=128,
                  device='cpu', dtype=torch.float32):
 
         super(LRU, self).__init__()
@@ -39,6 +47,11 @@ class LRU(torch.nn.Module):
           if arg != 'self':
             setattr(self, arg, locals_[arg])
 
+        if self.mode not in ['loop', 'scan', 'fft']:
+            raise ValueError(f"mode ({self.mode}) must be 'loop', 'scan', or 'fft'.")
+
+        self.kernel_cache = None
+
         if len(relax_init) == 1:
             self.relax_init = self.relax_init * self.num_filterbanks
 
@@ -61,7 +74,7 @@ class LRU(torch.nn.Module):
         else:
             self.input_block = torch.nn.Identity()
 
-    def init_hiddens(self, num_samples):
+    def init_hiddens(self, num_samples: int):
         """
         Initialize hidden states.
 
@@ -100,13 +113,175 @@ class LRU(torch.nn.Module):
       
       return output, hiddens_new
 
-    def forward(self, input, hiddens=None):
+    def get_system(self):
+        """
+        State-space form of the cell, hiddens_new = A @ hiddens + B * input, for each filterbank.
+
+        The Laguerre cascade of the cell is (I - a S) hiddens_new = (a I - S) hiddens + e_0 b input, where a = sqrt(relax),
+        b = sqrt(1 - relax), and S shifts the hidden units down by one.
+
+        Returns:
+            torch.Tensor: A of shape (num_filterbanks, hidden_size, hidden_size).
+            torch.Tensor: B of shape (num_filterbanks, hidden_size).
+        """
+        sq_relax = torch.sqrt(self.relax)[:, None, None]
+
+        eye = torch.eye(self.hidden_size).to(self.relax)
+        shift = torch.diag(torch.ones(self.hidden_size - 1), -1).to(self.relax)
+
+        # S is nilpotent, so (I - a S)^-1 = sum_k (a S)^k, i.e. a^(i - j) below the diagonal
+        step = torch.arange(self.hidden_size, device=self.relax.device)
+        lag = step[:, None] - step[None, :]
+        inv = sq_relax ** lag.clamp(min=0).to(self.relax) * (lag >= 0).to(self.relax)
+
+        A = inv @ (sq_relax * eye - shift)
+        B = inv[..., 0] * (1 - sq_relax[..., 0] ** 2).sqrt()
+
+        return A, B
+
+    def scan(self, input, hiddens, reset_mask: Optional[torch.Tensor]=None):
+        """
+        Evaluates the recurrence in parallel over chunks of time.
+
+        Within a chunk of length C, the hidden states are the convolution of the input with the kernel A^j B plus the
+        propagated hidden state A^(j+1) h, both computed for all steps at once. Only the chunk boundaries are sequential.
+
+        Args:
+            input (torch.Tensor): Input of the cascade of shape (num_samples, input_len, num_filterbanks).
+            hiddens (torch.Tensor): Initial hidden states of shape (num_filterbanks, num_samples, hidden_size).
+            reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len).
+
+        Returns:
+            torch.Tensor: Output of shape (num_samples, input_len, num_filterbanks, hidden_size).
+            torch.Tensor: Final hidden states.
+        """
+        num_samples, input_len, _ = input.shape
+
+        chunk_len = min(self.scan_chunk_len, input_len)
+        num_chunks = -(-input_len // chunk_len)
+
+        A, B = self.get_system()
+
+        # powers A^1..A^C by doubling
+        powers = A.unsqueeze(0)
+        while powers.shape[0] < chunk_len:
+            powers = torch.cat((powers, powers @ powers[-1]), 0)
+        powers = powers[:chunk_len]
+
+        # kernel A^j B, j = 0..C-1, laid out as a (C, C) lower-triangular Toeplitz matrix
+        kernel = torch.cat((B.unsqueeze(0), (powers[:-1] @ B.unsqueeze(-1)).squeeze(-1)), 0)
+        step = torch.arange(chunk_len, device=input.device)
+        lag = step[:, None] - step[None, :]
+        toeplitz = kernel[lag.clamp(min=0)] * (lag >= 0)[..., None, None].to(kernel)
+
+        pad_len = num_chunks * chunk_len - input_len
+        input = torch.nn.functional.pad(input, (0, 0, 0, pad_len)).reshape(num_samples, num_chunks, chunk_len, -1)
+
+        if reset_mask is None:
+            output = torch.einsum('jkfh,nckf->ncjfh', toeplitz, input)
+            carry: Optional[torch.Tensor] = None
+        else:
+            # steps before the last reset of a chunk do not reach the steps after it
+            reset_mask = torch.nn.functional.pad(reset_mask, (0, pad_len)).reshape(num_samples, num_chunks, chunk_len)
+            last_reset = torch.where(reset_mask, step, -1).cummax(-1).values
+            connected = (step >= last_reset.unsqueeze(-1)).to(input)
+            output = torch.einsum('jkfh,ncjk,nckf->ncjfh', toeplitz, connected, input)
+            carry = (last_reset < 0).to(input)
+
+        hiddens = hiddens.permute(1, 0, 2)
+        outputs = []
+        for c in range(num_chunks):
+            propagated = torch.einsum('jfhg,nfg->njfh', powers, hiddens)
+            if carry is not None: propagated = propagated * carry[:, c, :, None, None]
+            output_c = output[:, c] + propagated
+            outputs.append(output_c)
+            hiddens = output_c[:, -1]
+
+        output = torch.cat(outputs, 1)[:, :input_len]
+
+        return output, output[:, -1].permute(1, 0, 2)
+
+    def get_kernels(self, kernel_len: int):
+        """
+        Laguerre kernels A^j B, j = 0..kernel_len-1, of each filterbank and hidden unit, computed by doubling.
+
+        The kernels are cached outside of autograd and recomputed only when `relax` changes or a longer kernel is needed.
+
+        Args:
+            kernel_len (int): Number of steps of the kernels.
+
+        Returns:
+            torch.Tensor: Kernels of shape (kernel_len, num_filterbanks, hidden_size).
+        """
+        cacheable = not (torch.is_grad_enabled() and self.relax.requires_grad)
+
+        kernel_cache = self.kernel_cache
+        if cacheable and (kernel_cache is not None):
+            relax, kernels = kernel_cache
+            if (kernels.shape[0] >= kernel_len) and torch.equal(relax, self.relax.detach()):
+                return kernels[:kernel_len]
+
+        A, B = self.get_system()
+
+        kernels, A_m = B.unsqueeze(0), A
+        while kernels.shape[0] < kernel_len:
+            kernels = torch.cat((kernels, torch.einsum('fhg,jfg->jfh', A_m, kernels)), 0)
+            A_m = A_m @ A_m
+        kernels = kernels[:kernel_len]
+
+        if cacheable:
+            self.kernel_cache = (self.relax.detach().clone(), kernels)
+
+        return kernels
+
+    def fft_conv(self, input, hiddens, reset_mask: Optional[torch.Tensor]=None):
+        """
+        Evaluates the recurrence as an FFT convolution of the input with the Laguerre kernels.
+
+        A nonzero initial state adds its free response A^(n+1) h, so the final hidden state can be handed to the next call.
+        Inputs with a reset mask are evaluated with `scan`.
+
+        Args:
+            input (torch.Tensor): Input of the cascade of shape (num_samples, input_len, num_filterbanks).
+            hiddens (torch.Tensor): Initial hidden states of shape (num_filterbanks, num_samples, hidden_size).
+            reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len).
+
+        Returns:
+            torch.Tensor: Output of shape (num_samples, input_len, num_filterbanks, hidden_size).
+            torch.Tensor: Final hidden states.
+        """
+        if (reset_mask is not None) and reset_mask.any():
+            return self.scan(input, hiddens, reset_mask)
+
+        num_samples, input_len, _ = input.shape
+
+        kernels = self.get_kernels(input_len).to(input)
+
+        fft_len = 2 * input_len
+        output = torch.fft.irfft(torch.fft.rfft(input, n=fft_len, dim=1).unsqueeze(-1) * torch.fft.rfft(kernels, n=fft_len, dim=0),
+                                 n=fft_len, dim=1)[:, :input_len]
+
+        if hiddens.abs().sum() > 0:
+            A, _ = self.get_system()
+
+            # free response A^(n+1) h, by doubling
+            free, A_m = torch.einsum('fhg,nfg->nfh', A, hiddens.permute(1, 0, 2)).unsqueeze(1), A
+            while free.shape[1] < input_len:
+                free = torch.cat((free, torch.einsum('fhg,njfg->njfh', A_m, free)), 1)
+                A_m = A_m @ A_m
+            output = output + free[:, :input_len]
+
+        return output, output[:, -1].permute(1, 0, 2)
+
+    def forward(self, input, hiddens: Optional[torch.Tensor]=None, reset_mask: Optional[torch.Tensor]=None):
         """
         LRU forward pass.
 
         Args:
             input (torch.Tensor): Input tensor.
             hiddens (torch.Tensor, optional): Hidden states. Default is None.
+            reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len). The hidden states of a sample
+                                                 are reset to zero before each step where it is True. Default is None.
 
         Returns:
             torch.Tensor: Output tensor.
@@ -114,13 +289,33 @@ class LRU(torch.nn.Module):
         """
         num_samples, input_len, input_size = input.shape
         
-        if self.feature_associated & (self.num_filterbanks != input_size):
+        if self.feature_associated and (self.num_filterbanks != input_size):
           raise ValueError(f"LRU is feature-associated, but the number of filterbanks ({self.num_filterbanks}) does not equal the number of input features ({input_size}).")
 
         hiddens = self.init_hiddens(num_samples) if hiddens is None else hiddens
 
+        # The recurrence accumulates in the precision of the parameters (float32 by default), also under autocast.
+        # TorchScript needs a constant autocast device, so scripted LRUs skip the block
+        input, hiddens = input.to(self.relax.dtype), hiddens.to(self.relax.dtype)
+        if torch.jit.is_scripting():
+            return self.recurrence(input, hiddens, reset_mask)
+        else:
+            with torch.autocast(device_type=input.device.type, enabled=False):
+                return self.recurrence(input, hiddens, reset_mask)
+
+    def recurrence(self, input, hiddens, reset_mask: Optional[torch.Tensor]=None):
+        """
+        Runs the recurrence in the execution mode of the LRU. See `forward`.
+        """
+        if self.mode == 'scan':
+            return self.scan(self.input_block(input), hiddens, reset_mask)
+        elif self.mode == 'fft':
+            return self.fft_conv(self.input_block(input), hiddens, reset_mask)
+
         output = []
         for n, input_n in enumerate(input.split(1, 1)):
+            if reset_mask is not None:
+                hiddens = hiddens * (~reset_mask[:, n])[None, :, None].to(hiddens)
             output_n, hiddens = self.cell(input_n.squeeze(1), hiddens)
             output.append(output_n.unsqueeze(1))
 
@@ -0,0 +1,169 @@
+import functools
+import os
+
+import numpy as np
+import torch
+
+from ts_src.Attention import Attention
+
+class LayerCapture():
+  '''
+  Captures the outputs of selected layers of a model with forward hooks.
+
+  Each layer has a ring buffer of `max_batches` slots, allocated at the first capture and grown only when a larger output
+  arrives. Captured outputs are detached and copied into the buffer, so neither activations nor autograd graphs are kept alive
+  by the model, and the newest `max_batches` outputs of each layer are kept. The buffers can be offloaded to memory-mapped files.
+
+  For `Attention` layers the attention weights, of shape (num_samples, num_heads * key_len, query_len), are captured instead of
+  the output, and `steps` selects queries. The layers keep their weights only while captured.
+
+  Example:
+      with LayerCapture(model, layers = ['seq_base.0', 'output_layer.0'], steps = slice(-1, None), max_batches = 8) as capture:
+        model(input)
+      capture.get('output_layer.0')
+  '''
+
+  def __init__(self, model, layers = None, steps = None, max_batches = 1, offload_dir = None):
+    '''
+    Initializes the LayerCapture instance and registers its hooks.
+
+    Args:
+        model (torch.nn.Module): The model whose layers are captured.
+        layers (list, optional): Names of the captured layers, as in `model.named_modules()`. Defaults to the children of the
+                                 model, with module lists expanded (e.g. 'seq_base.0', 'hidden_layer.0', 'interaction_layer').
+        steps (slice or list, optional): Time steps (dimension 1) kept from each output, e.g. slice(-1, None) for the last
+                                         step. All steps are kept if None.
+        max_batches (int): Number of outputs kept per layer. Older outputs are overwritten.
+        offload_dir (str, optional): Directory of the memory-mapped files that hold the buffers. The buffers stay on the
+                                     device of the outputs if None.
+    '''
+
+    if max_batches < 1:
+      raise ValueError(f"max_batches ({max_batches}) must be at least 1.")
+
+    self.model, self.steps, self.max_batches, self.offload_dir = model, steps, max_batches, offload_dir
+    self.layers = self.get_layers(model) if layers is None else list(layers)
+
+    if self.offload_dir is not None:
+      os.makedirs(self.offload_dir, exist_ok = True)
+
+    self.buffer = {name: None for name in self.layers}
+    self.shapes = {name: [None] * self.max_batches for name in self.layers}
+    self.count = {name: 0 for name in self.layers}
+    self.files, self.num_files = {name: None for name in self.layers}, 0
+
+    self.handles, self.need_weights = [], {}
+    for name in self.layers:
+      module = self.model.get_submodule(name)
+      if isinstance(module, Attention):
+        self.need_weights[name] = module.need_weights
+        module.need_weights = True
+      # A partial of a method, not a closure, so that the hooks are pickled and copied along with the capture
+      self.handles.append(module.register_forward_hook(functools.partial(self.hook, name)))
+
+  @staticmethod
+  def get_layers(model):
+    '''
+    Returns the names of the children of the model, with module lists expanded.
+    '''
+    layers = []
+    for name, module in model.named_children():
+      if isinstance(module, torch.nn.ModuleList):
+        layers += [f"{name}.{i}" for i, _ in module.named_children()]
+      else:
+        layers.append(name)
+    return layers
+
+  def hook(self, name, module, input, output):
+    '''
+    Forward hook of layer `name`.
+    '''
+    if isinstance(module, Attention):
+      if module.weight is not None:
+        self.store(name, module.weight, dim = -1)
+    else:
+      if isinstance(output, (tuple, list)):
+        output = output[0]
+      if isinstance(output, torch.Tensor):
+        self.store(name, output)
+
+  def allocate(self, name, shape, output):
+    '''
+    Returns a buffer of `max_batches` slots of the given shape, as a tensor backed by a memory-mapped file if offloading.
+    '''
+    if self.offload_dir is None:
+      return torch.zeros([self.max_batches] + shape, device = output.device, dtype = output.dtype)
+
+    # numpy has no bfloat16, so it is stored as float32
+    dtype = torch.float32 if output.dtype == torch.bfloat16 else output.dtype
+    path = os.path.join(self.offload_dir, f"{name}.{self.num_files}.bin")
+    self.files[name], self.num_files = path, self.num_files + 1
+    return torch.from_numpy(np.memmap(path, dtype = torch.empty((), dtype = dtype).numpy().dtype, mode = 'w+',
+                                      shape = tuple([self.max_batches] + shape)))
+
+  def store(self, name, output, dim = 1):
+    '''
+    Copies a detached output of layer `name` into the next slot of its ring buffer, keeping `steps` of its dimension `dim`.
+    '''
+    output = output.detach()
+    if (self.steps is not None) and (output.ndim > 1):
+      output = output[(slice(None),) * (dim % output.ndim) + (self.steps,)]
+
+    shape = list(output.shape)
+
+    buffer = self.buffer[name]
+    if (buffer is None) or (buffer.ndim != len(shape) + 1) or any(s > b for s, b in zip(shape, buffer.shape[1:])):
+      # Grow to fit the new output, keeping the captured slots
+      max_shape = shape if (buffer is None) or (buffer.ndim != len(shape) + 1) else [max(s, b) for s, b in zip(shape, buffer.shape[1:])]
+      old_file = self.files[name]
+      self.buffer[name] = self.allocate(name, max_shape, output)
+      if (buffer is not None) and (buffer.ndim == len(shape) + 1):
+        for slot, shape_slot in enumerate(self.shapes[name]):
+          if shape_slot is not None:
+            index = (slot,) + tuple(slice(0, s) for s in shape_slot)
+            self.buffer[name][index] = buffer[index]
+      else:
+        self.shapes[name], self.count[name] = [None] * self.max_batches, 0
+      del buffer
+      if old_file is not None:
+        os.remove(old_file)
+
+    slot = self.count[name] % self.max_batches
+    self.buffer[name][(slot,) + tuple(slice(0, s) for s in shape)] = output.to(self.buffer[name])
+    self.shapes[name][slot] = shape
+    self.count[name] += 1
+
+  def get(self, name):
+    '''
+    Returns the captured outputs of layer `name`, oldest first. The tensors are views of the buffer and are overwritten by
+    later captures.
+    '''
+    count = self.count[name]
+    slots = [n % self.max_batches for n in range(max(0, count - self.max_batches), count)]
+    return [self.buffer[name][(slot,) + tuple(slice(0, s) for s in self.shapes[name][slot])] for slot in slots]
+
+  def clear(self):
+    '''
+    Forgets the captured outputs, keeping the buffers.
+    '''
+    for name in self.layers:
+      self.shapes[name] = [None] * self.max_batches
+      self.count[name] = 0
+
+  def remove(self):
+    '''
+    Removes the hooks and restores the attention layers. The captured outputs stay available.
+    '''
+    for handle in self.handles:
+      handle.remove()
+    self.handles = []
+
+    for name, need_weights in self.need_weights.items():
+      self.model.get_submodule(name).need_weights = need_weights
+    self.need_weights = {}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.remove()
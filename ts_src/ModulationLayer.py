@@ -1,12 +1,18 @@
 import torch
 
+from ts_src.LegendreModulator import LegendreModulator
+from ts_src.ChebychevModulator import ChebychevModulator
+from ts_src.FourierModulator import FourierModulator
+from ts_src.SigmoidModulator import SigmoidModulator
+from ts_src.HiddenLayer import HiddenLayer
+
 class ModulationLayer(torch.nn.Module):
 
     def __init__(self, window_len, in_features, associated=False, legendre_degree=None, chebychev_degree=None,
                  dt=1, num_freqs=None, freq_init=None, freq_train=True, phase_init=None, phase_train=True,
                  num_sigmoids=None, slope_init=None, slope_train=True, shift_init=None, shift_train=True,
                  weight_reg=[0.001, 1.], weight_norm=2, zero_order=True, bias=True, pure=False,
-                 norm_type=False, affine_norm=False,
+                 norm_type=False, affine_norm=False, max_table_len=2**16,
                  device='cpu', dtype=torch.float32):
         '''
         Constructor method for initializing the ModulationLayer module and its attributes.
@@ -33,6 +39,9 @@ class ModulationLayer(torch.nn.Module):
             zero_order (bool): Whether to include the zeroth-order term (constant) in the modulation functions.
             bias (bool): If True, adds a learnable bias to the linear function.
             pure (bool): If True, concatenates a constant term to the input.
+            max_table_len (int): Maximum number of steps of the table of Legendre and Chebychev functions. The table starts at
+                                 `window_len` steps and doubles when later steps are requested, up to this length. Steps
+                                 beyond it are evaluated on the fly.
             device (str): Device to use for computation ('cpu' or 'cuda').
             dtype (torch.dtype): Data type of the model parameters.
         '''
@@ -45,7 +54,6 @@ class ModulationLayer(torch.nn.Module):
         
         idx = 1
         self.num_modulators, m = 0, 0
-        F = []
 
         self.modulators = torch.nn.ModuleList([])
 
@@ -56,7 +64,6 @@ class ModulationLayer(torch.nn.Module):
             F_legendre = LegendreModulator(window_len=self.window_len, scale=True, degree=self.legendre_degree,
                                            zero_order=self.zero_order, device=self.device, dtype=self.dtype)
             self.modulators.append(F_legendre)
-            F.append(F_legendre.functions)
             self.legendre_idx = [m, torch.arange(idx, idx + F_legendre.num_modulators)]
             idx += F_legendre.num_modulators
 
@@ -65,9 +72,8 @@ class ModulationLayer(torch.nn.Module):
             m += 1
             # Create ChebychevModulator instance
             F_chebychev = ChebychevModulator(window_len=self.window_len, scale=True, kind=1, degree=self.chebychev_degree,
-                                             zero_order=self.zero_order * (len(F) == 0), device=self.device, dtype=self.dtype)
+                                             zero_order=self.zero_order * (F_legendre is None), device=self.device, dtype=self.dtype)
             self.modulators.append(F_chebychev)
-            F.append(F_chebychev.functions)
             self.chebychev_idx = [m, torch.arange(idx, idx + F_chebychev.num_modulators)]
             idx += F_chebychev.num_modulators
 
@@ -80,7 +86,6 @@ class ModulationLayer(torch.nn.Module):
                                          phase_init=self.phase_init, phase_train=self.phase_train,
                                          device=self.device, dtype=self.dtype)
             self.modulators.append(F_fourier)
-            F.append(F_fourier.functions)
             self.fourier_idx = [m, torch.arange(idx, idx + F_fourier.num_modulators)]
             idx += F_fourier.num_modulators
 
@@ -93,14 +98,18 @@ class ModulationLayer(torch.nn.Module):
                                          shift_init=self.shift_init, shift_train=self.shift_train,
                                          device=self.device, dtype=self.dtype)
             self.modulators.append(F_sigmoid)
-            F.append(F_sigmoid.functions)
             self.sigmoid_idx = [m, torch.arange(idx, idx + F_sigmoid.num_modulators)]
             idx += F_sigmoid.num_modulators
 
-        # Concatenate modulation functions
-        self.F = torch.cat(F, -1)
+        self.num_modulators = sum(modulator.num_modulators for modulator in self.modulators)
+
+        # The fixed (Legendre and Chebychev) functions are tabulated, starting over the window. The trainable (Fourier and
+        # Sigmoid) functions change with their parameters, so they are evaluated at the requested steps in each pass.
+        self.fixed_modulators = [modulator for modulator in [F_legendre, F_chebychev] if modulator is not None]
+        self.trainable_modulators = [modulator for modulator in [F_fourier, F_sigmoid] if modulator is not None]
 
-        self.num_modulators = self.F.shape[-1]
+        self.register_buffer('F', self.generate_fixed_functions() if len(self.fixed_modulators) > 0 else None,
+                             persistent=False)
 
         # Create HiddenLayer instance
         self.linear_fn = HiddenLayer(in_features=self.in_features + int(self.pure),
@@ -122,19 +131,86 @@ class ModulationLayer(torch.nn.Module):
         else:
             self.norm_layer = torch.nn.Identity()
           
+    def generate_fixed_functions(self, steps=None):
+        '''
+        Evaluate the Legendre and Chebychev functions.
+
+        Args:
+            steps (torch.Tensor, optional): Steps of any shape. Defaults to the steps of the window.
+
+        Returns:
+            torch.Tensor: Functions of shape steps.shape + (number of fixed functions,).
+
+        '''
+        return torch.cat([modulator.generate_basis_functions(steps) for modulator in self.fixed_modulators], -1)
+
+    def grow(self, table_len):
+        '''
+        Extend the table of Legendre and Chebychev functions to at least `table_len` steps, capped at `max_table_len`.
+
+        The table at least doubles, so that stepping one step at a time past the window grows it a logarithmic number of times.
+        Only the new steps are evaluated.
+
+        Args:
+            table_len (int): Required number of steps.
+
+        '''
+        table_len = min(self.max_table_len, max(table_len, 2 * self.F.shape[0]))
+
+        if table_len > self.F.shape[0]:
+            steps = torch.arange(self.F.shape[0], table_len, device=self.F.device)
+            self.F = torch.cat((self.F, self.generate_fixed_functions(steps).to(self.F)), 0)
+
+    def get_functions(self, steps):
+        '''
+        Return the modulation functions at the given steps.
+
+        The Legendre and Chebychev functions are read from the table, which grows when later steps are requested. Once
+        the table reaches `max_table_len`, the functions of later steps are evaluated on the fly. The Fourier and Sigmoid
+        functions are evaluated at the steps.
+
+        Args:
+            steps (torch.Tensor): Steps of any shape.
+
+        Returns:
+            torch.Tensor: Functions of shape steps.shape + (num_modulators,).
+
+        '''
+        F = []
+        if self.F is not None:
+            num_steps = int(steps.max()) + 1 if steps.numel() > 0 else 0
+            if num_steps > self.F.shape[0]:
+                self.grow(num_steps)
+
+            if num_steps <= self.F.shape[0]:
+                F.append(self.F[steps])
+            else:
+                F.append(self.generate_fixed_functions(steps).to(self.F))
+
+        F += [modulator.generate_basis_functions(steps) for modulator in self.trainable_modulators]
+
+        return torch.cat(F, -1)
+
     def forward(self, input, steps):
         '''
         Perform a forward pass through the modulation layer.
 
         Args:
             input (torch.Tensor): Input tensor.
-            steps (int): Index of the modulation step.
+            steps (torch.Tensor, optional): Steps of the input, of shape (num_samples, seq_len). Defaults to the steps of the
+                                            input window, starting at 0.
 
         Returns:
             torch.Tensor: Output tensor.
 
         '''
         num_samples, seq_len, input_size = input.shape
+
+        if steps is None:
+            steps = torch.arange(seq_len, device=input.device).expand(num_samples, seq_len)
+        else:
+            # The input is aligned with the last steps
+            steps = steps[:, -seq_len:]
         
         if self.pure:
             input_ = torch.cat((torch.ones((num_samples, seq_len, 1)).to(device=self.device, dtype=self.dtype), input), -1).to(input)
@@ -142,7 +218,7 @@ class ModulationLayer(torch.nn.Module):
             input_ = input
 
         # Calculate the output using modulation and linear function
-        output = self.F[steps] * self.linear_fn(input_)
+        output = self.get_functions(steps) * self.linear_fn(input_)
 
         if self.norm_type == 'batch':
             output = self.norm_layer(output.permute(0, 2, 1)).permute(0, 2, 1)
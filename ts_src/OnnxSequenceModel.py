@@ -0,0 +1,200 @@
+import warnings
+
+import numpy as np
+import torch
+
+from ts_src.CompiledSequenceModel import CompiledSequenceModel
+
+class OnnxExport(torch.nn.Module):
+  '''
+  Flat signature of a CompiledSequenceModel for export: the input and the hidden states of the recurrent bases in, the output
+  and the updated hidden states out. Bases without hidden states receive empty states.
+  '''
+  def __init__(self, compiled, recurrent, output_mask = None):
+    super(OnnxExport, self).__init__()
+    self.compiled, self.recurrent = compiled, recurrent
+    self.output_mask = output_mask
+
+  def forward(self, input, *hiddens):
+    hiddens = iter(hiddens)
+    hiddens = [next(hiddens) if recurrent else torch.zeros((0,), device = input.device, dtype = input.dtype)
+               for recurrent in self.recurrent]
+
+    output, hiddens = self.compiled(input, hiddens, self.output_mask)
+
+    return (output,) + tuple(hiddens_i for hiddens_i, recurrent in zip(hiddens, self.recurrent) if recurrent)
+
+class OnnxSequenceModel():
+  '''
+  ONNX Runtime execution path of a SequenceModel, for inference on CPU.
+
+  `export` writes one forward pass of the model (see `CompiledSequenceModel`) over a fixed input length to an ONNX file, with
+  the hidden states of the recurrent bases ('gru', 'lstm', 'lru') as inputs 'hiddens_{i}' and outputs 'hiddens_{i}_new', and
+  the number of samples as a dynamic axis. LRU bases are exported in 'scan' mode. The file runs with onnxruntime's CPU
+  execution provider alone, without PyTorch or the model code; this class only converts tensors and hidden states.
+
+  The exported file is a snapshot of the parameters, so it is exported again after further training.
+
+  Example:
+      onnx_model = OnnxSequenceModel.export(model, 'model.onnx', input_len = 24)
+      output, hiddens = onnx_model(input)
+      output, hiddens = onnx_model(next_input, hiddens)
+  '''
+
+  def __init__(self, path, num_threads = None):
+    '''
+    Loads an exported model into an onnxruntime session.
+
+    Args:
+        path (str): Path of the ONNX file written by `export`.
+        num_threads (int, optional): Number of intra-op threads of the session. Defaults to onnxruntime's choice.
+    '''
+
+    try:
+      import onnxruntime
+    except ImportError as e:
+      raise ImportError("OnnxSequenceModel requires onnxruntime (`pip install onnxruntime`).") from e
+
+    self.path, self.num_threads = path, num_threads
+
+    options = onnxruntime.SessionOptions()
+    if num_threads is not None:
+      options.intra_op_num_threads = num_threads
+
+    self.session = onnxruntime.InferenceSession(path, options, providers = ['CPUExecutionProvider'])
+
+    metadata = self.session.get_modelmeta().custom_metadata_map
+    self.base_type = metadata['base_type'].split(',')
+    self.num_inputs = len(self.base_type)
+
+    inputs = {input.name: input for input in self.session.get_inputs()}
+    self.input_len = inputs['input'].shape[1]
+    self.dtype = np.float64 if inputs['input'].type == 'tensor(double)' else np.float32
+
+    self.hidden_idx = [int(name.split('_')[1]) for name in inputs if name.startswith('hiddens_')]
+    # Shapes of the hidden states, with None for the number of samples
+    self.hidden_shape = {i: [None if isinstance(size, str) else size for size in inputs[f"hiddens_{i}"].shape]
+                         for i in self.hidden_idx}
+
+    self.output_names = ['output'] + [f"hiddens_{i}_new" for i in self.hidden_idx]
+
+  @staticmethod
+  def export(model, path, input_len = None, input_window_idx = None, output_mask = None, num_threads = None,
+             opset_version = 17):
+    '''
+    Exports the forward pass of a SequenceModel to ONNX and loads it.
+
+    Args:
+        model (SequenceModel): The trained model. Bases and layers must be supported by `CompiledSequenceModel`.
+        path (str): Path of the ONNX file.
+        input_len (int, optional): Number of input steps of each forward pass. Defaults to the end of the last input window,
+                                   or to the longest input length of the model.
+        input_window_idx (list, optional): Input window indices of each input, e.g. `TimeSeriesDataModule.train_input_window_idx`.
+        output_mask (torch.Tensor, optional): Mask multiplied with the output.
+        num_threads (int, optional): Number of intra-op threads of the session.
+        opset_version (int): ONNX opset version.
+
+    Returns:
+        OnnxSequenceModel: The loaded model.
+    '''
+
+    if input_len is None:
+      input_len = max(int(idx.max()) + 1 for idx in input_window_idx) if input_window_idx is not None else max(model.input_len)
+
+    compiled = CompiledSequenceModel(model, input_window_idx)
+    recurrent = [base_type in ['gru', 'lstm', 'lru'] for base_type in model.base_type]
+
+    if output_mask is not None:
+      output_mask = output_mask.to(device = model.device, dtype = model.dtype)
+
+    exporter = OnnxExport(compiled, recurrent, output_mask)
+
+    # Two samples, so that the number of samples is not specialized to 1
+    input = torch.zeros((2, input_len, sum(model.input_size)), device = model.device, dtype = model.dtype)
+
+    # The 'loop' cell of LRU bases unrolls into hundreds of nodes per step and 'fft' has no ONNX counterpart, so LRUs are
+    # exported in 'scan' mode, which evaluates the same recurrence with matrix products
+    lrus = [seq_base.base for seq_base in model.seq_base if seq_base.base_type == 'lru']
+    lru_modes = [lru.mode for lru in lrus]
+
+    training = model.training
+    model.eval()
+    for lru in lrus: lru.mode = 'scan'
+    try:
+      with torch.no_grad():
+        # Zero hidden states of the right shapes
+        _, hiddens = compiled(input)
+        hiddens = [torch.zeros_like(hiddens_i) for hiddens_i, recurrent_i in zip(hiddens, recurrent) if recurrent_i]
+
+        hidden_names = [f"hiddens_{i}" for i, recurrent_i in enumerate(recurrent) if recurrent_i]
+        dynamic_axes = {'input': {0: 'num_samples'}, 'output': {0: 'num_samples'}}
+        for name, hiddens_i in zip(hidden_names, hiddens):
+          # The samples are the second to last dimension of the hidden states
+          dynamic_axes[name] = dynamic_axes[f"{name}_new"] = {hiddens_i.ndim - 2: 'num_samples'}
+
+        with warnings.catch_warnings():
+          warnings.simplefilter('ignore')
+          torch.onnx.export(exporter, (input, *hiddens), path,
+                            input_names = ['input'] + hidden_names,
+                            output_names = ['output'] + [f"{name}_new" for name in hidden_names],
+                            dynamic_axes = dynamic_axes,
+                            opset_version = opset_version,
+                            dynamo = False)
+    finally:
+      model.train(training)
+      for lru, mode in zip(lrus, lru_modes): lru.mode = mode
+
+    import onnx
+
+    onnx_model = onnx.load(path)
+    onnx.helper.set_model_props(onnx_model, {'base_type': ','.join(model.base_type)})
+    onnx.save(onnx_model, path)
+
+    return OnnxSequenceModel(path, num_threads = num_threads)
+
+  def init_hiddens(self, num_samples):
+    '''
+    Returns zero hidden states of each recurrent base, as numpy arrays.
+    '''
+    return {i: np.zeros([num_samples if size is None else size for size in shape], dtype = self.dtype)
+            for i, shape in self.hidden_shape.items()}
+
+  def __call__(self, input, hiddens = None):
+    '''
+    Forward pass.
+
+    Args:
+        input (torch.Tensor): Input of shape (num_samples, input_len, input_size).
+        hiddens (list, optional): Hidden states of each input, as returned by this model or by SequenceModel. Recurrent bases
+                                  with None states start from zeros.
+
+    Returns:
+        torch.Tensor: Output of shape (num_samples, output_len, output_size), on the CPU.
+        list: Updated hidden states of each input, None for bases without hidden states, and an (h, c) tuple for LSTMs.
+    '''
+
+    input = input.detach().cpu().numpy().astype(self.dtype, copy = False)
+
+    if input.shape[1] != self.input_len:
+      raise ValueError(f"The input has {input.shape[1]} steps, but the model was exported for {self.input_len}.")
+
+    feed = {'input': input}
+    zeros = None
+    for i in self.hidden_idx:
+      hiddens_i = hiddens[i] if hiddens is not None else None
+      if hiddens_i is None:
+        zeros = zeros or self.init_hiddens(input.shape[0])
+        feed[f"hiddens_{i}"] = zeros[i]
+      else:
+        if isinstance(hiddens_i, (tuple, list)):
+          hiddens_i = torch.stack(tuple(hiddens_i), 0)
+        feed[f"hiddens_{i}"] = hiddens_i.detach().cpu().numpy().astype(self.dtype, copy = False)
+
+    output, *hiddens_new = self.session.run(self.output_names, feed)
+
+    hiddens = [None] * self.num_inputs
+    for i, hiddens_i in zip(self.hidden_idx, hiddens_new):
+      hiddens_i = torch.from_numpy(hiddens_i)
+      hiddens[i] = tuple(hiddens_i.unbind(0)) if self.base_type[i] == 'lstm' else hiddens_i
+
+    return torch.from_numpy(output), hiddens
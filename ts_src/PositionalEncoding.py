@@ -26,18 +26,24 @@ class PositionalEncoding(torch.nn.Module):
         
       self.positional_encoding = self.generate_positional_encoding()
 
-  def generate_positional_encoding(self):
+  def generate_positional_encoding(self, num_positions=None):
       '''
       Generates the positional encoding based on the encoding type.
 
+      Args:
+        num_positions (int, optional): Number of positions to encode. Defaults to input_len. Positions past input_len
+                                       continue the encoding of the first input_len.
+
       Returns:
-        torch.Tensor: Positional encoding tensor of shape (input_len, dim).
+        torch.Tensor: Positional encoding tensor of shape (num_positions, dim).
       '''
 
-      position = torch.arange(self.input_len).unsqueeze(1).to(device=self.device, dtype=self.dtype)
+      num_positions = num_positions or self.input_len
+
+      position = torch.arange(num_positions).unsqueeze(1).to(device=self.device, dtype=self.dtype)
 
       if self.encoding_type == 'absolute':
-          positional_encoding = torch.zeros((self.input_len, self.dim)).to(device=self.device, dtype=self.dtype)
+          positional_encoding = torch.zeros((num_positions, self.dim)).to(device=self.device, dtype=self.dtype)
 
           scaler = torch.exp(torch.arange(0, self.dim, 2) * -(torch.math.log(10000.0) / self.dim)).to(
               device=self.device, dtype=self.dtype)
@@ -49,19 +55,25 @@ class PositionalEncoding(torch.nn.Module):
           positional_encoding = (position.repeat(1, self.dim) +
                                   torch.arange(self.dim).reshape(1, -1).to(device=self.device, dtype=self.dtype)) / self.input_len
 
-          positional_encoding = positional_encoding / positional_encoding.max()
+          # normalized by the largest value over the first input_len positions
+          positional_encoding = positional_encoding / ((self.input_len - 1 + self.dim - 1) / self.input_len)
 
       return positional_encoding
 
-  def forward(self, input):
+  def forward(self, input, offset=0):
       '''
       Forward pass of the positional encoding layer.
 
       Args:
         input (torch.Tensor): Input tensor of shape (batch_size, input_len, dim).
+        offset (int, optional): Position of the first step of the input, e.g. during incremental decoding. Defaults to 0.
 
       Returns:
         torch.Tensor: Input tensor with added positional encoding of shape (batch_size, input_len, dim).
       '''
 
-      return input + self.positional_encoding[:input.shape[1], :]
+      end = offset + input.shape[1]
+      if end > self.positional_encoding.shape[0]:
+          self.positional_encoding = self.generate_positional_encoding(end)
+
+      return input + self.positional_encoding[offset:end, :]
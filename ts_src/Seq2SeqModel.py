@@ -2,6 +2,8 @@ import torch
 import numpy as np
 
 from ts_src import HiddenLayer as HiddenLayer
+from ts_src.TransformBank import TransformBank
+from ts_src.quantize import quantize
 
 class Seq2SeqModel(torch.nn.Module):
     def __init__(self,
@@ -102,7 +104,8 @@ class Seq2SeqModel(torch.nn.Module):
                 input_window_idx = None, output_window_idx = None,
                 output_input_idx = [], input_output_idx = [],
                 encoder_output = None,
-                target = None):
+                target = None,
+                reset_mask = None):
 
       """
       Forward pass of the Seq2SeqModel.
@@ -119,6 +122,7 @@ class Seq2SeqModel(torch.nn.Module):
           input_output_idx (list): List of indices for input outputs. Default is an empty list.
           encoder_output (Tensor): Output from the encoder.
           target (Tensor): Target tensor of shape (batch_size, output_len, output_size).
+          reset_mask (Tensor): Boolean tensor of shape (batch_size, input_len) marking where the encoder resets its hidden states.
 
       Returns:
           decoder_output (Tensor): Decoder output tensor.
@@ -146,7 +150,8 @@ class Seq2SeqModel(torch.nn.Module):
                                                      steps = encoder_steps,
                                                      input_window_idx = input_window_idx,
                                                      hiddens = hiddens,
-                                                     input_mask = input_mask)
+                                                     input_mask = input_mask,
+                                                     reset_mask = reset_mask)
       
       # hiddens = encoder_hiddens.copy()
       
@@ -236,6 +241,13 @@ class Seq2SeqModel(torch.nn.Module):
       # Apply constraints to the decoder
       self.decoder.constrain()
 
+    def quantize(self, dtype=torch.qint8):
+      """
+      Return a copy of the trained model for CPU inference, with dynamic quantization of the linear layers and GRU/LSTM bases
+      of the encoder and decoder. See `SequenceModel.quantize`.
+      """
+      return quantize(self, dtype=dtype)
+
     def predict(self,
                 input, steps=None,
                 hiddens=None,
@@ -292,11 +304,7 @@ class Seq2SeqModel(torch.nn.Module):
 
       # Apply output transforms if provided
       if output_transforms:
-        for sampled_idx in range(num_samples):
-          j = 0
-          for i in range(self.num_outputs):
-            prediction[sampled_idx, :, j:(j + self.output_size[i])] = output_transforms[i].inverse_transform(prediction[sampled_idx, :, j:(j + self.output_size[i])])
-            j += self.output_size[i]
+          prediction = TransformBank(output_transforms, sizes = self.output_size).inverse_transform(prediction)
 
       return prediction, prediction_time
 
@@ -404,12 +412,7 @@ class Seq2SeqModel(torch.nn.Module):
  
       # Apply output transforms if provided
       if output_transforms:
-          for sampled_idx in range(num_samples):
-              j = 0
-              for i in range(self.num_outputs):
-                  forecast[sampled_idx, :, j:(j + self.output_size[i])] = output_transforms[i].inverse_transform(
-                      forecast[sampled_idx, :, j:(j + self.output_size[i])])
-                  j += self.output_size[i]
+          forecast = TransformBank(output_transforms, sizes = self.output_size).inverse_transform(forecast)
 
       # Extract forecasted results for the specified number of forecast steps
       forecast = forecast[:, forecast_len:][:, :num_forecast_steps]
@@ -19,6 +19,10 @@ class SequenceDataloader(torch.utils.data.Dataset):
       shift (list): List of output shifts. If a single value is provided, it is replicated for all outputs.
       stride (int): Stride value. Defaults to 1.
       init_input (torch.Tensor or None): Initial input for padding. Defaults to None.
+      covariate_size (dict or None): Sizes of inputs generated per batch from the steps. Defaults to None.
+      pack_len (int or None): If given and `data` is a list, records are concatenated into packed streams of at least `pack_len` steps.
+                              Defaults to None.
+      pack_mode (str): How windows crossing a record boundary of a packed stream are handled ('drop' or 'reset'). Defaults to 'drop'.
       print_summary (bool): Whether to print summary information. Defaults to False.
       device (str): Device on which the dataloader is allocated. Defaults to 'cpu'.
       dtype (torch.dtype): Data type of the dataloader. Defaults to torch.float32.
@@ -32,6 +36,8 @@ class SequenceDataloader(torch.utils.data.Dataset):
                input_len=[1], output_len=[1], max_len = None,
                shift=[0], stride=1,
                init_input=None,
+               covariate_size=None,
+               pack_len=None, pack_mode='drop',
                forecast = False,
                shuffle = False,
                print_summary=False,
@@ -55,6 +61,41 @@ class SequenceDataloader(torch.utils.data.Dataset):
         self.data[step_name] = torch.arange(self.data[self.output_names[0]].shape[0]).to(device = self.device, dtype = torch.long)
 
     self.dl = self.get_dataloader
+
+  def pack(self, data):
+    '''
+    Concatenates consecutive records into packed streams of at least `pack_len` steps.
+
+    Each stream keeps the steps of its records, so record boundaries are where the steps are not consecutive. The stream's 'id' holds
+    the id of each record and 'record' holds the position of the record of each step.
+
+    Args:
+        data (list): List of record dictionaries.
+
+    Returns:
+        list: List of packed stream dictionaries.
+    '''
+
+    names = [name for name in np.unique(self.input_names + self.output_names) if name in data[0]] + [self.step_name]
+
+    streams, stream, stream_len = [], [], 0
+    for data_i in data:
+      stream.append(data_i)
+      stream_len += len(data_i[self.step_name])
+      if stream_len >= self.pack_len:
+        streams.append(stream)
+        stream, stream_len = [], 0
+    if len(stream) > 0: streams.append(stream)
+
+    packed = []
+    for stream in streams:
+      packed_i = {name: torch.cat([data_i[name] for data_i in stream], 0) for name in names}
+      packed_i['id'] = [data_i['id'] for data_i in stream]
+      packed_i['record'] = torch.cat([torch.full((len(data_i[self.step_name]),), k) for k, data_i in enumerate(stream)]).to(device = self.device,
+                                                                                                                            dtype = torch.long)
+      packed.append(packed_i)
+
+    return packed
   
   def collate_fn(self, batch):
 
@@ -100,14 +141,18 @@ class SequenceDataloader(torch.utils.data.Dataset):
     '''
 
     if isinstance(self.data, list):
+      data = self.pack(self.data) if (self.pack_len is not None) and (len(self.data) > 0) else self.data
+
       ds = []
-      for i in range(len(self.data)):
-        ds_i = SequenceDataset(data=self.data[i],
+      for i in range(len(data)):
+        ds_i = SequenceDataset(data=data[i],
                                input_names=self.input_names, output_names=self.output_names,
                                step_name=self.step_name,
                                input_len=self.input_len, output_len=self.output_len, max_len=self.max_len,
                                shift=self.shift, stride=self.stride,
                                init_input=self.init_input,
+                               covariate_size=self.covariate_size,
+                               pack_mode=self.pack_mode,
                                forecast = self.forecast,
                                # shuffle = self.shuffle,
                                print_summary=self.print_summary,
@@ -127,6 +172,7 @@ class SequenceDataloader(torch.utils.data.Dataset):
                            input_len=self.input_len, output_len=self.output_len, max_len=self.max_len,
                            shift=self.shift, stride=self.stride,
                            init_input=self.init_input,
+                           covariate_size=self.covariate_size,
                            forecast = self.forecast,
                            # shuffle = self.shuffle,
                            print_summary=self.print_summary,
@@ -157,7 +203,7 @@ class SequenceDataloader(torch.utils.data.Dataset):
       self.max_input_len, self.max_output_len = None, None
       self.unique_output_window_idx = None
 
-      self.output_mask = None
+      self.output_mask, self.input_mask = None, None
 
       ds = NoDataset()
 
@@ -204,4 +250,16 @@ class SequenceDataloader(torch.utils.data.Dataset):
 
           j += self.output_size[i]
 
+      # Entries of the stored input that hold data
+      self.input_mask = torch.zeros((self.total_input_len, np.sum(ds_0.stored_input_size))).to(device = self.device,
+                                                                                               dtype = self.dtype)
+
+      j = 0
+      for i in range(self.num_inputs):
+          if self.input_names[i] not in ds_0.stored_input_names: continue
+
+          self.input_mask[ds_0.input_window_idx[i], j:(j + self.input_size[i])] = 1
+
+          j += self.input_size[i]
+
     return dl
@@ -16,6 +16,12 @@ class SequenceDataset(torch.utils.data.Dataset):
     shift (list): List of output shifts. If a single value is provided, it is replicated for all outputs.
     stride (int): Stride value.
     init_input (torch.Tensor or None): Initial input for padding. Defaults to None.
+    covariate_size (dict or None): Sizes of inputs generated per batch from the steps (see CovariateGenerator). These inputs are not
+                                   stored in `data` or windowed; their columns are appended to the input after collation. Defaults to None.
+    record_name (str): Name of the record index of a packed stream (see SequenceDataloader.pack). If present in `data`, `data['id']` holds
+                       the id of each record and every window takes the id of the record of its last step. Defaults to 'record'.
+    pack_mode (str): How windows crossing a record boundary of a packed stream are handled. 'drop' skips them, 'reset' keeps them.
+                     Defaults to 'drop'.
     print_summary (bool): Whether to print summary information. Defaults to False.
     device (str): Device on which the dataset is allocated. Defaults to 'cpu'.
     dtype (torch.dtype): Data type of the dataset. Defaults to torch.float32.
@@ -28,6 +34,8 @@ class SequenceDataset(torch.utils.data.Dataset):
                input_len=[1], output_len=[1], max_len = None,
                shift=[0], stride=1,
                init_input=None,
+               covariate_size=None,
+               record_name='record', pack_mode='drop',
                # shuffle = False,
                forecast = False,
                print_summary=False,
@@ -44,6 +52,9 @@ class SequenceDataset(torch.utils.data.Dataset):
 
     self.num_inputs, self.num_outputs = len(self.input_names), len(self.output_names)
 
+    self.covariate_size = self.covariate_size or {}
+    self.stored_input_names = [name for name in self.input_names if name not in self.covariate_size]
+
     if len(self.input_len) == 1:
         self.input_len = self.input_len * self.num_inputs
 
@@ -52,15 +63,16 @@ class SequenceDataset(torch.utils.data.Dataset):
     if len(self.shift) == 1:
         self.shift = self.shift * self.num_outputs
     
-    for name in self.input_names + self.output_names:
+    for name in self.stored_input_names + self.output_names:
       if not isinstance(self.data[name], torch.Tensor):
         self.data[name] = torch.tensor(self.data[name]).to(device = self.device,
                                                            dtype = self.dtype)
       if self.max_len is not None: self.data[name] = self.data[name][:self.max_len]
     
     if self.max_len is not None: self.data[self.step_name] = self.data[self.step_name][:self.max_len]
+    if (self.max_len is not None) and (self.record_name in self.data): self.data[self.record_name] = self.data[self.record_name][:self.max_len]
       
-    self.data_len = self.data[self.input_names[0]].shape[0]
+    self.data_len = self.data[(self.stored_input_names + self.output_names)[0]].shape[0]
 
     if step_name not in data: self.data[step_name] = torch.arange(self.data_len).to(device = self.device,
                                                                                     dtype = torch.long)
@@ -70,7 +82,8 @@ class SequenceDataset(torch.utils.data.Dataset):
     self.input_len = [self.data_len - int(self.has_ar) if len == -1 else len for len in self.input_len]
     self.output_len = [self.data_len - int(self.has_ar) if len == -1 else len for len in self.output_len]
 
-    self.input_size = [self.data[name].shape[-1] for name in self.input_names]
+    self.input_size = [self.covariate_size[name] if name in self.covariate_size else self.data[name].shape[-1] for name in self.input_names]
+    self.stored_input_size = [self.data[name].shape[-1] for name in self.stored_input_names]
     self.output_size = [self.data[name].shape[-1] for name in self.output_names]
 
     self.max_input_len = np.max(self.input_len)
@@ -118,7 +131,7 @@ class SequenceDataset(torch.utils.data.Dataset):
       self.data[self.step_name] = torch.cat((self.data[self.step_name][-self.total_input_len:],
                                              torch.arange(pad_size).to(device = self.device, dtype = torch.long) + self.data[self.step_name].max() + 1)).to(device = self.device,
                                                                                                                                                             dtype = torch.long)
-      for name in np.unique(self.input_names + self.output_names):
+      for name in np.unique(self.stored_input_names + self.output_names):
         data_size = self.data[name].shape[-1]
         self.data[name] = self.data[name][-self.total_input_len:]
         self.data[name] = torch.nn.functional.pad(self.data[name],
@@ -138,7 +151,10 @@ class SequenceDataset(torch.utils.data.Dataset):
         tuple: A tuple containing input samples, output samples, and steps samples.
     '''
 
-    input_samples, output_samples, steps_samples = [], [], []
+    input_samples, output_samples, steps_samples, ids = [], [], [], []
+
+    # record index of each step of a packed stream
+    record = self.data[self.record_name] if self.record_name in self.data else None
 
     unique_input_window_idx = torch.cat(self.input_window_idx).unique()
     unique_output_window_idx = torch.cat(self.output_window_idx).unique()
@@ -147,18 +163,32 @@ class SequenceDataset(torch.utils.data.Dataset):
 
     window_idx_n = self.total_window_idx
 
-    num_samples = 0
+    num_samples, num_windows = 0, 0
     while window_idx_n.max() < self.data_len:
+        num_windows += 1
+
+        record_n = record[window_idx_n] if record is not None else None
+
+        # skip windows that cross a record boundary
+        if (record_n is not None) and (self.pack_mode == 'drop') and (record_n[0] != record_n[-1]):
+          window_idx_n = num_windows * self.stride + self.total_window_idx
+          continue
+
         num_samples += 1
 
+        ids.append(self.data['id'][record_n[-1].item()] if record_n is not None else self.data['id'])
+
         steps_samples.append(self.data[self.step_name][window_idx_n])
 
         # input
-        input_n = torch.zeros((self.total_input_len, np.sum(self.input_size))).to(device=self.device,
-                                                                           dtype=self.dtype)
+        input_n = torch.zeros((self.total_input_len, np.sum(self.stored_input_size))).to(device=self.device,
+                                                                                  dtype=self.dtype)
 
         j = 0
         for i in range(self.num_inputs):
+          # covariates are generated per batch
+          if self.input_names[i] in self.covariate_size: continue
+
           input_window_idx_i = self.input_window_idx[i]
 
           input_samples_window_idx_i = window_idx_n[input_window_idx_i] # - int(self.input_names[i] in self.output_names)
@@ -193,16 +223,23 @@ class SequenceDataset(torch.utils.data.Dataset):
 
         output_samples.append(output_n)
 
-        window_idx_n = num_samples * self.stride + self.total_window_idx
+        window_idx_n = num_windows * self.stride + self.total_window_idx
 
-    input_samples = torch.stack(input_samples)
-    output_samples = torch.stack(output_samples)
-    steps_samples = torch.stack(steps_samples)
+    if num_samples > 0:
+      input_samples = torch.stack(input_samples)
+      output_samples = torch.stack(output_samples)
+      steps_samples = torch.stack(steps_samples)
+    else:
+      # e.g. a packed stream whose records are all shorter than the window
+      input_samples = torch.zeros((0, self.total_input_len, np.sum(self.stored_input_size))).to(device = self.device, dtype = self.dtype)
+      output_samples = torch.zeros((0, self.total_output_len, np.sum(self.output_size))).to(device = self.device, dtype = self.dtype)
+      steps_samples = torch.zeros((0, self.total_window_size)).to(device = self.device, dtype = torch.long)
 
     if self.forecast:
       input_samples = input_samples[-1:]
       output_samples = output_samples[-1:]
       steps_samples = steps_samples[-1:]
+      ids = ids[-1:]
       num_samples = 1
 
     self.num_samples = num_samples
@@ -212,7 +249,7 @@ class SequenceDataset(torch.utils.data.Dataset):
     #   self.batch_shuffle_idx = torch.randperm(self.num_samples)
     #   input_samples, output_samples, steps_samples = input_samples[self.batch_shuffle_idx], output_samples[self.batch_shuffle_idx], steps_samples[self.batch_shuffle_idx]
 
-    return input_samples, output_samples, steps_samples, [self.data['id']]*self.num_samples
+    return input_samples, output_samples, steps_samples, ids
 
   def __len__(self):
     '''
@@ -234,4 +271,4 @@ class SequenceDataset(torch.utils.data.Dataset):
         tuple: A tuple containing the input, output, and steps for the sample.
     '''
 
-    return self.input_samples[idx], self.output_samples[idx], self.steps_samples[idx], self.data['id']
+    return self.input_samples[idx], self.output_samples[idx], self.steps_samples[idx], self.id[idx]
@@ -9,8 +9,12 @@ from datetime import datetime, timedelta
 from ts_src.SequenceModelBase import SequenceModelBase
 from ts_src.LRU import LRU
 from ts_src.HiddenLayer import HiddenLayer
+from ts_src.InputGroup import InputGroup
+from ts_src.LayerCapture import LayerCapture
 from ts_src.ModulationLayer import ModulationLayer
 from ts_src.fft import fft
+from ts_src.quantize import quantize
+from ts_src.TransformBank import TransformBank
 
 class SequenceModel(torch.nn.Module):
   def __init__(self,
@@ -22,6 +26,7 @@ class SequenceModel(torch.nn.Module):
                dt = 1, time_unit = 'S',
                norm_type = None, affine_norm = False,
                store_layer_outputs = False,
+               group_inputs = False,
                encoder_output_size = None,
                ## Sequence base parameters
                # type
@@ -40,6 +45,7 @@ class SequenceModel(torch.nn.Module):
                base_lru_relax_init = [[0.5]], base_lru_relax_train = [True], base_lru_relax_minmax = [[[0.1, 0.9]]], base_lru_num_filterbanks = [1],
                base_lru_feature_associated = [False],
                base_lru_input_block_weight_to_ones = [False],
+               base_lru_mode = ['loop'],
                # CNN parameters
                base_cnn_out_channels = [[1]],
                base_cnn_kernel_size = [[(1,)]], base_cnn_kernel_stride = [[(1,)]],
@@ -75,7 +81,7 @@ class SequenceModel(torch.nn.Module):
                base_value_weight_reg = [[0.001, 1]], base_value_weight_norm = [2], base_value_bias = [False],
                base_gen_weight_reg = [[0.001, 1]], base_gen_weight_norm = [2], base_gen_bias = [False],
                base_concat_weight_reg = [[0.001, 1]], base_concat_weight_norm = [2], base_concat_bias = [False],
-               base_attn_dropout_p = [0.], base_average_attn_weights = [False],
+               base_attn_dropout_p = [0.], base_average_attn_weights = [False], base_fused_attn = [False],
                base_constrain = [False], base_penalize = [False],
                ##
                # hidden layer parameters
@@ -102,7 +108,7 @@ class SequenceModel(torch.nn.Module):
                modulation_slope_init = None, modulation_slope_train = True, modulation_shift_init = None, modulation_shift_train = True,
                modulation_weight_reg = [0.001, 1.0], modulation_weight_norm = 2,
                modulation_zero_order = True,
-               modulation_bias = True, modulation_pure = False,
+               modulation_bias = True, modulation_pure = False, modulation_max_table_len = 2**16,
                # output layer
                output_associated = [False],
                output_bias = [True],
@@ -168,6 +174,7 @@ class SequenceModel(torch.nn.Module):
                                      relax_init = self.base_lru_relax_init[i], relax_train = self.base_lru_relax_train[i], relax_minmax = self.base_lru_relax_minmax[i], num_filterbanks = self.base_lru_num_filterbanks[i],
                                      lru_feature_associated = self.base_lru_feature_associated[i],
                                      lru_input_block_weight_to_ones = self.base_lru_input_block_weight_to_ones[i],
+                                     lru_mode = self.base_lru_mode[i],
                                      # CNN parameters
                                      cnn_out_channels = self.base_cnn_out_channels[i],
                                      cnn_causal_pad = self.base_cnn_causal_pad[i],
@@ -204,6 +211,7 @@ class SequenceModel(torch.nn.Module):
                                      concat_weight_reg = self.base_concat_weight_reg[i], concat_weight_norm = self.base_concat_weight_norm[i], concat_bias = self.base_concat_bias[i],
                                      attn_dropout_p = self.base_attn_dropout_p[i],
                                      average_attn_weights = self.base_average_attn_weights[i],
+                                     fused_attn = self.base_fused_attn[i],
                                      # always batch first
                                      batch_first = True,
                                      #
@@ -251,6 +259,9 @@ class SequenceModel(torch.nn.Module):
 
     self.max_base_seq_len = 1 if self.process_by_step else np.max([base.output_len for base in self.seq_base])
 
+    # inputs with the same base and hidden layer configuration are executed together
+    self.input_groups = self.get_input_groups() if self.group_inputs else []
+
     # interaction layer
     if self.interaction_out_features > 0:
       if sum(self.hidden_out_features) > 0:
@@ -295,27 +306,31 @@ class SequenceModel(torch.nn.Module):
       else:
         modulation_in_features = 0
         for i in range(self.num_inputs):
-          modulation_in_features += (1 + int(self.base_rnn_bidirectional[i]))*self.base_hidden_size[i]
-        else:
-          modulation_in_features += self.base_transformer_dim_feedforward[i]
+          if self.base_type[i] in ['lstm', 'gru']:
+            modulation_in_features += (1 + int(self.base_rnn_bidirectional[i]))*self.base_hidden_size[i]
+          elif self.base_type[i] == 'lru':
+            modulation_in_features += self.base_lru_num_filterbanks[i]*self.base_hidden_size[i]
+          else: # 'cnn' and 'transformer' bases output base_hidden_size features
+            modulation_in_features += self.base_hidden_size[i]
       #
 
       self.modulation_layer = ModulationLayer(window_len = self.modulation_window_len,
-                                              in_features = self.modulation_in_features,
+                                              in_features = modulation_in_features,
                                               associated = self.modulation_associated,
                                               legendre_degree = self.modulation_legendre_degree,
                                               chebychev_degree = self.modulation_chebychev_degree,
                                               dt = self.dt,
-                                              num_freqs = self.modulation_num_freqs, freq_init = self.modulation_freq_init,  freq_train = self.modulation_freq_init,
+                                              num_freqs = self.modulation_num_freqs, freq_init = self.modulation_freq_init,  freq_train = self.modulation_freq_train,
                                               phase_init = self.modulation_phase_init, phase_train = self.modulation_phase_train,
                                               num_sigmoids = self.modulation_num_sigmoids,
                                               slope_init = self.modulation_slope_init, slope_train = self.modulation_slope_train,
-                                              shift_init = self.modulation_shift_init, shift_train =  self.modulation_shift_init,
+                                              shift_init = self.modulation_shift_init, shift_train = self.modulation_shift_train,
                                               weight_reg = self.modulation_weight_reg, weight_norm = self.modulation_weight_norm,
                                               zero_order = self.modulation_zero_order,
                                               bias = self.modulation_bias, pure = self.modulation_pure,
                                               norm_type = self.norm_type,
                                               affine_norm = self.affine_norm,
+                                              max_table_len = self.modulation_max_table_len,
                                               device = self.device, dtype = self.dtype)
       self.modulation_out_features = self.modulation_layer.num_modulators
     #
@@ -416,6 +431,14 @@ class SequenceModel(torch.nn.Module):
 
       self.max_output_len = self.forward(X, encoder_output = encoder_output)[0].shape[1]
 
+    # layer outputs are only kept when requested, in the ring buffers of a LayerCapture (one slot per step if processing by step)
+    self.layer_capture = None
+    if self.store_layer_outputs:
+      layers = [f"seq_base.{i}" for i in range(self.num_inputs)] + [f"hidden_layer.{i}" for i in range(self.num_inputs)] \
+               + ['interaction_layer'] + (['modulation_layer'] if self.modulation_layer is not None else []) \
+               + [f"output_layer.{i}" for i in range(self.num_outputs)]
+      self.layer_capture = LayerCapture(self, layers = layers, max_batches = self.max_input_len if self.process_by_step else 1)
+
   def __repr__(self):
     total_num_params = 0
     total_num_trainable_params = 0
@@ -435,11 +458,54 @@ class SequenceModel(torch.nn.Module):
   def init_hiddens(self):
     return [None for _ in range(self.num_inputs)]
 
+  def get_input_groups(self):
+    """
+    Groups the inputs that share their base and hidden layer configuration (see `InputGroup.get_key`). Inputs that cannot be
+    grouped, or have no partner, are processed on their own.
+
+    Returns:
+        list: InputGroup of each group of two or more inputs.
+    """
+    groups = {}
+    for i in range(self.num_inputs):
+      key = InputGroup.get_key(self.seq_base[i], self.hidden_layer[i])
+      if key is not None:
+        groups.setdefault(key, []).append(i)
+
+    return [InputGroup(idx, [self.seq_base[i] for i in idx], [self.hidden_layer[i] for i in idx])
+            for idx in groups.values() if len(idx) > 1]
+
+  def init_cache(self, cache_len=None):
+    """
+    Starts incremental decoding: later forward passes only take the new steps. Recurrent bases continue from the hidden
+    states passed in instead of re-running the history, transformer bases attend to the cached keys and values of the
+    previous steps instead of re-encoding the window, and causal CNN bases only convolve the new steps with their cached
+    receptive fields.
+
+    Args:
+        cache_len (int, optional): Number of steps attended to by each step of a transformer base. Defaults to the input length of each base.
+    """
+    if self.process_by_step:
+      raise ValueError("Incremental decoding is not supported with `process_by_step`.")
+    if any(base_type not in ['lru', 'lstm', 'gru', 'transformer', 'cnn', 'identity'] for base_type in self.base_type):
+      raise ValueError(f"Incremental decoding requires recurrent, transformer, CNN, or identity bases (base_type = {self.base_type}).")
+
+    for seq_base in self.seq_base:
+      if seq_base.base_type != 'identity': seq_base.init_cache(cache_len)
+
+  def clear_cache(self):
+    """
+    Ends incremental decoding and frees the key/value caches of transformer bases and the cached inputs of CNN bases.
+    """
+    for seq_base in self.seq_base:
+      seq_base.clear_cache()
+
   def process(self,
               input, input_window_idx = None,
               hiddens = None,
               steps = None,
-              encoder_output = None):
+              encoder_output = None,
+              reset_mask = None):
 
     """
     Process the input data through the sequence model.
@@ -450,6 +516,7 @@ class SequenceModel(torch.nn.Module):
         hiddens (list, optional): List of initial hidden states for each input.
         steps (int, optional): Number of processing steps.
         encoder_output (torch.Tensor, optional): Encoder output data.
+        reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len) marking where recurrent bases reset their hidden states.
 
     Returns:
         torch.Tensor: Processed output data.
@@ -465,60 +532,55 @@ class SequenceModel(torch.nn.Module):
     # Initialize hidden states if not provided
     if hiddens is None: hiddens = self.init_hiddens()
     
-    hidden_output = []
-    # Process each input in the batch individually
-    for i, input_i in enumerate(input.split(self.input_size, -1)):
-      
-      # Determine the output feature size for the hidden layer
-      if self.hidden_out_features[i] > 0:
-        hidden_out_features_i = self.hidden_out_features[i]
-      else:
-        if self.seq_base[i].base_type in ['lstm', 'gru']:
-          hidden_out_features_i = (1 + int(self.base_rnn_bidirectional[i])) * self.base_hidden_size[i]
-        elif self.seq_base[i].base_type == 'lru':
-          hidden_out_features_i = self.base_hidden_size[i] * self.base_lru_num_filterbanks[i]
-        else:
-          hidden_out_features_i = self.base_hidden_size[i]
-
-      # Initialize tensor for hidden layer output
-      hidden_output_i = torch.zeros((num_samples, np.min([input_len, self.max_base_seq_len]), hidden_out_features_i)).to(input)
+    inputs = input.split(self.input_size, -1)
+    base_len = np.min([input_len, self.max_base_seq_len])
+
+    base_output, hidden_output = [None] * self.num_inputs, [None] * self.num_inputs
+
+    # Process grouped inputs together. A group whose inputs use different windows falls back to the loop below.
+    for input_group in self.input_groups:
+      idx = input_group.idx
+      if input_group.hooked(): continue
+      if (not self.process_by_step) and any(not torch.equal(input_window_idx[i], input_window_idx[idx[0]]) for i in idx[1:]):
+        continue
+
+      window_idx = torch.arange(input_len - 1, input_len).to(input_window_idx[idx[0]]) if self.process_by_step else input_window_idx[idx[0]]
+
+      base_output_g, hidden_output_g, hiddens_g = input_group(input = torch.stack([inputs[i][:, window_idx] for i in idx], 0),
+                                                              hiddens = [hiddens[i] for i in idx],
+                                                              reset_mask = None if reset_mask is None else reset_mask[:, window_idx])
+
+      for i, base_output_i, hidden_output_i, hiddens_i in zip(idx, base_output_g.unbind(0), hidden_output_g.unbind(0), hiddens_g):
+        base_output[i], hidden_output[i], hiddens[i] = base_output_i, hidden_output_i, hiddens_i
+
+    # Process each remaining input individually
+    for i, input_i in enumerate(inputs):
+      if hidden_output[i] is None:
+        # Generate output and updated hidden states from sequence base
+        base_output[i], hiddens[i] = self.seq_base[i](input = input_i[:, -1:] if self.process_by_step
+                                                      else input_i[:, input_window_idx[i]],
+                                                      hiddens = hiddens[i],
+                                                      encoder_output = encoder_output,
+                                                      reset_mask = None if reset_mask is None
+                                                                   else reset_mask[:, -1:] if self.process_by_step
+                                                                   else reset_mask[:, input_window_idx[i]])
+
+        # Generate hidden layer outputs for the ith input
+        hidden_output[i] = self.hidden_layer[i](base_output[i])
+
+      # Steps without a base output are zero
+      if hidden_output[i].shape[1] < base_len:
+        hidden_output[i] = torch.nn.functional.pad(hidden_output[i], (0, 0, base_len - hidden_output[i].shape[1], 0))
 
-      # Generate output and updated hidden states from sequence base
-      base_output_i, hiddens[i] = self.seq_base[i](input = input_i[:, -1:] if self.process_by_step
-                                                   else input_i[:, input_window_idx[i]],
-                                                   hiddens = hiddens[i],
-                                                   encoder_output = encoder_output)
-
-      # Store the output of the base layer if desired
-      if self.store_layer_outputs:
-        self.base_layer_output[i].append(base_output_i)
-
-      # Generate hidden layer outputs for the ith input
-      hidden_output_i[:, -base_output_i.shape[1]:] = self.hidden_layer[i](base_output_i)
-
-      hidden_output.append(hidden_output_i)
-
-      # Store the output of the hidden layer if desired
-      if self.store_layer_outputs:
-        self.hidden_layer_output[i].append(hidden_output_i)
-    
     output_ = torch.cat(hidden_output, -1)
 
     # Generate interaction layer output
     output_ = self.interaction_layer(output_)
 
-    # Store the output of the interaction layer if desired
-    if self.store_layer_outputs:
-      self.interaction_layer_output.append(output_)
-
     # Apply modulation layer if present
     if self.modulation_layer is not None:
       output_ = self.modulation_layer(output_, steps)
 
-      # Store the output of the modulation layer if desired
-      if self.store_layer_outputs:
-        self.modulation_layer_output.append(output_)
-
     # Generate output for each output layer
     output = []
     for i in range(self.num_outputs):
@@ -539,10 +601,6 @@ class SequenceModel(torch.nn.Module):
 
       output.append(output_i)
 
-      # Store the output of the output layer if required
-      if self.store_layer_outputs:
-        self.output_layer_output[i].append(output_i)
-
     # Concatenate outputs into single tensor
     output = torch.cat(output, -1)
 
@@ -559,7 +617,8 @@ class SequenceModel(torch.nn.Module):
               input_window_idx = None, output_window_idx = None,
               input_mask = None, output_mask = None,
               output_input_idx = [], input_output_idx = [],
-              encoder_output = None):
+              encoder_output = None,
+              reset_mask = None):
 
     """
     Perform forward pass through the sequence model.
@@ -576,21 +635,14 @@ class SequenceModel(torch.nn.Module):
       output_input_idx (list, optional): List of indices for output input.
       input_output_idx (list, optional): List of indices for input output.
       encoder_output (torch.Tensor, optional): Encoder output data.
+      reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len) marking the steps where a packed record begins.
+                                           Recurrent bases reset their hidden states before these steps.
 
     Returns:
       torch.Tensor: Processed output data.
       list: List of updated hidden states.
     """
 
-    self.constrain()
-
-    # Initialize lists to store layer outputs
-    self.base_layer_output = [[] for _ in range(self.num_inputs)]
-    self.hidden_layer_output = [[] for _ in range(self.num_inputs)]
-    self.interaction_layer_output = []
-    self.modulation_layer_output = []
-    self.output_layer_output = [[] for _ in range(self.num_outputs)]
-
     # Convert inputs to the correct device
     input = input.to(device=self.device, dtype=self.dtype)
     steps = steps.to(device=self.device, dtype=torch.long) if steps is not None else None
@@ -625,7 +677,8 @@ class SequenceModel(torch.nn.Module):
       output[:, :1], hiddens = self.process(input = input[:, :1],
                                             steps = steps[:, :1] if steps is not None else None,
                                             hiddens = hiddens,
-                                            encoder_output = encoder_output)
+                                            encoder_output = encoder_output,
+                                            reset_mask = reset_mask[:, :1] if reset_mask is not None else None)
 
       for n in range(1, input_len):
 
@@ -636,7 +689,8 @@ class SequenceModel(torch.nn.Module):
         output[:, n:(n+1)], hiddens = self.process(input = input_n.unsqueeze(1),
                                                    steps = steps[:, n:(n+1)] if steps is not None else None,
                                                    hiddens = hiddens,
-                                                   encoder_output = encoder_output)
+                                                   encoder_output = encoder_output,
+                                                   reset_mask = reset_mask[:, n:(n+1)] if reset_mask is not None else None)
 
     else:
       # input = torch.nn.functional.pad(input,
@@ -647,7 +701,8 @@ class SequenceModel(torch.nn.Module):
                                      input_window_idx = input_window_idx,
                                      steps = steps[:, unique_input_window_idx] if steps is not None else None,
                                      hiddens = hiddens,
-                                     encoder_output = encoder_output)
+                                     encoder_output = encoder_output,
+                                     reset_mask = reset_mask)
 
     # Only keep the outputs for the maximum output sequence length
     output = output[:, -self.max_output_len:]
@@ -656,23 +711,22 @@ class SequenceModel(torch.nn.Module):
     if output_mask is not None:
       output = output * output_mask
 
-    # Concatenate stored layer outputs if required
-    if self.store_layer_outputs:
-      for i in range(self.num_inputs):
-        if len(self.base_layer_output[i]) > 0:
-          self.base_layer_output[i] = torch.cat(self.base_layer_output[i], 1)
-        if len(self.hidden_layer_output[i]) > 0:
-          self.hidden_layer_output[i] = torch.cat(self.hidden_layer_output[i], 1)
-      if len(self.interaction_layer_output) > 0:
-        self.interaction_layer_output = torch.cat(self.interaction_layer_output, 1)
-      if len(self.modulation_layer_output) > 0:
-        self.modulation_layer_output = torch.cat(self.modulation_layer_output, 1)
-      for i in range(self.num_outputs):
-        if len(self.output_layer_output[i]) > 0:
-          self.output_layer_output[i] = torch.cat(self.output_layer_output[i], 1)
-
     return output, hiddens
 
+  def quantize(self, dtype = torch.qint8):
+    """
+    Returns a copy of the trained model for CPU inference, with dynamic quantization of the linear layers (hidden, interaction,
+    output, unfused attention projections, and transformer feedforward layers) and GRU/LSTM bases. LRU bases and the
+    modulation layer stay in float. See `ts_src.quantize`.
+
+    Args:
+        dtype (torch.dtype): torch.qint8, or torch.float16 for float16 weights.
+
+    Returns:
+        SequenceModel: The quantized copy, in eval mode.
+    """
+    return quantize(self, dtype = dtype)
+
   def constrain(self):
 
     """
@@ -680,6 +734,9 @@ class SequenceModel(torch.nn.Module):
 
     Constraints are applied to different components of the model, such as
     the sequence base, hidden layers, interaction layer, and output layers.
+
+    Constraints are not applied in `forward`. SequenceModule calls this method
+    after optimizer steps; when training without it, call it after `optimizer.step()`.
     """
 
     # Apply constraints to sequence base and hidden layers for each input
@@ -866,7 +923,7 @@ class SequenceModel(torch.nn.Module):
 
   def generate_temporal_modulations(self, steps):
 
-    temporal_modulations = (self.modulation_layer.F[steps] @ self.modulation_layer.coef.t()).detach()
+    temporal_modulations = (self.modulation_layer.get_functions(steps) @ self.modulation_layer.coef.t()).detach()
 
     self.temporal_modulations = temporal_modulations
 
@@ -925,11 +982,7 @@ class SequenceModel(torch.nn.Module):
 
     # Apply output transforms if provided
     if output_transforms:
-        for sampled_idx in range(num_samples):
-            j = 0
-            for i in range(self.num_outputs):
-                prediction[sampled_idx, :, j:(j + self.output_size[i])] = output_transforms[i].inverse_transform(prediction[sampled_idx, :, j:(j + self.output_size[i])])
-                j += self.output_size[i]
+        prediction = TransformBank(output_transforms, sizes = self.output_size).inverse_transform(prediction)
 
     return prediction, prediction_time
 
@@ -941,7 +994,8 @@ class SequenceModel(torch.nn.Module):
               input_window_idx=None, output_window_idx=None,
               input_mask=None, output_mask=None,
               output_input_idx=[], input_output_idx=[],
-              output_transforms=None):
+              output_transforms=None,
+              use_cache=False, cache_len=None):
     """
     Perform forecasting using the model.
 
@@ -958,6 +1012,12 @@ class SequenceModel(torch.nn.Module):
         output_input_idx (list, optional): Indices for output input. Default is an empty list.
         input_output_idx (list, optional): Indices for input output. Default is an empty list.
         output_transforms (list of Transform objects, optional): Output transforms for forecasting. Default is None.
+        use_cache (bool, optional): Whether to decode incrementally (see `init_cache`). The first window primes the model, then
+                                    each step only encodes the new steps: recurrent bases continue from their hidden states,
+                                    transformer bases, which need causal self-attention, continue their positions, and CNN
+                                    bases, which need causal padding, continue from their cached receptive fields.
+                                    Default is False.
+        cache_len (int, optional): Number of steps attended to by each step when `use_cache`. Default is the input length.
 
     Returns:
         forecast (Tensor): Forecast results tensor.
@@ -987,55 +1047,55 @@ class SequenceModel(torch.nn.Module):
       else:
         forecast_len = 1
 
-      # Perform initial prediction using the model
-      prediction, hiddens = self.forward(input = input,
-                                          steps = steps,
-                                          hiddens = hiddens,
-                                          input_window_idx = input_window_idx,
-                                          output_window_idx = output_window_idx,
-                                          encoder_output = encoder_output,
-                                          input_output_idx = input_output_idx,
-                                          output_input_idx = output_input_idx)
-
-      # Concatenate initial prediction to forecast
-      forecast = torch.cat((forecast, prediction[:, -forecast_len:]), 1)
-      if steps is not None:
-          forecast_steps = torch.cat((forecast_steps, steps[:, -forecast_len:]), 1)
-          steps += forecast_len
-
-      # Continue forecasting iteratively
-      while forecast.shape[1] < (forecast_len + num_forecast_steps):
-
-          # Prepare input for next forecasting step
-          input_ar = torch.zeros((num_samples, forecast_len, input_size)).to(input)
-          if (len(input_output_idx) > 0) & (len(output_input_idx) > 0):
-              input_ar[..., output_input_idx] = forecast[:, -forecast_len:, input_output_idx]
-
-          # Concatenate input for next forecasting step
-          input = torch.cat((input[:, forecast_len:], input_ar), 1)
-
-          # Perform forecasting step using the model
-          prediction, hiddens = self(input=input,
-                                     steps=steps,
-                                     hiddens=hiddens,
-                                     encoder_output=encoder_output,
-                                     input_output_idx=input_output_idx,
-                                     output_input_idx=output_input_idx)
-
-          # Concatenate current prediction to forecast
-          forecast = torch.cat((forecast, prediction[:, -forecast_len:]), 1)
-          if steps is not None:
-              forecast_steps = torch.cat((forecast_steps, steps[:, -forecast_len:]), 1)
-              steps += forecast_len
+      if use_cache: self.init_cache(cache_len)
+
+      try:
+        # Perform initial prediction using the model
+        prediction, hiddens = self.forward(input = input,
+                                            steps = steps,
+                                            hiddens = hiddens,
+                                            input_window_idx = input_window_idx,
+                                            output_window_idx = output_window_idx,
+                                            encoder_output = encoder_output,
+                                            input_output_idx = input_output_idx,
+                                            output_input_idx = output_input_idx)
+
+        # Concatenate initial prediction to forecast
+        forecast = torch.cat((forecast, prediction[:, -forecast_len:]), 1)
+        if steps is not None:
+            forecast_steps = torch.cat((forecast_steps, steps[:, -forecast_len:]), 1)
+            steps += forecast_len
+
+        # Continue forecasting iteratively
+        while forecast.shape[1] < (forecast_len + num_forecast_steps):
+
+            # Prepare input for next forecasting step
+            input_ar = torch.zeros((num_samples, forecast_len, input_size)).to(input)
+            if (len(input_output_idx) > 0) & (len(output_input_idx) > 0):
+                input_ar[..., output_input_idx] = forecast[:, -forecast_len:, input_output_idx]
+
+            # Concatenate input for next forecasting step
+            input = torch.cat((input[:, forecast_len:], input_ar), 1)
+
+            # Perform forecasting step using the model. With the cache, only the new steps are encoded.
+            prediction, hiddens = self(input=input_ar if use_cache else input,
+                                       steps=steps[:, -forecast_len:] if use_cache and (steps is not None) else steps,
+                                       hiddens=hiddens,
+                                       encoder_output=encoder_output,
+                                       input_output_idx=input_output_idx,
+                                       output_input_idx=output_input_idx)
+
+            # Concatenate current prediction to forecast
+            forecast = torch.cat((forecast, prediction[:, -forecast_len:]), 1)
+            if steps is not None:
+                forecast_steps = torch.cat((forecast_steps, steps[:, -forecast_len:]), 1)
+                steps += forecast_len
+      finally:
+        if use_cache: self.clear_cache()
 
     # Apply output transforms if provided
     if output_transforms:
-        for sampled_idx in range(num_samples):
-            j = 0
-            for i in range(self.num_outputs):
-                forecast[sampled_idx, :, j:(j + self.output_size[i])] = output_transforms[i].inverse_transform(
-                    forecast[sampled_idx, :, j:(j + self.output_size[i])])
-                j += self.output_size[i]
+        forecast = TransformBank(output_transforms, sizes = self.output_size).inverse_transform(forecast)
 
     # Extract the forecast for the desired number of forecast steps
     forecast = forecast[:, forecast_len:][:, :num_forecast_steps]
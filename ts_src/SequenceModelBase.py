@@ -32,6 +32,7 @@ class SequenceModelBase(torch.nn.Module):
     relax_train (bool, optional): Whether to train relaxation values for LRU. Default is True.
     relax_minmax (list, optional): Minimum and maximum relaxation values for LRU. Default is [0.1, 0.9].
     num_filterbanks (int, optional): Number of filterbanks for LRU. Default is 1.
+    lru_mode (str, optional): Execution mode of the LRU recurrence, 'loop', 'scan', or 'fft'. Default is 'loop'.
     cnn_kernel_size (tuple, optional): Size of the convolving kernel for CNN. Default is (1,).
     cnn_kernel_stride (tuple, optional): Stride of the convolution for CNN. Default is (1,).
     cnn_padding (tuple, optional): Zero-padding added to both sides of the input for CNN. Default is (0,).
@@ -92,6 +93,7 @@ class SequenceModelBase(torch.nn.Module):
     concat_bias (bool, optional): Whether to include a bias term in the concatenation weight in attention mechanism. Default is False.
     attn_dropout_p (float, optional): Dropout probability for attention mechanism. Default is 0.
     average_attn_weights (bool, optional): Whether to average attention weights. Default is False.
+    fused_attn (bool, optional): Whether 'dot' attention uses the fused path (packed projection and scaled_dot_product_attention). Default is False.
     batch_first (bool, optional): If True, then the input and output tensors are provided as (batch, seq, feature). Default is True.
     device (str, optional): The device to run the model on. Default is 'cpu'.
     dtype (torch.dtype, optional): The desired data type of the model's parameters. Default is torch.float32.
@@ -110,6 +112,7 @@ class SequenceModelBase(torch.nn.Module):
               relax_init=[0.5], relax_train=True, relax_minmax=[0.1, 0.9], num_filterbanks=1,
               lru_feature_associated = False,
               lru_input_block_weight_to_ones = False,
+              lru_mode = 'loop',
               cnn_out_channels = None, 
               cnn_causal_pad = False,
               cnn_kernel_size = [(1,)], cnn_kernel_stride = [(1,)], cnn_padding = [(0,)], cnn_dilation = [(1,)], cnn_groups = [1],
@@ -146,6 +149,7 @@ class SequenceModelBase(torch.nn.Module):
               concat_weight_reg=[0.001, 1], concat_weight_norm=2, concat_bias=False,
               attn_dropout_p=0.,
               average_attn_weights=False,
+              fused_attn=False,
               batch_first=True,
               device='cpu', dtype=torch.float32):
     super(SequenceModelBase, self).__init__()
@@ -191,6 +195,7 @@ class SequenceModelBase(torch.nn.Module):
                       relax_init = self.relax_init, relax_train = self.relax_train, relax_minmax = self.relax_minmax,
                       feature_associated = lru_feature_associated,
                       input_block_weight_to_ones = lru_input_block_weight_to_ones,
+                      mode = lru_mode,
                       device = self.device, dtype = self.dtype)
     elif self.base_type == 'cnn':
       self.base = CNN1D(in_channels = self.input_size, 
@@ -256,6 +261,7 @@ class SequenceModelBase(torch.nn.Module):
                                                                               concat_weight_norm = self.concat_weight_norm,
                                                                               concat_bias = self.concat_bias,
                                                                               average_attn_weights = self.average_attn_weights,
+                                                                              fused_attn = self.fused_attn,
                                                                               dropout_p = self.attn_dropout_p,
                                                                               dropout1_p = self.transformer_dropout1_p,
                                                                               dropout2_p = self.transformer_dropout2_p,
@@ -299,6 +305,7 @@ class SequenceModelBase(torch.nn.Module):
                                                                             concat_weight_norm = self.concat_weight_norm,
                                                                             concat_bias = self.concat_bias,
                                                                             average_attn_weights = self.average_attn_weights,
+                                                                            fused_attn = self.fused_attn,
                                                                             dropout_p = self.attn_dropout_p,
                                                                             dropout1_p = self.transformer_dropout1_p,
                                                                             dropout2_p = self.transformer_dropout2_p,
@@ -344,6 +351,7 @@ class SequenceModelBase(torch.nn.Module):
                                       key_weight_reg = self.key_weight_reg, key_weight_norm = self.key_weight_norm, key_bias = self.key_bias,
                                       value_weight_reg = self.value_weight_reg, value_weight_norm = self.value_weight_norm, value_bias = self.value_bias,
                                       is_causal = self.tgt_is_causal, dropout_p = self.attn_dropout_p,
+                                      fused = self.fused_attn and (self.multihead_attn_type == 'dot'),
                                       device = self.device, dtype = self.dtype)
       
       ecoder_target_size = self.hidden_size * (1 + self.rnn_bidirectional) if self.base_type in ['lstm', 'gru'] else self.num_filterbanks*self.hidden_size
@@ -361,6 +369,9 @@ class SequenceModelBase(torch.nn.Module):
                                         bias = self.decoder_bias,
                                         device = self.device, dtype = self.dtype)
       
+    # Position of the next step during incremental decoding, None otherwise
+    self.cache_offset = None
+
     with torch.no_grad():            
       X = torch.empty((2, self.input_len, input_size)).to(device = self.device,
                                                           dtype = self.dtype)
@@ -392,7 +403,42 @@ class SequenceModelBase(torch.nn.Module):
 
     return hiddens
 
-  def forward(self, input, hiddens=None, encoder_output=None, mask=None):
+  def init_cache(self, cache_len=None):
+    '''
+    Starts incremental decoding. Each later forward pass only takes the new steps. Recurrent bases continue from the hidden
+    states passed in, so the history is not re-run. Causal transformer encoder bases continue their positional encodings
+    from the previous steps, and each self-attention layer attends to its cached keys and values. Causal CNN bases stream,
+    keeping the receptive field of each layer (see `CNN1D.init_cache`).
+
+    Args:
+        cache_len (int, optional): Number of steps attended to by each step of a transformer base. Defaults to input_len.
+    '''
+    if self.base_type in ['lru', 'lstm', 'gru']:
+      if self.rnn_bidirectional:
+        raise ValueError("Incremental decoding is not supported for bidirectional RNNs.")
+    elif (self.base_type == 'transformer') and (self.seq_type == 'encoder'):
+      for layer in self.base[1].layers:
+        layer.self_attn.init_cache(cache_len or self.input_len)
+    elif self.base_type == 'cnn':
+      self.base.init_cache()
+    else:
+      raise ValueError(f"Incremental decoding is only supported by recurrent, transformer encoder, and CNN bases (base_type = '{self.base_type}', seq_type = '{self.seq_type}').")
+
+    self.cache_offset = 0
+
+  def clear_cache(self):
+    '''
+    Ends incremental decoding and frees the key/value caches and the cached CNN inputs.
+    '''
+    if self.base_type == 'transformer':
+      for layer in self.base[1].layers:
+        layer.self_attn.clear_cache()
+    elif self.base_type == 'cnn':
+      self.base.clear_cache()
+
+    self.cache_offset = None
+
+  def forward(self, input, hiddens=None, encoder_output=None, mask=None, reset_mask=None):
     '''
     Forward pass of the sequence model.
 
@@ -401,6 +447,10 @@ class SequenceModelBase(torch.nn.Module):
         hiddens (list or torch.Tensor, optional): Hidden states of the base model. Default is None.
         encoder_output (torch.Tensor, optional): Output from the encoder block. Default is None.
         mask (torch.Tensor, optional): Mask tensor for attention mechanism. Default is None.
+        reset_mask (torch.Tensor, optional): Boolean tensor of shape (num_samples, input_len) marking the steps where a new record
+                                             begins (see packed streams in SequenceDataloader). Recurrent bases reset the hidden
+                                             states of a sample to zero before these steps. Not supported by 'cnn' and
+                                             'transformer' bases, which mix steps across record boundaries. Default is None.
 
     Returns:
         output (torch.Tensor): Output tensor of shape (num_samples, input_len, output_size).
@@ -408,13 +458,21 @@ class SequenceModelBase(torch.nn.Module):
     '''
     num_samples, input_len, input_size = input.shape
 
+    if (reset_mask is not None) and (self.base_type in ['cnn', 'transformer']):
+      raise ValueError("reset_mask is only supported by recurrent ('gru', 'lstm', 'lru') and identity bases.")
+
     if self.encoder_block is not None:
         encoder_output = self.encoder_block(encoder_output)
 
     if self.base_type == 'identity':
         output, hiddens = input, hiddens
     elif self.base_type in ['lru', 'lstm', 'gru']:        
-        output, hiddens = self.base(input, hiddens)
+        if reset_mask is None:
+            output, hiddens = self.base(input, hiddens)
+        elif self.base_type == 'lru':
+            output, hiddens = self.base(input, hiddens, reset_mask = reset_mask)
+        else:
+            output, hiddens = self.reset_rnn(input, hiddens, reset_mask)
 
         output = output.reshape(num_samples, input_len, -1)
 
@@ -434,7 +492,11 @@ class SequenceModelBase(torch.nn.Module):
     elif self.base_type == 'cnn':
         output = self.base(input)
     elif self.base_type == 'transformer':
-        input_embedding_pe = self.base[0](input)
+        if self.cache_offset is None:
+            input_embedding_pe = self.base[0](input)
+        else:
+            input_embedding_pe = self.base[0][1](self.base[0][0](input), offset = self.cache_offset)
+            self.cache_offset += input_len
 
         output = self.base[1](tgt=input_embedding_pe, memory=encoder_output) if self.seq_type == 'decoder' \
             else self.base[1](src=input_embedding_pe, mask=mask)
@@ -443,6 +505,39 @@ class SequenceModelBase(torch.nn.Module):
       
     return output, hiddens
 
+  def reset_rnn(self, input, hiddens, reset_mask):
+    '''
+    Runs the GRU/LSTM base over the segments between reset steps, zeroing the hidden states of the samples that reset.
+
+    Args:
+        input (torch.Tensor): Input tensor of shape (num_samples, input_len, input_size).
+        hiddens (torch.Tensor or tuple, optional): Hidden states of the base model.
+        reset_mask (torch.Tensor): Boolean tensor of shape (num_samples, input_len).
+
+    Returns:
+        output (torch.Tensor): Output tensor of shape (num_samples, input_len, hidden_size).
+        hiddens (torch.Tensor or tuple): Updated hidden states of the base model.
+    '''
+    if self.rnn_bidirectional:
+        raise ValueError(f"Hidden state resets are not supported for bidirectional RNNs.")
+
+    num_samples, input_len, input_size = input.shape
+
+    # Steps where any sample resets split the sequence into segments
+    reset_steps = reset_mask.any(0).nonzero().flatten().tolist()
+    bounds = [0] + [n for n in reset_steps if n > 0] + [input_len]
+
+    output = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if hiddens is not None:
+            keep = (~reset_mask[:, start])[None, :, None]
+            hiddens = tuple(s * keep.to(s) for s in hiddens) if self.base_type == 'lstm' else hiddens * keep.to(hiddens)
+
+        output_n, hiddens = self.base(input[:, start:end], hiddens)
+        output.append(output_n)
+
+    return torch.cat(output, 1), hiddens
+
   def constrain(self):
     '''
     Apply constraints to the model.
@@ -5,12 +5,17 @@ import numpy as np
 import pandas as pd
 
 import time as run_time
+import io
+import os
+import tempfile
 
 from tqdm.auto import tqdm
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
 from ts_src.Criterion import Criterion
+from ts_src.TransformBank import TransformBank
+from ts_src.OnnxSequenceModel import OnnxSequenceModel
 
 import pytorch_lightning as pl
 
@@ -19,11 +24,13 @@ class SequenceModule(pl.LightningModule):
                model,
                opt, loss_fn, metric_fn=None,
                constrain=False, penalize=False,
+               constrain_every_n_steps=1,
                shuffle_train=False,
                teach=False,
                stateful = False,
                penalty_scale = [1],
                track_performance=False, track_params=False,
+               precision='fp32',
                model_dir=None):
       """
       A PyTorch Lightning module for sequence forecasting.
@@ -33,11 +40,15 @@ class SequenceModule(pl.LightningModule):
           opt (torch.optim.Optimizer): The optimizer to use during training.
           loss_fn (callable): The loss function to calculate loss.
           metric_fn (callable, optional): The metric function to track performance. Default is None.
-          constrain (bool, optional): Whether to constrain the model's parameters. Default is False.
+          constrain (bool, optional): Kept for compatibility. The constraints selected by the model's `*_constrain` flags always run
+                                      after optimizer steps. Default is False.
           penalize (bool, optional): Whether to apply penalty to the model's parameters. Default is False.
+          constrain_every_n_steps (int, optional): Number of optimizer steps between applications of the model constraints. Default is 1.
           teach (bool, optional): Whether to use teacher forcing during training. Default is False.
           track_performance (bool, optional): Whether to track performance metrics. Default is False.
           track_params (bool, optional): Whether to track model parameters. Default is False.
+          precision (str, optional): Precision of the forward passes. 'fp32', or 'bf16' for bfloat16 autocast (see `autocast`)
+                                     with float32 weights, optimizer states, losses, and hidden states. Default is 'fp32'.
           model_dir (str, optional): Directory to save model checkpoints. Default is None.
       """
       super().__init__()
@@ -59,6 +70,13 @@ class SequenceModule(pl.LightningModule):
 
       self.constrain, self.penalize = constrain, penalize
 
+      if constrain_every_n_steps < 1:
+        raise ValueError(f"constrain_every_n_steps ({constrain_every_n_steps}) must be at least 1.")
+
+      self.constrain_every_n_steps = constrain_every_n_steps
+      self.num_optimizer_steps = 0
+      self.constraint_hooks = []
+
       self.teach = teach
       self.stateful = stateful
       self.hiddens = None
@@ -74,8 +92,15 @@ class SequenceModule(pl.LightningModule):
 
       self.track_performance, self.track_params = track_performance, track_params
 
+      if precision not in ['fp32', 'bf16']:
+        raise ValueError(f"precision ({precision}) must be 'fp32' or 'bf16'.")
+
+      self.precision = precision
+
       self.model_dir = model_dir
 
+      self.onnx_model = None
+
   def forward(self,
                 input,
                 hiddens=None,
@@ -84,7 +109,8 @@ class SequenceModule(pl.LightningModule):
                 input_window_idx=None, output_window_idx=None,
                 output_mask=None,
                 output_input_idx=None, input_output_idx=None,
-                encoder_output=None):
+                encoder_output=None,
+                reset_mask=None):
       """
       Forward pass through the model.
 
@@ -99,25 +125,83 @@ class SequenceModule(pl.LightningModule):
           output_input_idx (torch.Tensor, optional): Output input indices. Default is None.
           input_output_idx (torch.Tensor, optional): Input output indices. Default is None.
           encoder_output (torch.Tensor, optional): Output from the encoder. Default is None.
+          reset_mask (torch.Tensor, optional): Steps where recurrent bases reset their hidden states. Default is None.
 
       Returns:
           output (torch.Tensor): Output tensor from the model.
           hiddens (torch.Tensor): Updated hidden state of the model.
       """
       # Forward pass through the model
-      output, hiddens = self.model.forward(input=input,
-                                           steps=steps,
-                                           hiddens=hiddens,
-                                           target=target,
-                                           input_window_idx=input_window_idx,
-                                           output_window_idx=output_window_idx,
-                                           output_mask=output_mask,
-                                           output_input_idx=output_input_idx,
-                                           input_output_idx=input_output_idx,
-                                           encoder_output=encoder_output)
+      with self.autocast():
+        output, hiddens = self.model.forward(input=input,
+                                             steps=steps,
+                                             hiddens=hiddens,
+                                             target=target,
+                                             input_window_idx=input_window_idx,
+                                             output_window_idx=output_window_idx,
+                                             output_mask=output_mask,
+                                             output_input_idx=output_input_idx,
+                                             input_output_idx=input_output_idx,
+                                             encoder_output=encoder_output,
+                                             reset_mask=reset_mask)
+
+      # Outputs and hidden states leave the forward pass in the model's precision
+      if self.precision != 'fp32':
+        output, hiddens = output.to(self.model.dtype), self.to_dtype(hiddens, self.model.dtype)
 
       return output, hiddens
 
+  @staticmethod
+  def to_dtype(hiddens, dtype):
+    """
+    Casts the tensors of nested lists and tuples of hidden states to `dtype`.
+    """
+    if isinstance(hiddens, torch.Tensor):
+      return hiddens.to(dtype)
+    elif isinstance(hiddens, (list, tuple)):
+      return type(hiddens)(SequenceModule.to_dtype(hiddens_i, dtype) for hiddens_i in hiddens)
+    return hiddens
+
+  def autocast(self):
+    """
+    Returns the autocast context of the forward passes, enabled for 'bf16' precision.
+
+    Under bfloat16 autocast, matmuls, convolutions, and linear layers run in bfloat16, while the parameters (and so the
+    gradients and optimizer states) stay in float32. Losses (`Criterion`) and LRU recurrences accumulate in float32.
+    """
+    return torch.autocast(device_type='cuda' if self.accelerator == 'gpu' else 'cpu', dtype=torch.bfloat16,
+                          enabled=self.precision == 'bf16')
+
+  def on_after_batch_transfer(self, batch, dataloader_idx):
+    """
+    Augments training batches and generates the datamodule's covariates for each batch once it is on the device.
+
+    Args:
+        batch (tuple): A tuple containing input_batch, target_batch, steps_batch, batch_size, and id.
+        dataloader_idx (int): The index of the dataloader.
+
+    Returns:
+        tuple: The batch with the covariates appended to the input.
+    """
+    datamodule = self.trainer.datamodule
+
+    # Augment the stored inputs and targets before the covariates are appended
+    if self.trainer.training and (getattr(datamodule, 'augmentation', None) is not None):
+      input_batch, target_batch, steps_batch, batch_size, id = batch
+      input_batch, target_batch = datamodule.augmentation(input_batch, target_batch, batch_size,
+                                                          input_mask = datamodule.train_input_mask,
+                                                          output_mask = datamodule.train_output_mask,
+                                                          output_input_idx = datamodule.output_input_idx,
+                                                          input_output_idx = datamodule.input_output_idx,
+                                                          output_offset = torch.cat(datamodule.train_output_window_idx).min().item())
+      batch = (input_batch, target_batch, steps_batch, batch_size, id)
+
+    if len(getattr(datamodule, 'covariates', {})) > 0:
+      input_batch, target_batch, steps_batch, batch_size, id = batch
+      batch = (datamodule.generate_covariates(input_batch, steps_batch, id), target_batch, steps_batch, batch_size, id)
+
+    return batch
+
   ## Configure optimizers
   def configure_optimizers(self):
     """
@@ -126,7 +210,21 @@ class SequenceModule(pl.LightningModule):
     Returns:
         optimizer (torch.optim.Optimizer): Optimizer for updating model parameters.
     """
+    # Constraints run after optimizer steps instead of in every forward pass
+    for hook in self.constraint_hooks: hook.remove()
+    self.constraint_hooks = [opt.register_step_post_hook(self.constraint_hook)
+                             for opt in (self.opt if isinstance(self.opt, list) else [self.opt])]
+
     return self.opt
+
+  def constraint_hook(self, optimizer, args, kwargs):
+    """
+    Optimizer step post-hook that applies the model constraints every `constrain_every_n_steps` steps.
+    """
+    self.num_optimizer_steps += 1
+    if self.num_optimizer_steps % self.constrain_every_n_steps == 0:
+      with torch.no_grad():
+        self.model.constrain()
   ##
 
   ## train model
@@ -177,6 +275,9 @@ class SequenceModule(pl.LightningModule):
     target_batch = target_batch[:batch_size]
     steps_batch = steps_batch[:batch_size]
 
+    # Reset hidden states where a packed record begins
+    reset_mask = self.trainer.datamodule.generate_reset_mask(steps_batch, input_batch.shape[1])
+
     # Perform forward pass to compute gradients
     prediction_batch, self.hiddens = self.forward(input=input_batch,
                                                   steps=steps_batch,
@@ -186,7 +287,8 @@ class SequenceModule(pl.LightningModule):
                                                   output_window_idx=self.trainer.datamodule.train_output_window_idx,
                                                   output_input_idx=self.trainer.datamodule.output_input_idx,
                                                   input_output_idx=self.trainer.datamodule.input_output_idx,
-                                                  output_mask=self.trainer.datamodule.train_output_mask)
+                                                  output_mask=self.trainer.datamodule.train_output_mask,
+                                                  reset_mask=reset_mask)
 
     # Add penalty loss if desired
     penalty = 0
@@ -272,11 +374,6 @@ class SequenceModule(pl.LightningModule):
         batch_idx: Index of the current batch.
     """
 
-    # Constrain model if desired
-    if self.constrain:
-      with torch.no_grad():
-        self.model.constrain()
-
     # Get the loss and metric values of the current batch
     train_step_loss = outputs['loss'].detach()
     train_step_metric = outputs['metric'].detach() if outputs['metric'] is not None else None
@@ -856,8 +953,12 @@ class SequenceModule(pl.LightningModule):
         print("Unshuffling training data")
         self.trainer.datamodule.shuffle_train = False
         self.trainer.datamodule.predicting = False
-        self.trainer.datamodule.train_dataloader()
+        self.trainer.datamodule.train_dataloader(pack = False)
         print("Unshuffling complete")
+      elif self.trainer.datamodule.pack_len is not None:
+        # Predictions are generated from the unpacked records
+        self.trainer.datamodule.predicting = False
+        self.trainer.datamodule.train_dataloader(pack = False)
 
       self.trainer.predict(self, self.trainer.datamodule.train_dl.dl)
       self.trainer.datamodule.shuffle_train = shuffle_train_original
@@ -1623,7 +1724,34 @@ class SequenceModule(pl.LightningModule):
                id = None,
                hiddens = None,
                invert = True,
-               eval = False):
+               eval = False,
+               use_cache = False,
+               backend = 'torch'):
+    """
+    Forecasts a record autoregressively, one output window at a time.
+
+    Args:
+        num_forecast_steps (int, optional): Number of steps to forecast. Defaults to the output length.
+        id (optional): ID of the record. Defaults to the first record.
+        hiddens (list, optional): Initial hidden states.
+        invert (bool, optional): Whether to invert the output transforms. Default is True.
+        eval (bool, optional): Whether to forecast every window of the record and return the targets. Default is False.
+        use_cache (bool, optional): Whether to decode incrementally (see `SequenceModel.init_cache`). The first window primes
+                                    the model, then only the new steps are encoded: recurrent bases continue from their
+                                    hidden states, transformer bases, which need causal self-attention, continue their
+                                    positions, and causal CNN bases continue from their cached receptive fields. Default is
+                                    False.
+        backend (str, optional): 'torch' runs the model eagerly; 'onnx' runs its ONNX export (see `export_onnx`, which is
+                                 called if the model has not been exported) with onnxruntime on the CPU. Default is 'torch'.
+    """
+
+    if backend not in ['torch', 'onnx']:
+      raise ValueError(f"backend ({backend}) must be 'torch' or 'onnx'.")
+    if (backend == 'onnx') and use_cache:
+      raise ValueError("The 'onnx' backend runs whole input windows and does not support `use_cache`.")
+
+    if (backend == 'onnx') and (self.onnx_model is None):
+      self.export_onnx()
 
     data, transforms = self.trainer.datamodule.data, self.trainer.datamodule.transforms
     if not isinstance(data, list):
@@ -1719,9 +1847,11 @@ class SequenceModule(pl.LightningModule):
 
     else:
 
-      input = torch.cat([data[name] for name in input_names], -1)[-total_input_len:].reshape(1, total_input_len, total_input_size)
+      stored_input_names = self.trainer.datamodule.stored_input_names
+      input = torch.cat([data[name] for name in stored_input_names], -1)[-total_input_len:].reshape(1, total_input_len, -1)
       steps = data['step'][-total_input_len:].reshape(1, total_input_len)
       steps  = torch.cat((steps, steps.max()+torch.arange(1,total_window_size-total_input_len+1).reshape(1,-1).to(steps)), 1)
+      ids = [id]
       num_samples = 1
 
     num_samples = input.shape[0]
@@ -1734,34 +1864,61 @@ class SequenceModule(pl.LightningModule):
       forecast_steps = torch.empty((num_samples, 0)).to(device = self.model.device,
                                                         dtype = torch.long)
 
-      # Generate forecast steps
-      while forecast.shape[1] < num_forecast_steps: # (total_output_len + num_forecast_steps):
-        # Generate prediction for the next forecast step
-        prediction, hiddens = self.forward(input = input,
-                                           steps = steps,
-                                           hiddens = hiddens,
-                                           input_window_idx = input_window_idx,
-                                           output_window_idx = output_window_idx,
-                                           output_mask = output_mask,
-                                           output_input_idx = output_input_idx,
-                                           input_output_idx = input_output_idx)
-
-        # Create input for the next forecast step
-        input_ = torch.zeros((num_samples, prediction.shape[1], total_input_size)).to(input)
-        if len(output_input_idx) > 0:
-          input_[:, :, output_input_idx] = prediction[:, -prediction.shape[1]:, input_output_idx]
-
-        # Concatenate input for the next forecast step
-        input = torch.cat((input[:, prediction.shape[1]:], input_), 1)
-
-        # Append prediction to forecast
-        forecast = torch.cat((forecast, prediction), 1)
-        if steps is not None:
-          forecast_steps = torch.cat((forecast_steps, steps[:, -prediction.shape[1]:]), 1)
-          steps += prediction.shape[1]
-
-      # Extract the relevant portion of the forecast
-      forecast, forecast_steps = forecast[:, -num_forecast_steps:], forecast_steps[:, -num_forecast_steps:]
+      if use_cache: self.model.init_cache()
+
+      try:
+        # Generate forecast steps
+        num_new_steps = None
+        while forecast.shape[1] < num_forecast_steps: # (total_output_len + num_forecast_steps):
+          # Generate covariates for the current window, which extends past the end of the data
+          if len(self.trainer.datamodule.covariates) > 0:
+            input = self.trainer.datamodule.generate_covariates(input, steps, ids)
+
+          # Generate prediction for the next forecast step
+          if backend == 'onnx':
+            prediction, hiddens = self.onnx_model(input, hiddens)
+            prediction = prediction.to(device = self.model.device, dtype = self.model.dtype)
+          elif use_cache and (num_new_steps is not None):
+            # Only the steps appended to the window of each input are encoded. The windows of inputs can end at different steps
+            prediction, hiddens = self.forward(input = input,
+                                               steps = steps,
+                                               hiddens = hiddens,
+                                               input_window_idx = [idx[-num_new_steps:] for idx in input_window_idx],
+                                               output_mask = output_mask,
+                                               output_input_idx = output_input_idx,
+                                               input_output_idx = input_output_idx)
+          else:
+            prediction, hiddens = self.forward(input = input,
+                                               steps = steps,
+                                               hiddens = hiddens,
+                                               input_window_idx = input_window_idx,
+                                               output_window_idx = output_window_idx,
+                                               output_mask = output_mask,
+                                               output_input_idx = output_input_idx,
+                                               input_output_idx = input_output_idx)
+          num_new_steps = prediction.shape[1]
+
+          # Create input for the next forecast step
+          input_ = torch.zeros((num_samples, prediction.shape[1], total_input_size)).to(input)
+          if len(output_input_idx) > 0:
+            input_[:, :, output_input_idx] = prediction[:, -prediction.shape[1]:, input_output_idx]
+
+          # Concatenate input for the next forecast step
+          input = torch.cat((input[:, prediction.shape[1]:], input_), 1)
+
+          # Append prediction to forecast
+          forecast = torch.cat((forecast, prediction), 1)
+          if steps is not None:
+            forecast_steps = torch.cat((forecast_steps, steps[:, -prediction.shape[1]:]), 1)
+            steps += prediction.shape[1]
+      finally:
+        if use_cache: self.model.clear_cache()
+
+      # Extract the relevant portion of the forecast. Past the end of the data, the forecast starts right after it
+      if eval:
+        forecast, forecast_steps = forecast[:, -num_forecast_steps:], forecast_steps[:, -num_forecast_steps:]
+      else:
+        forecast, forecast_steps = forecast[:, :num_forecast_steps], forecast_steps[:, :num_forecast_steps]
 
     forecast_target = None
 
@@ -1793,6 +1950,8 @@ class SequenceModule(pl.LightningModule):
 
     else:
 
+      start_step = data['step'][0].item()
+
       start_time = data[time_name].max() + self.trainer.datamodule.dt
 
       forecast_time = pd.Series([start_time + n * self.trainer.datamodule.dt for n in range(num_forecast_steps)])
@@ -1803,19 +1962,28 @@ class SequenceModule(pl.LightningModule):
     inverted = False
     if invert:
       inverted = True
-      j = 0
-      for i, name in enumerate(output_names):
-        for sample_idx in range(forecast.shape[0]):
-          if output_feature_names is not None:
-            f = 0
-            for k, feature_name in enumerate(output_feature_names):
-                if forecast_target is not None:
-                  forecast_target[sample_idx, :, f:(f+output_feature_size[k])] = transforms[feature_name].inverse_transform(forecast_target[sample_idx, :, f:(f+output_feature_size[k])])
-                forecast[sample_idx, :, f:(f+output_feature_size[k])] = transforms[feature_name].inverse_transform(forecast[sample_idx, :, f:(f+output_feature_size[k])])
-          else:
-            if forecast_target is not None:
-              forecast_target[sample_idx, :, j:(j+self.model.output_size[i])] = transforms[name].inverse_transform(forecast_target[sample_idx, :, j:(j+self.model.output_size[i])])
-            forecast[sample_idx, :, j:(j+self.model.output_size[i])] = transforms[name].inverse_transform(forecast[sample_idx, :, j:(j+self.model.output_size[i])])
+
+      # Invert all samples and features at once
+      if output_feature_names is not None:
+        bank = TransformBank([transforms[feature_name] for feature_name in output_feature_names], sizes = output_feature_size)
+      else:
+        bank = TransformBank([transforms[name] for name in output_names], sizes = self.model.output_size)
+
+      if bank.max_diff_order > 0:
+        # Each forecast window continues from the levels of its own preceding steps, so it is inverted together with them
+        d = bank.max_diff_order
+        levels = torch.cat([data[name] for name in (output_feature_names or output_names)], -1)
+        history_steps = forecast_steps[:, :1] - start_step + torch.arange(-d, 0).to(forecast_steps)
+        history = levels[history_steps.clamp(min = 0)].to(forecast)
+        X0 = bank.get_anchors(bank.inverse_transform(levels)[history_steps.clamp(min = 0)].to(forecast))
+
+        if forecast_target is not None:
+          forecast_target = bank.inverse_transform(torch.cat((history, forecast_target), 1), X0)[:, d:]
+        forecast = bank.inverse_transform(torch.cat((history, forecast), 1), X0)[:, d:]
+      else:
+        if forecast_target is not None:
+          forecast_target = bank.inverse_transform(forecast_target)
+        forecast = bank.inverse_transform(forecast)
 
     if not eval:
       forecast, forecast_time = forecast[0], forecast_time
@@ -1913,7 +2081,8 @@ class SequenceModule(pl.LightningModule):
                num_forecast_steps = None,
                ids = None,
                stride = 1,
-               hiddens = None, invert = True):
+               hiddens = None, invert = True,
+               backend = 'torch'):
 
     """
     Backtest the model's performance.
@@ -1924,6 +2093,7 @@ class SequenceModule(pl.LightningModule):
       stride (int): Step size for sampling the input data.
       hiddens (list or None): List of hidden states.
       invert (bool): Whether to invert the transformation during backtesting.
+      backend (str): 'torch' or 'onnx'. See `forecast`.
 
     Returns:
       None
@@ -1965,7 +2135,8 @@ class SequenceModule(pl.LightningModule):
                                                                         id = id,
                                                                         hiddens = hiddens_id,
                                                                         invert = invert,
-                                                                        eval = True)
+                                                                        eval = True,
+                                                                        backend = backend)
 
       forecast_id = forecast_id[::-stride][::-1]
       forecast_time_id = forecast_time_id[::-stride][::-1]
@@ -2094,6 +2265,106 @@ class SequenceModule(pl.LightningModule):
     # return fig
   ##
 
+  ##
+  def export_onnx(self, path = None, num_threads = None, opset_version = 17):
+    """
+    Exports the forward pass of the trained model to ONNX for the 'onnx' forecast backend (see `OnnxSequenceModel`).
+
+    The export takes whole input windows of the datamodule's training windows, with the training output mask, and the hidden
+    states of recurrent bases as inputs and outputs. It is a snapshot of the parameters and is dropped by `fit`.
+
+    Args:
+      path (str, optional): Path of the ONNX file. Defaults to 'model.onnx' in `model_dir`, or in a temporary directory.
+      num_threads (int, optional): Number of intra-op threads of the onnxruntime session.
+      opset_version (int): ONNX opset version.
+
+    Returns:
+      OnnxSequenceModel: The exported model, also stored as `onnx_model`.
+    """
+
+    if path is None:
+      path = os.path.join(self.model_dir or tempfile.mkdtemp(), 'model.onnx')
+
+    input_window_idx = self.trainer.datamodule.train_input_window_idx
+
+    self.onnx_model = OnnxSequenceModel.export(self.model, path,
+                                               input_len = len(torch.cat(input_window_idx).unique()),
+                                               input_window_idx = input_window_idx,
+                                               output_mask = self.trainer.datamodule.train_output_mask,
+                                               num_threads = num_threads,
+                                               opset_version = opset_version)
+
+    return self.onnx_model
+  ##
+
+  ##
+  def quantization_report(self, num_forecast_steps = None, id = None, dtype = torch.qint8, reduction = 'mean'):
+    """
+    Compares the model with its dynamically quantized copy (see `SequenceModel.quantize`) on `predict` and `forecast`.
+
+    Both models run the same predictions and forecast; the quantized model runs first, so the prediction and forecast data of
+    the module are those of the float model afterwards.
+
+    Args:
+      num_forecast_steps (int, optional): Number of forecast steps. Defaults to the output length.
+      id (optional): ID of the forecast record. Defaults to the first record.
+      dtype (torch.dtype): torch.qint8, or torch.float16 for float16 weights.
+      reduction (str): Reduction method of the predictions.
+
+    Returns:
+      pd.DataFrame: Rows 'float', 'quantized', and 'delta' (quantized - float) of the predict and forecast latency (s), the
+                    size of the state dict (MB), the global loss and metric of each output and split (averaged over records),
+                    and the largest absolute difference from the float forecast of each output.
+    """
+
+    if self.accelerator == 'gpu':
+      raise ValueError("Dynamic quantization is only supported on CPU.")
+
+    output_names = self.trainer.datamodule.output_names
+
+    model = self.model
+    models = {'quantized': model.quantize(dtype = dtype), 'float': model}
+
+    report, forecasts = {}, {}
+    try:
+      for name, model_ in models.items():
+        self.model = model_
+
+        buffer = io.BytesIO()
+        torch.save(model_.state_dict(), buffer)
+        report[name] = {'size_mb': buffer.getbuffer().nbytes / 1e6}
+
+        start_time = run_time.time()
+        self.predict(reduction = reduction)
+        report[name]['predict_time'] = run_time.time() - start_time
+
+        start_time = run_time.time()
+        self.forecast(num_forecast_steps = num_forecast_steps, id = id)
+        report[name]['forecast_time'] = run_time.time() - start_time
+
+        for split in ['train', 'val', 'test']:
+          prediction_data = getattr(self, f"{split}_prediction_data", None)
+          if prediction_data is None: continue
+          if not isinstance(prediction_data, list): prediction_data = [prediction_data]
+
+          for key in prediction_data[0]:
+            if '_global_' in key:
+              report[name][f"{split}_{key}"] = np.mean([data_[key].mean().item() for data_ in prediction_data])
+
+        forecasts[name] = {output_name: self.forecast_data[output_name] for output_name in output_names}
+    finally:
+      self.model = model
+
+    for name in models:
+      for output_name in output_names:
+        report[name][f"{output_name}_forecast_max_abs_diff"] = (forecasts[name][output_name] - forecasts['float'][output_name]).abs().max().item()
+
+    report = pd.DataFrame.from_dict(report, orient = 'index').loc[['float', 'quantized']]
+    report.loc['delta'] = report.loc['quantized'] - report.loc['float']
+
+    return report
+  ##
+
   ##
   def generate_reduced_output(self, output, output_steps, reduction='mean', transforms=None):
     """
@@ -2154,10 +2425,9 @@ class SequenceModule(pl.LightningModule):
 
     # Optionally invert the reduced output using data scalers
     if transforms is not None:
-      j = 0
-      for i, feature_name in enumerate(self.trainer.datamodule.output_feature_names):
-        output_reduced[:, j:(j + output_feature_size[i])] = transforms[feature_name].inverse_transform(output_reduced[:, j:(j + output_feature_size[i])])
-        j += output_feature_size[i]
+      bank = TransformBank([transforms[feature_name] for feature_name in self.trainer.datamodule.output_feature_names],
+                           sizes = output_feature_size)
+      output_reduced = bank.inverse_transform(output_reduced)
 
       # j = 0
       # for i, name in enumerate(self.trainer.datamodule.output_names):
@@ -2180,9 +2450,17 @@ class SequenceModule(pl.LightningModule):
         max_epochs (int, optional): The maximum number of epochs for training. Defaults to 20.
         callbacks (list, optional): List of callbacks to be used during training. Defaults to [None].
     """
+    # Windows of packed streams cross record boundaries, which only recurrent and identity bases can reset at
+    if (datamodule.pack_len is not None) and (datamodule.pack_mode == 'reset') \
+        and any(base_type in ['cnn', 'transformer'] for base_type in self.model.base_type):
+      raise ValueError(f"pack_mode 'reset' requires recurrent ('gru', 'lstm', 'lru') or identity bases (base_type = {self.model.base_type}). Use pack_mode 'drop' instead.")
+
     # Set predicting flag to False
     datamodule.predicting = False
 
+    # The ONNX export is a snapshot of the parameters
+    self.onnx_model = None
+
     try:
       # Create a Trainer instance and fit the model
       self.trainer = pl.Trainer(max_epochs=max_epochs,
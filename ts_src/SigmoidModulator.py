@@ -37,33 +37,45 @@ class SigmoidModulator(torch.nn.Module):
 
     self.num_modulators = num_sigmoids
     
-    self.functions = self.generate_basis_functions()
-
-  def generate_basis_functions(self):
+  def generate_basis_functions(self, steps=None):
     '''
     Generate the sigmoid basis functions.
 
+    Args:
+        steps (torch.Tensor, optional): Steps at which the functions are evaluated, of any shape. Defaults to the steps of the
+                                        window.
+
     Returns:
-        torch.Tensor: Sigmoid basis functions.
+        torch.Tensor: Sigmoid basis functions, of shape steps.shape + (num_sigmoids,).
 
     '''
-    t = torch.arange(0, self.window_len).view(-1, 1).to(device=self.device, dtype=self.dtype)
+    if steps is None:
+        steps = torch.arange(0, self.window_len)
 
-    scaler = (t.max() - t.min()) if self.scale else 1
+    t = steps.unsqueeze(-1).to(device=self.device, dtype=self.dtype)
 
-    y = 1 / (1 + torch.exp(-self.slope * (t - self.shift * scaler)))
+    scaler = (self.window_len - 1) if self.scale else 1
 
-    self.functions = y
+    y = 1 / (1 + torch.exp(-self.slope * (t - self.shift * scaler)))
 
     return y
 
+  @property
+  def functions(self):
+    '''
+    Sigmoid basis functions over the window, evaluated with the current parameters.
+    '''
+    return self.generate_basis_functions()
+
   def forward(self, X, steps):
     '''
     Apply the sigmoid modulation to the input.
 
+    The functions are evaluated at `steps` only, rather than over the window and then indexed.
+
     Args:
         X (torch.Tensor): Input tensor.
-        steps (int): Index of the modulation step.
+        steps (torch.Tensor): Steps of the input.
 
     Returns:
         torch.Tensor: Modulated tensor.
@@ -71,11 +83,6 @@ class SigmoidModulator(torch.nn.Module):
     '''
     X = X.to(device=self.device, dtype=self.dtype)
 
-    self.functions = self.generate_basis_functions()
-
-    print(X.shape)
-    print(self.functions[steps].shape)
-
-    y = X[:, :, None, :] * self.functions[steps]
+    y = X[:, :, None, :] * self.generate_basis_functions(steps)
 
     return y
@@ -7,6 +7,7 @@ import copy
 
 from ts_src.SequenceDataloader import SequenceDataloader
 from ts_src.FeatureTransform import FeatureTransform
+from ts_src.CovariateGenerator import CovariateGenerator
 
 from datetime import datetime, timedelta
 
@@ -18,6 +19,9 @@ class TimeSeriesDataModule(pl.LightningDataModule):
                step_shifts = None,
                combine_inputs = None, combine_outputs = None,
                transforms = None,
+               covariates = None,
+               join = None,
+               augmentation = None,
                pct_test_val = [0., 0.],
                train_val_test_periods = None,
                batch_size = -1,
@@ -28,6 +32,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
                input_unit = [None], output_unit = [None],
                pad_data = False,
                shuffle_train = False,
+               pack_len = None, pack_mode = 'drop',
                print_summary = False,
                num_workers = 0,
                device = 'cpu', dtype = torch.float32):
@@ -44,6 +49,12 @@ class TimeSeriesDataModule(pl.LightningDataModule):
         combine_inputs (Optional[List[List[str]]]): List of input feature names to be combined.
         combine_outputs (Optional[List[List[str]]]): List of output target names to be combined.
         transforms (Optional[dict]): Dictionary of FeatureTransform instances.
+        covariates (Optional[dict]): Dictionary of covariates generated per batch from the steps, keyed by input name. Values are
+                                     CovariateGenerator instances, covariate type strings (e.g. 'hour_of_day'), or callables of the steps.
+                                     Covariates are appended to the inputs after `input_names` and are never stored.
+        join (Optional[AsOfJoin]): Join applied to the raw data before preprocessing. Aligns several irregular, time-indexed sources
+                                   of each id onto a common time grid.
+        augmentation (Optional[BatchAugmentation]): Augmentation applied to each training batch on the fly. Nothing is precomputed or stored.
         pct_test_val (List[float]): Percentage of data for train, validation, and test sets.
         train_val_test_periods (Optional[List[List[str]]]): List of periods for train, validation, and test sets.
         batch_size (int): Batch size for DataLoader.
@@ -55,6 +66,11 @@ class TimeSeriesDataModule(pl.LightningDataModule):
         time_unit (str): Time unit for period-based slicing.
         pad_data (bool): Whether to pad data with NaN values.
         shuffle_train (bool): Whether to shuffle batches during training.
+        pack_len (Optional[int]): If given and the data holds several records, short training records are concatenated into packed
+                                  streams of at least `pack_len` steps, so each stream is windowed as one dataset.
+        pack_mode (str): How windows crossing a record boundary of a packed stream are handled. 'drop' skips them. 'reset' keeps them
+                         and resets the hidden states of recurrent bases ('gru', 'lstm', 'lru') where the new record begins.
+                         'cnn' and 'transformer' bases mix steps across the boundary, so they require 'drop'.
         print_summary (bool): Whether to print data summary.
         device (str): Device for data storage.
         dtype (torch.dtype): Data type for tensors.
@@ -111,8 +127,70 @@ class TimeSeriesDataModule(pl.LightningDataModule):
     self.max_shift = np.max(shift).item()
     self.start_step = np.max([0, self.max_input_len - self.max_output_len + self.max_shift]).item() # + int(self.has_ar)
 
+    if self.pack_mode not in ['drop', 'reset']:
+      raise ValueError(f"pack_mode ({self.pack_mode}) must be 'drop' or 'reset'.")
+
     self.predicting, self.data_prepared = False, False
 
+    self.covariates = {}
+    for name, covariate in (covariates or {}).items():
+      self.register_covariate(name, covariate)
+
+  def register_covariate(self, name, covariate, size = None):
+    """
+    Registers a covariate that is generated per batch from the steps instead of being stored.
+
+    Args:
+        name (str): Input name of the covariate.
+        covariate (Union[CovariateGenerator, str, callable]): The generator, a covariate type, or a function of the steps.
+        size (Optional[int]): Number of features produced by a callable covariate.
+    """
+
+    if self.data_prepared:
+      raise ValueError(f"Covariate ({name}) must be registered before the data is prepared.")
+
+    if isinstance(covariate, str):
+      covariate = CovariateGenerator(covariate_type = covariate,
+                                     device = self.device, dtype = self.dtype)
+    elif not isinstance(covariate, CovariateGenerator):
+      covariate = CovariateGenerator(fn = covariate, size = size,
+                                     device = self.device, dtype = self.dtype)
+
+    self.covariates[name] = covariate
+
+  def generate_covariates(self, input, steps, id):
+    """
+    Appends the registered covariates to a batch of inputs.
+
+    Args:
+        input (torch.Tensor): Input batch of shape (num_samples, seq_len, input_size). Columns past the stored inputs are replaced.
+        steps (torch.Tensor): Steps of the batch window, of shape (num_samples, window_len).
+        id (list): Ids of the samples. Padded samples without an id receive zeros.
+
+    Returns:
+        torch.Tensor: The input batch with the covariate columns appended.
+    """
+
+    num_samples, seq_len = input.shape[0], input.shape[1]
+
+    input = input[..., :self.stored_input_size]
+    steps = steps[:, :seq_len]
+
+    id = list(id)
+
+    covariates = []
+    for name, covariate in self.covariates.items():
+      covariate_ = torch.zeros((num_samples, seq_len, covariate.size)).to(input)
+      for id_ in np.unique(id):
+        sample_idx = [k for k, value in enumerate(id) if value == id_]
+        covariate_[sample_idx] = covariate(steps[sample_idx],
+                                           origin = self.covariate_origin.get(id_),
+                                           dt = self.covariate_dt.get(id_),
+                                           id = id_).to(input)
+      covariates.append(covariate_)
+
+    return torch.cat([input] + covariates, -1)
+
   def prepare_data(self):
     """
     Preprocesses the input data for training, validation, and testing.
@@ -129,6 +207,10 @@ class TimeSeriesDataModule(pl.LightningDataModule):
         if not isinstance(self.data, list):
             self.data = [self.data]
 
+        # Align the sources of each dataset onto a common time grid
+        if self.join is not None:
+            self.data = self.join(self.data)
+
         # Store the number of datasets
         self.num_datasets = len(self.data)
 
@@ -176,6 +258,9 @@ class TimeSeriesDataModule(pl.LightningDataModule):
         # Store the length of each dataset
         self.data_len = []
 
+        # Store the time of step 0 and the time step of each dataset for the covariates
+        self.covariate_origin, self.covariate_dt = {}, {}
+
         # Loop over each dataset
         for data_idx in range(self.num_datasets):
             # Add an 'id' column to the data if it doesn't exist
@@ -296,6 +381,19 @@ class TimeSeriesDataModule(pl.LightningDataModule):
             # Create a tensor of step indices
             self.data[data_idx]['step'] = torch.arange(self.data_len[data_idx]).to(device=self.device, dtype=torch.long)
 
+            time_idx = self.data[data_idx][self.time_name]
+            self.covariate_origin[self.data[data_idx]['id']] = time_idx.iloc[0]
+            self.covariate_dt[self.data[data_idx]['id']] = self.dt if self.dt is not None else time_idx.diff().median()
+
+        # Append the covariates to the inputs. They are generated per batch and never stored.
+        self.stored_input_names = self.input_names.copy()
+        self.stored_input_size = int(np.sum(self.input_size))
+        if len(self.covariates) > 0:
+          self.input_names = self.input_names + list(self.covariates)
+          self.input_size = self.input_size + [covariate.size for covariate in self.covariates.values()]
+          self.input_len = self.input_len + [self.max_input_len] * len(self.covariates)
+          self.num_inputs = len(self.input_names)
+
         # # Initialize variables for indexing input/output features
         # j = 0
         # output_input_idx = []
@@ -426,7 +524,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
             for name in self.input_output_names:
               val_data[name] = torch.cat((train_data[name][-self.start_step:], val_data[name]), 0)
             val_init_input = val_init_input or []
-            for i, name in enumerate(self.input_names):
+            for i, name in enumerate(self.stored_input_names):
               val_init_input.append(train_data[name][-(self.start_step + 1)])
             val_init_input = torch.cat(val_init_input, -1)
 
@@ -436,7 +534,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
             for name in self.input_output_names:
               test_data[name] = torch.cat((data_[name][-self.start_step:], test_data[name]), 0)
             test_init_input = test_init_input or []
-            for i, name in enumerate(self.input_names):
+            for i, name in enumerate(self.stored_input_names):
               test_init_input.append(data_[name][-(self.start_step + 1)])
             test_init_input = torch.cat(test_init_input, -1)
 
@@ -447,7 +545,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
               val_init_input = []
             if (len(test_data) > 0) and self.has_ar:
               test_init_input = []
-            for i, name in enumerate(self.input_names):
+            for i, name in enumerate(self.stored_input_names):
               if (len(val_data) > 0) and self.has_ar:
                   val_init_input.append(train_data[name][-1])
               if (len(test_data) > 0) and self.has_ar:
@@ -504,6 +602,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
                                             shift = self.shift,
                                             stride = self.stride,
                                             init_input = init_input,
+                                            covariate_size = self.covariate_size,
                                             forecast = True,
                                             print_summary = False,
                                             device = self.device,
@@ -520,10 +619,41 @@ class TimeSeriesDataModule(pl.LightningDataModule):
 
     return self.forecast_dl.dl
 
-  def train_dataloader(self):
+  @property
+  def covariate_size(self):
+    """
+    Sizes of the registered covariates, keyed by input name.
+    """
+    return {name: covariate.size for name, covariate in self.covariates.items()}
+
+  def generate_reset_mask(self, steps, input_len):
+    """
+    Marks the input steps where a packed record begins, i.e. where the steps are not consecutive.
+
+    Args:
+        steps (torch.Tensor): Steps of the batch of shape (num_samples, window_len).
+        input_len (int): Length of the input.
+
+    Returns:
+        torch.Tensor or None: Boolean tensor of shape (num_samples, input_len), or None if no hidden state needs resetting.
+    """
+    if (self.pack_len is None) or (self.pack_mode != 'reset'):
+      return None
+
+    steps = steps[:, :input_len]
+
+    reset_mask = torch.zeros_like(steps, dtype = torch.bool)
+    reset_mask[:, 1:] = steps[:, 1:] != (steps[:, :-1] + 1)
+
+    return reset_mask if reset_mask.any() else None
+
+  def train_dataloader(self, pack = True):
     """
     Creates and returns a dataloader for training data.
 
+    Args:
+        pack (bool): Whether to pack the training records into streams if `pack_len` is given.
+
     Returns:
         DataLoader: Training dataloader.
     """
@@ -544,6 +674,9 @@ class TimeSeriesDataModule(pl.LightningDataModule):
             shift=self.shift,
             stride=self.stride,
             init_input=self.train_init_input,
+            covariate_size=self.covariate_size,
+            pack_len=self.pack_len if pack else None,
+            pack_mode=self.pack_mode,
             shuffle=self.shuffle_train,
             print_summary=self.print_summary,
             device=self.device,
@@ -557,6 +690,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
         self.num_train_batches = self.train_dl.num_batches
         # self.train_batch_shuffle_idx = self.train_dl.batch_shuffle_idx
         self.train_output_mask = self.train_dl.output_mask
+        self.train_input_mask = self.train_dl.input_mask
         self.train_input_window_idx, self.train_output_window_idx = self.train_dl.input_window_idx, self.train_dl.output_window_idx
         self.train_max_input_len, self.train_max_output_len = self.train_dl.max_input_len, self.train_dl.max_output_len
         self.train_unique_output_window_idx = self.train_dl.unique_output_window_idx
@@ -587,6 +721,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
                                         shift=self.shift,
                                         stride=self.stride,
                                         init_input=self.val_init_input,
+                                        covariate_size=self.covariate_size,
                                         print_summary=self.print_summary,
                                         device=self.device,
                                         dtype=self.dtype,
@@ -628,6 +763,7 @@ class TimeSeriesDataModule(pl.LightningDataModule):
                                         shift=self.shift,
                                         stride=self.stride,
                                         init_input=self.test_init_input,
+                                        covariate_size=self.covariate_size,
                                         print_summary=self.print_summary,
                                         device=self.device,
                                         dtype=self.dtype,
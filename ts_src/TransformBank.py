@@ -0,0 +1,183 @@
+import torch
+
+from ts_src.TransformLayer import TransformLayer
+
+class TransformBank():
+  '''
+  Stacks the fitted parameters of several FeatureTransforms, so a (num_samples, seq_len, num_features) tensor is transformed or
+  inverted with single broadcast ops instead of a loop over features and samples.
+
+  The FeatureTransform objects remain the source of the fitted parameters. Each transform is reduced to an affine map
+  (inverse: y = X * scale + shift) followed, for differenced features, by a cumulative sum from the stored anchors.
+  '''
+
+  def __init__(self, transforms, sizes = None):
+    '''
+    Initializes the TransformBank instance.
+
+    Args:
+        transforms (list): Fitted FeatureTransform instances, in the order of their features in the last dimension.
+        sizes (list): Number of features of each transform. Inferred from the fitted parameters if None.
+    '''
+
+    self.transforms = list(transforms)
+    self.sizes = list(sizes) if sizes is not None else [self.get_size(transform) for transform in self.transforms]
+
+    scale, shift, diff_order, X0 = [], [], [], []
+    for transform, size in zip(self.transforms, self.sizes):
+      scale_i, shift_i = self.get_affine(transform)
+
+      scale.append(torch.as_tensor(scale_i, dtype = torch.float64).reshape(-1).expand(size))
+      shift.append(torch.as_tensor(shift_i, dtype = torch.float64).reshape(-1).expand(size))
+      diff_order.append(torch.full((size,), transform.diff_order, dtype = torch.long))
+      X0.append([torch.as_tensor(x0, dtype = torch.float64).reshape(-1).expand(size) for x0 in getattr(transform, 'X0', [])[:transform.diff_order]])
+
+    self.scale, self.shift = torch.cat(scale), torch.cat(shift)
+    self.diff_order = torch.cat(diff_order)
+    self.max_diff_order = self.diff_order.max().item() if len(self.diff_order) > 0 else 0
+
+    # Anchors of each difference level, shape (max_diff_order, num_features)
+    self.X0 = torch.zeros((self.max_diff_order, len(self.diff_order)), dtype = torch.float64)
+    j = 0
+    for X0_i, size in zip(X0, self.sizes):
+      for k, x0 in enumerate(X0_i):
+        self.X0[k, j:(j + size)] = x0
+      j += size
+
+  @staticmethod
+  def get_size(transform):
+    '''
+    Infers the number of features of a fitted transform.
+    '''
+    for name in ['min_', 'mean_', 'median_']:
+      if hasattr(transform, name):
+        return torch.as_tensor(getattr(transform, name)).numel()
+    return 1
+
+  @staticmethod
+  def get_affine(transform):
+    '''
+    Returns the scale and shift of the inverse of a transform, so that its inverse is X * scale + shift.
+    '''
+    if transform.transform_type == 'minmax':
+      scale = (transform.max_ - transform.min_) / (transform.minmax[1] - transform.minmax[0])
+      return scale, transform.min_ - transform.minmax[0] * scale
+    elif transform.transform_type == 'standard':
+      return transform.std_, transform.mean_
+    elif transform.transform_type == 'robust':
+      return transform.iqr_, transform.median_
+    else:
+      return 1., 0.
+
+  def to_module(self, dtype = torch.float32):
+    '''
+    Freezes the stacked parameters into a TransformLayer, so the transforms run inside a model's graph.
+
+    Args:
+        dtype (torch.dtype): The data type of the buffers.
+
+    Returns:
+        TransformLayer: The in-graph transform.
+    '''
+    return TransformLayer(scale = self.scale.to(dtype), shift = self.shift.to(dtype),
+                          diff_order = self.diff_order.clone(), X0 = self.X0.to(dtype))
+
+  def difference(self, X):
+    '''
+    Differences each feature along time by its own order, padding the first steps with zeros.
+    '''
+    y = X.clone()
+    for d in self.diff_order.unique().tolist():
+      if d == 0: continue
+      cols = (self.diff_order == d).nonzero().flatten().to(X.device)
+      y[..., cols] = torch.nn.functional.pad(X[..., cols].diff(d, -2), (0, 0, d, 0), mode = 'constant', value = 0)
+    return y
+
+  def get_anchors(self, X):
+    '''
+    Returns the anchors of a batch of windows: the first step of each difference level of each feature.
+
+    Args:
+        X (torch.Tensor): Windows in the original scale, of shape (num_samples, seq_len, num_features) or (seq_len, num_features).
+                          Only the first `max_diff_order` steps are used.
+
+    Returns:
+        torch.Tensor: Anchors of shape (max_diff_order, num_samples, num_features), or (max_diff_order, num_features).
+    '''
+    ndim = X.ndim
+    if ndim == 2: X = X.unsqueeze(0)
+
+    X0 = torch.zeros((self.max_diff_order, X.shape[0], X.shape[-1])).to(X)
+
+    y = X[:, :self.max_diff_order]
+    for k in range(self.max_diff_order):
+      X0[k] = y[:, 0]
+      y = y.diff(1, 1)
+
+    if ndim == 2: X0 = X0.squeeze(1)
+
+    return X0
+
+  def cumsum(self, X, X0 = None):
+    '''
+    Rebuilds the level of each differenced feature from its anchors, for all samples at once.
+
+    Args:
+        X (torch.Tensor): Differenced data of shape (num_samples, seq_len, num_features).
+        X0 (torch.Tensor): Anchors of shape (max_diff_order, num_features), shared by all samples, or
+                           (max_diff_order, num_samples, num_features). Defaults to the fitted anchors.
+    '''
+    num_samples = X.shape[0]
+    X0 = (self.X0 if X0 is None else X0).to(X)
+    X0 = X0.reshape(self.max_diff_order, -1, X.shape[-1]).expand(-1, num_samples, -1)
+
+    y = X.clone()
+    for d in self.diff_order.unique().tolist():
+      if d == 0: continue
+      cols = (self.diff_order == d).nonzero().flatten().to(X.device)
+      y_d = X[:, d:, cols]
+      for i in range(d):
+        y_d = torch.cat((X0[d - 1 - i][:, cols].unsqueeze(1), y_d), 1).cumsum(1)
+      y[..., cols] = y_d
+    return y
+
+  def transform(self, X):
+    '''
+    Transforms a (num_samples, seq_len, num_features) or (seq_len, num_features) tensor.
+
+    Args:
+        X (torch.Tensor): The input data.
+
+    Returns:
+        torch.Tensor: The transformed data.
+    '''
+    ndim = X.ndim
+    if ndim == 2: X = X.unsqueeze(0)
+
+    y = self.difference(X) if self.max_diff_order > 0 else X
+    y = (y - self.shift.to(X)) / self.scale.to(X)
+
+    if ndim == 2: y = y.squeeze(0)
+
+    return y
+
+  def inverse_transform(self, X, X0 = None):
+    '''
+    Inverts a (num_samples, seq_len, num_features) or (seq_len, num_features) tensor.
+
+    Args:
+        X (torch.Tensor): The transformed data.
+        X0 (torch.Tensor, optional): Anchors from `get_anchors`, one set per sample or shared. Defaults to the fitted anchors.
+
+    Returns:
+        torch.Tensor: The data in its original scale.
+    '''
+    ndim = X.ndim
+    if ndim == 2: X = X.unsqueeze(0)
+
+    y = X * self.scale.to(X) + self.shift.to(X)
+    y = self.cumsum(y, X0) if self.max_diff_order > 0 else y
+
+    if ndim == 2: y = y.squeeze(0)
+
+    return y
@@ -0,0 +1,126 @@
+import torch
+from typing import Optional
+
+class TransformLayer(torch.nn.Module):
+  '''
+  Frozen, in-graph version of fitted FeatureTransforms.
+
+  The parameters of all features are stored as buffers: the affine map of the inverse (y = X * scale + shift), the differencing
+  order of each feature, and the anchors of each difference level. Forward and inverse transforms of a (num_samples, seq_len,
+  num_features) tensor are broadcast ops with masks over the differencing order, so the module can be scripted or exported.
+  '''
+
+  def __init__(self, scale, shift, diff_order = None, X0 = None):
+    '''
+    Initializes the TransformLayer instance. Use `TransformBank.to_module` to build it from fitted FeatureTransforms.
+
+    Args:
+        scale (torch.Tensor): Scale of the inverse of each feature, shape (num_features,).
+        shift (torch.Tensor): Shift of the inverse of each feature, shape (num_features,).
+        diff_order (torch.Tensor): Differencing order of each feature, shape (num_features,). Defaults to zeros.
+        X0 (torch.Tensor): Anchors of each difference level, shape (max_diff_order, num_features).
+    '''
+
+    super(TransformLayer, self).__init__()
+
+    num_features = scale.shape[-1]
+
+    diff_order = torch.zeros((num_features,), dtype = torch.long) if diff_order is None else diff_order.to(dtype = torch.long)
+
+    self.max_diff_order = int(diff_order.max().item()) if num_features > 0 else 0
+
+    X0 = torch.zeros((self.max_diff_order, num_features)) if X0 is None else X0
+
+    self.register_buffer('scale', scale.reshape(-1))
+    self.register_buffer('shift', shift.reshape(-1))
+    self.register_buffer('diff_order', diff_order.reshape(-1))
+    self.register_buffer('X0', X0.to(scale))
+
+  def difference(self, X):
+    '''
+    Differences each feature along time by its own order. The first `diff_order` steps of each feature have no preceding
+    values and are zero, so to difference a window, pass it with the `max_diff_order` raw steps before it and drop them from
+    the result.
+    '''
+    y = X
+    for k in range(self.max_diff_order):
+      dy = torch.nn.functional.pad(y[:, 1:] - y[:, :-1], (0, 0, 1, 0))
+      y = torch.where(self.diff_order > k, dy, y)
+
+    step = torch.arange(X.shape[1], device = X.device).reshape(1, -1, 1)
+
+    return y.masked_fill(step < self.diff_order, 0.)
+
+  def get_anchors(self, X):
+    '''
+    Returns the anchors of a batch of windows in the original scale: the first step of each difference level of each feature,
+    of shape (max_diff_order, num_samples, num_features). Only the first `max_diff_order` steps of X are used.
+    '''
+    y = X[:, :self.max_diff_order]
+
+    anchors = []
+    for k in range(self.max_diff_order):
+      anchors.append(y[:, 0])
+      y = y[:, 1:] - y[:, :-1]
+
+    return torch.stack(anchors, 0)
+
+  def cumsum(self, X, anchors: Optional[torch.Tensor] = None):
+    '''
+    Rebuilds the level of each differenced feature, one cumulative sum per difference level.
+
+    Args:
+        X (torch.Tensor): Differenced data of shape (num_samples, seq_len, num_features).
+        anchors (torch.Tensor, optional): Anchors of shape (max_diff_order, num_features), shared by all samples, or
+                                          (max_diff_order, num_samples, num_features). Defaults to the stored anchors.
+    '''
+    anchors = self.X0.to(X) if anchors is None else anchors.to(X)
+
+    step = torch.arange(X.shape[1], device = X.device).reshape(1, -1, 1)
+
+    y = X.masked_fill(step < self.diff_order, 0.)
+    for level in range(self.max_diff_order - 1, -1, -1):
+      active = self.diff_order > level
+      y = torch.where(active & (step == level), anchors[level].unsqueeze(-2), y)
+      y = torch.where(active, y.cumsum(1), y)
+
+    return y
+
+  def transform(self, X):
+    '''
+    Transforms raw data of shape (num_samples, seq_len, num_features) or (seq_len, num_features).
+    '''
+    ndim = X.ndim
+    if ndim == 2: X = X.unsqueeze(0)
+
+    y = self.difference(X) if self.max_diff_order > 0 else X
+    y = (y - self.shift.to(X)) / self.scale.to(X)
+
+    if ndim == 2: y = y.squeeze(0)
+
+    return y
+
+  def inverse_transform(self, X, anchors: Optional[torch.Tensor] = None):
+    '''
+    Inverts transformed data of shape (num_samples, seq_len, num_features) or (seq_len, num_features).
+
+    Args:
+        X (torch.Tensor): The transformed data.
+        anchors (torch.Tensor, optional): Anchors of each difference level, from `get_anchors`, shared or one set per sample.
+                                          Defaults to the stored anchors, from the start of the fitted series.
+    '''
+    ndim = X.ndim
+    if ndim == 2: X = X.unsqueeze(0)
+
+    y = X * self.scale.to(X) + self.shift.to(X)
+    y = self.cumsum(y, anchors) if self.max_diff_order > 0 else y
+
+    if ndim == 2: y = y.squeeze(0)
+
+    return y
+
+  def forward(self, X, inverse: bool = False):
+    '''
+    Transforms, or inverts if `inverse`, data of shape (num_samples, seq_len, num_features).
+    '''
+    return self.inverse_transform(X) if inverse else self.transform(X)
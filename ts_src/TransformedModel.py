@@ -0,0 +1,120 @@
+import torch
+from typing import List, Optional
+
+from ts_src.FeatureTransform import FeatureTransform
+from ts_src.TransformBank import TransformBank
+from ts_src.CompiledSequenceModel import CompiledSequenceModel
+
+class TransformedModel(torch.nn.Module):
+  '''
+  Wraps a SequenceModel or Seq2SeqModel with frozen input and output transforms, so raw data goes in and forecasts in the
+  original scale come out of one graph.
+
+  The raw input starts with the `input_transform.max_diff_order` steps before the window, so that differenced features are
+  true differences over the whole window, as in training. These steps are not passed to the model. Differenced outputs are
+  assumed to follow the last input step, as in one-step-ahead forecasting, and continue from the last raw levels of the same
+  features in the input, so each window is inverted on its own.
+
+  With `compiled`, the SequenceModel runs through `CompiledSequenceModel`, and the wrapper can be captured with
+  `torch.jit.script`, `torch.jit.trace`, or `torch.onnx.export`. The eager SequenceModel cannot be scripted or traced.
+  '''
+
+  compiled: torch.jit.Final[bool]
+
+  def __init__(self,
+               model,
+               input_transform = None, output_transform = None,
+               transforms = None,
+               compiled = False, input_window_idx = None,
+               dtype = torch.float32):
+    '''
+    Initializes the TransformedModel instance.
+
+    Args:
+        model (torch.nn.Module): The SequenceModel or Seq2SeqModel to wrap.
+        input_transform (TransformLayer): Transform applied to the raw input. Built from `transforms` if None.
+        output_transform (TransformLayer): Transform inverted on the model output. Built from `transforms` if None.
+        transforms (dict): Fitted FeatureTransforms keyed by input and output name, e.g. `TimeSeriesDataModule.transforms`.
+                           Names without a transform are left unchanged.
+        compiled (bool): Whether to run the model through `CompiledSequenceModel`. Only for SequenceModels it supports.
+        input_window_idx (list, optional): Input window indices of each input for `CompiledSequenceModel`.
+        dtype (torch.dtype): The data type of the transform buffers.
+    '''
+
+    super(TransformedModel, self).__init__()
+
+    self.compiled = compiled
+
+    self.model = CompiledSequenceModel(model, input_window_idx) if compiled else model
+
+    encoder = getattr(model, 'encoder', model)
+    decoder = getattr(model, 'decoder', model)
+
+    if (input_transform is None) or (output_transform is None):
+      if transforms is None:
+        raise ValueError("Either both input_transform and output_transform, or transforms, must be given.")
+
+      if input_transform is None:
+        input_transform = self.get_transform(transforms, encoder.input_names, encoder.input_size, dtype)
+      if output_transform is None:
+        output_transform = self.get_transform(transforms, decoder.output_names, decoder.output_size, dtype)
+
+    self.input_transform, self.output_transform = input_transform, output_transform
+
+    # Input column of each output feature, whose last raw levels anchor the differenced outputs
+    input_idx = dict(zip(encoder.input_names, torch.arange(sum(encoder.input_size)).split(list(encoder.input_size))))
+    output_input_idx = torch.cat([input_idx[name] if name in input_idx else torch.full((size,), -1)
+                                  for name, size in zip(decoder.output_names, decoder.output_size)])
+
+    if ((output_input_idx < 0) & (self.output_transform.diff_order > 0)).any():
+      raise ValueError("Differenced outputs must also be inputs, whose last levels anchor the inverse.")
+
+    self.register_buffer('output_input_idx', output_input_idx.clamp(min = 0), persistent = False)
+
+  @staticmethod
+  def get_transform(transforms, names, sizes, dtype = torch.float32):
+    '''
+    Builds the TransformLayer of a list of named features.
+    '''
+    transforms_ = [transforms.get(name) or FeatureTransform(transform_type = 'identity') for name in names]
+
+    return TransformBank(transforms_, sizes = sizes).to_module(dtype = dtype)
+
+  def forward(self,
+              input: torch.Tensor,
+              steps: Optional[torch.Tensor] = None,
+              hiddens: Optional[List[torch.Tensor]] = None):
+    '''
+    Forward pass on raw data.
+
+    Args:
+        input (torch.Tensor): Raw input of shape (num_samples, input_transform.max_diff_order + input_len, input_size). The
+                              leading steps precede the window and only serve to difference it.
+        steps (torch.Tensor, optional): Time steps of shape (num_samples, input_transform.max_diff_order + input_len). Not
+                                        used when `compiled`.
+        hiddens (list, optional): Initial hidden states.
+
+    Returns:
+        torch.Tensor: Output in the original scale.
+        list: The updated hidden states.
+    '''
+
+    # The steps before the window make its first differences exact, and are then dropped
+    d = self.input_transform.max_diff_order
+    input_ = self.input_transform.transform(input)[:, d:]
+
+    if self.compiled:
+      output, hiddens = self.model(input_, hiddens)
+    else:
+      output, hiddens = self.model(input_, steps = steps[:, d:] if steps is not None else None, hiddens = hiddens)
+
+    d = self.output_transform.max_diff_order
+    if d > 0:
+      # The output continues from the last raw levels of each window, so it is inverted together with them
+      history = input[:, -d:].index_select(-1, self.output_input_idx.to(input.device))
+      output = torch.cat((self.output_transform.transform(history).to(output), output), 1)
+      output = self.output_transform.inverse_transform(output, self.output_transform.get_anchors(history))[:, d:]
+    else:
+      output = self.output_transform.inverse_transform(output)
+
+    return output, hiddens
@@ -30,6 +30,7 @@ class TransformerDecoderLayer(torch.nn.TransformerDecoderLayer):
     concat_weight_norm (int, optional): Norm type for concatenation weight regularization. Defaults to 2.
     concat_bias (bool, optional): Whether to include bias in concatenation weight. Defaults to False.
     average_attn_weights (bool, optional): Whether to average the attention weights. Defaults to False.
+    fused_attn (bool, optional): Whether 'dot' attention uses the fused path (packed projection and scaled_dot_product_attention). Defaults to False.
     dropout_p (float, optional): Probability of an element to be zeroed. Defaults to 0.
     dropout1_p (float, optional): Probability of an element of the first dropout layer to be zeroed. Defaults to 0.
     dropout2_p (float, optional): Probability of an element of the second dropout layer to be zeroed. Defaults to 0.
@@ -62,7 +63,7 @@ class TransformerDecoderLayer(torch.nn.TransformerDecoderLayer):
                value_weight_reg=[0.001, 1], value_weight_norm=2, value_bias=False,
                gen_weight_reg=[0.001, 1], gen_weight_norm=2, gen_bias = False,
                concat_weight_reg=[0.001, 1], concat_weight_norm=2, concat_bias=False,
-               average_attn_weights=False,
+               average_attn_weights=False, fused_attn=False,
                dropout_p=0.0, dropout1_p=0.0, dropout2_p=0.0, dropout3_p=0.0,
                linear1_bias=False, linear2_bias=False,
                linear1_weight_reg=[0.001, 1], linear1_weight_norm=2,
@@ -109,6 +110,7 @@ class TransformerDecoderLayer(torch.nn.TransformerDecoderLayer):
                                  concat_weight_norm = self.concat_weight_norm,
                                  concat_bias = self.concat_bias,
                                  average_attn_weights = self.average_attn_weights,
+                                 fused = self.fused_attn and (self.self_attn_type == 'dot'),
                                  is_causal = self.memory_is_causal,
                                  dropout_p = self.dropout_p,
                                  device = self.device,
@@ -133,6 +135,7 @@ class TransformerDecoderLayer(torch.nn.TransformerDecoderLayer):
                                       concat_weight_norm = self.concat_weight_norm,
                                       concat_bias = self.concat_bias,
                                       average_attn_weights = self.average_attn_weights,
+                                      fused = self.fused_attn and (self.multihead_attn_type == 'dot'),
                                       is_causal = self.tgt_is_causal,
                                       dropout_p = self.dropout1_p,
                                       device = self.device,
@@ -4,6 +4,12 @@ import importlib
 
 __all__ = ['ExploratoryTimeSeriesAnalysis',
            'FeatureTransform',
+           'TransformBank',
+           'TransformLayer',
+           'QuantileSketch',
+           'CovariateGenerator',
+           'AsOfJoin',
+           'BatchAugmentation',
            'Criterion', 
            'fft', 
            'periodogram', 
@@ -16,6 +22,7 @@ __all__ = ['ExploratoryTimeSeriesAnalysis',
            'Polynomial', 
            'LRU', 
            'HiddenLayer', 
+           'GroupedLinear',
            'ModulationLayer',
            'LegendreModulator',
            'ChebychevModulator', 
@@ -26,8 +33,14 @@ __all__ = ['ExploratoryTimeSeriesAnalysis',
            'TransformerDecoderLayer', 
            'CNN1D',
            'SequenceModelBase', 
+           'InputGroup',
            'SequenceModel', 
            'Seq2SeqModel', 
+           'CompiledSequenceModel',
+           'OnnxSequenceModel',
+           'LayerCapture',
+           'quantize',
+           'TransformedModel',
            'Embedding', 
            'PositionalEncoding', 
            'SequenceDataset',                        
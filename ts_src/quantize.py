@@ -0,0 +1,45 @@
+import copy
+import warnings
+
+import torch
+
+from ts_src.LRU import LRU
+from ts_src.ModulationLayer import ModulationLayer
+
+def quantize(model, dtype = torch.qint8, exclude = (LRU, ModulationLayer)):
+  '''
+  Returns a copy of a trained model with dynamic quantization for CPU inference.
+
+  The weights of the torch.nn.Linear, torch.nn.GRU, and torch.nn.LSTM modules (hidden, interaction, and output layers, GRU/LSTM
+  bases, unfused attention projections, transformer feedforward layers) are stored in `dtype`, and their activations are
+  quantized on the fly. Modules inside the `exclude` types (by default LRU, whose relax parameters define the recurrence, and
+  the modulation layer) and all other parameters stay in float. The copy is in eval mode and cannot be trained.
+
+  Args:
+      model (torch.nn.Module): Trained model, e.g. a SequenceModel or Seq2SeqModel. It is not modified.
+      dtype (torch.dtype): torch.qint8, or torch.float16 for float16 weights.
+      exclude (tuple): Module types whose submodules are not quantized.
+
+  Returns:
+      torch.nn.Module: The quantized copy.
+  '''
+  if dtype not in [torch.qint8, torch.float16]:
+    raise ValueError(f"dtype ({dtype}) must be torch.qint8 or torch.float16.")
+
+  qconfig = torch.ao.quantization.default_dynamic_qconfig if dtype == torch.qint8 else torch.ao.quantization.float16_dynamic_qconfig
+
+  excluded = [name for name, module in model.named_modules() if isinstance(module, exclude)]
+
+  qconfig_spec = {name: qconfig for name, module in model.named_modules()
+                  if isinstance(module, (torch.nn.Linear, torch.nn.GRU, torch.nn.LSTM))
+                  and not any(name.startswith(prefix + '.') for prefix in excluded)}
+
+  model = copy.deepcopy(model).eval()
+
+  # Grouped inputs stack the float weights of their modules, so quantized inputs are processed one at a time
+  for module in model.modules():
+    if hasattr(module, 'input_groups'): module.input_groups = []
+
+  with warnings.catch_warnings():
+    warnings.simplefilter('ignore')
+    return torch.ao.quantization.quantize_dynamic(model, qconfig_spec = qconfig_spec, inplace = True)